@@ -1,25 +1,31 @@
-import os
 import re
 from typing import List, Dict, Optional
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from llm import get_llm_backend
+from llm_json import parse_model_output, LlmOutputError
+from prompt_context import build_draft_context
+from thread_summarizer import get_thread_summary
+from profiling import span
 from models import (
     SearchKBRequest, SearchKBResponse,
     DraftReplyRequest, DraftReplyResponse,
+    DraftModelOutput, TriageModelOutput,
     KnowledgeBaseArticle
 )
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Get Emergent LLM key from environment
-EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY", "sk-emergent-c150a2a7f7f397a8aD")
-
 
 def mask_pii(text: str) -> tuple[str, dict]:
     """
     Mask PII in text before sending to AI.
     Returns: (masked_text, redaction_report)
     """
+    with span("pii_mask"):
+        return _mask_pii(text)
+
+
+def _mask_pii(text: str) -> tuple[str, dict]:
     redacted = {}
     masked_text = text
     
@@ -62,6 +68,11 @@ async def search_kb_articles(
     Search knowledge base articles by query and category.
     Only returns ai_searchable articles for the given institution.
     """
+    with span("kb_search"):
+        return await _search_kb_articles(db, request)
+
+
+async def _search_kb_articles(db, request: SearchKBRequest) -> SearchKBResponse:
     query_filter = {
         "institution_id": request.institution_id,
         "ai_searchable": True
@@ -105,27 +116,23 @@ async def draft_reply_with_ai(
     kb_request = SearchKBRequest(
         institution_id=request.institution_id,
         query=request.latest_message,
-        limit=3
+        limit=5
     )
     kb_response = await search_kb_articles(db, kb_request)
     
     # Step 2: Mask PII in input
     masked_message, redaction_report = mask_pii(request.latest_message)
     
-    # Step 3: Build context for AI
-    kb_context = ""
-    for i, article in enumerate(kb_response.articles, 1):
-        kb_context += f"\n\n[KB Article {i}: {article['title']}]\n{article['content'][:800]}...\n"
-    
-    thread_summary = ""
-    if request.thread_context:
-        thread_summary = "\n\nPrevious conversation:\n"
-        for msg in request.thread_context[-3:]:
-            thread_summary += f"- {msg.get('sender', 'Unknown')}: {msg.get('body', '')[:200]}...\n"
-    
-    notes_context = ""
-    if request.student_notes:
-        notes_context = f"\n\nStudent notes: {request.student_notes}"
+    # Step 3: Build context for AI (best KB passages, rolling thread summary and
+    # newest turns within the token budget)
+    summary = await get_thread_summary(db, request.institution_id, request.ticket_id)
+    context = build_draft_context(
+        articles=kb_response.articles,
+        query=request.latest_message,
+        thread=request.thread_context,
+        notes=request.student_notes,
+        thread_summary=summary["text"] if summary else None
+    )
     
     # Step 4: Create AI prompt
     system_message = """You are a professional financial aid advisor AI assistant. Your role is to help draft empathetic, accurate responses to student inquiries.
@@ -151,9 +158,9 @@ Provide your response in this exact JSON structure:
 
 Latest student message:
 {masked_message}
-{thread_summary}{notes_context}
+{context.thread_context}{context.notes_context}
 
-Relevant Knowledge Base articles:{kb_context}
+Relevant Knowledge Base articles:{context.kb_context}
 
 Draft a professional, empathetic reply that:
 1. Acknowledges the student's question
@@ -167,30 +174,19 @@ Remember: DO NOT make up award amounts, balances, or account details.
     
     # Step 5: Call AI
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
+        completion = await get_llm_backend().complete(
+            system_message=system_message,
+            prompt=user_prompt,
             session_id=f"draft_{request.ticket_id}",
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")
-        
-        user_message = UserMessage(text=user_prompt)
-        ai_response = await chat.send_message(user_message)
-        
-        # Parse AI response (strip markdown code blocks if present)
-        import json
-        ai_text = ai_response.strip()
-        if ai_text.startswith("```json"):
-            ai_text = ai_text[7:]
-        if ai_text.startswith("```"):
-            ai_text = ai_text[3:]
-        if ai_text.endswith("```"):
-            ai_text = ai_text[:-3]
-        ai_text = ai_text.strip()
+            tool="draft_reply"
+        )
+        ai_response = completion.text
         
+        # Parse AI response (tolerates fences, surrounding prose and truncation)
         try:
-            response_data = json.loads(ai_text)
-        except json.JSONDecodeError:
-            # If AI didn't return valid JSON, extract what we can
+            response_data = parse_model_output(ai_response, DraftModelOutput).model_dump()
+        except LlmOutputError:
+            # If AI didn't return usable JSON, extract what we can
             response_data = {
                 "summary": "Unable to parse AI response",
                 "reasoning": "AI returned non-JSON response",
@@ -202,23 +198,20 @@ Remember: DO NOT make up award amounts, balances, or account details.
         
         safe_reply = response_data.get("reply", "") + disclaimer
         
-        # Step 7: Prepare cited KB articles
-        cited_kb = [
-            {
-                "title": article["title"],
-                "category": article["category"],
-                "excerpt": article["content"][:200] + "..."
-            }
-            for article in kb_response.articles
-        ]
-        
         return DraftReplyResponse(
             summary=response_data.get("summary", "Student inquiry"),
             reasoning=response_data.get("reasoning", "N/A"),
-            cited_kb=cited_kb,
+            cited_kb=context.cited_articles,
             safe_reply=safe_reply,
             redaction_report=redaction_report,
-            disclaimer=disclaimer
+            disclaimer=disclaimer,
+            usage={
+                "model": completion.model,
+                "prompt_tokens": completion.prompt_tokens,
+                "completion_tokens": completion.completion_tokens,
+                "latency_ms": round(completion.latency_ms, 1),
+                "context_tokens": context.token_counts
+            }
         )
         
     except Exception as e:
@@ -229,11 +222,13 @@ Remember: DO NOT make up award amounts, balances, or account details.
 async def triage_ticket_with_ai(
     db,
     email_body: str,
-    institution_id: str
+    institution_id: str,
+    fallback: bool = True
 ) -> dict:
     """
     Use AI to automatically categorize and route a ticket.
     Returns: {category, priority, suggested_queue, reasoning}
+    If the AI call fails, returns general/medium, or raises when `fallback` is False.
     """
     # Mask PII first
     masked_body, _ = mask_pii(email_body)
@@ -264,32 +259,22 @@ Provide your response in this exact JSON format:
     user_prompt = f"Categorize this student email:\n\n{masked_body}"
     
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
+        completion = await get_llm_backend().complete(
+            system_message=system_message,
+            prompt=user_prompt,
             session_id=f"triage_{institution_id}",
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")
-        
-        user_message = UserMessage(text=user_prompt)
-        ai_response = await chat.send_message(user_message)
-        
-        import json
-        # Strip markdown code blocks if present
-        ai_text = ai_response.strip()
-        if ai_text.startswith("```json"):
-            ai_text = ai_text[7:]
-        if ai_text.startswith("```"):
-            ai_text = ai_text[3:]
-        if ai_text.endswith("```"):
-            ai_text = ai_text[:-3]
-        ai_text = ai_text.strip()
+            tool="triage"
+        )
+        ai_response = completion.text
         
-        triage_data = json.loads(ai_text)
+        triage_data = parse_model_output(ai_response, TriageModelOutput)
         
-        return triage_data
+        return triage_data.model_dump()
         
     except Exception as e:
         logger.error(f"AI triage failed: {e}")
+        if not fallback:
+            raise
         # Fallback to general/medium if AI fails
         return {
             "category": "general",
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Load-testing benchmark for the AidHub Pro API.
+
+Seeds N institutions x M tickets (with students, messages and KB articles) into a
+dedicated database on a local mongod, replays a weighted agent workload against
+server.py in-process (stub LLM backend, so no network is needed) and reports
+throughput and p50/p95/p99 latency per endpoint. Results are written as JSON so runs can be
+compared between commits:
+
+    python benchmark_api.py --institutions 3 --tickets 2000 --requests 5000
+    python benchmark_api.py --skip-seed --compare bench_results/<previous>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+# Agent workload mix: (name, weight)
+WORKLOAD = [
+    ("inbox", 35),
+    ("open_ticket", 25),
+    ("timeline", 15),
+    ("kb_search", 10),
+    ("reply", 10),
+    ("draft_reply", 5),
+]
+
+CATEGORIES = ["fafsa", "verification", "sap_appeal", "billing", "general"]
+KB_QUERIES = [
+    "FAFSA deadline", "verification documents", "SAP appeal process",
+    "payment plan", "loan disbursement", "tax transcript",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the AidHub Pro API against a local mongod")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.getenv("BENCH_DB_NAME", "aidhub_bench"))
+    parser.add_argument("--institutions", type=int, default=2)
+    parser.add_argument("--tickets", type=int, default=1000, help="tickets per institution")
+    parser.add_argument("--students", type=int, default=200, help="students per institution")
+    parser.add_argument("--messages", type=float, default=4, help="mean messages per ticket")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests to replay")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="stubbed LLM latency")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the existing benchmark database")
+    parser.add_argument("--output-dir", default=str(ROOT_DIR / "bench_results"))
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    return parser.parse_args()
+
+
+# ============================================================
+# SEEDING
+# ============================================================
+
+async def seed(db, args):
+    """Drop and rebuild the benchmark database (see seed_bulk.py)"""
+    from seed_bulk import SeedConfig, seed as seed_bulk
+
+    # Derived collections too: stale blobs, drafts, chatbot answers or jobs would skew the next run
+    for name in ("institutions", "users", "queues", "students", "tickets", "messages",
+                 "student_events", "knowledge_base", "ai_suggestions", "ai_blobs", "audit_logs",
+                 "draft_cache", "chatbot_answers", "jobs", "idempotency_keys"):
+        await db[name].delete_many({})
+
+    report = await seed_bulk(db, SeedConfig(
+        institutions=args.institutions, students=args.students, tickets=args.tickets,
+        messages=args.messages, seed=args.seed, anchor=datetime.now(timezone.utc), slug_prefix="bench",
+    ))
+    print(f"📦 Seeded {report['documents']} documents in {report['load_seconds']}s ({report['docs_per_second']} docs/s)")
+
+
+# ============================================================
+# WORKLOAD
+# ============================================================
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name: str, elapsed_ms: float, ok: bool):
+        self.latencies.setdefault(name, []).append(elapsed_ms)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def load_fixtures(db) -> list:
+    """Per-institution agent emails plus ticket/student ids to pick from"""
+    fixtures = []
+    async for institution in db.institutions.find({}, {"_id": 0, "id": 1}):
+        institution_id = institution["id"]
+        users = await db.users.find({"institution_id": institution_id}, {"_id": 0, "email": 1}).to_list(None)
+        tickets = await db.tickets.find(
+            {"institution_id": institution_id}, {"_id": 0, "id": 1, "student_id": 1}
+        ).to_list(None)
+        fixtures.append({"institution_id": institution_id, "users": users, "tickets": tickets})
+    return fixtures
+
+
+async def run_operation(client, name: str, agent: dict, rng: random.Random):
+    ticket = rng.choice(agent["tickets"])
+    headers = agent["headers"]
+    if name == "inbox":
+        return await client.get("/api/tickets", headers=headers,
+                                params={"status": rng.choice(["open", "my", "unassigned"])})
+    if name == "open_ticket":
+        return await client.get(f"/api/tickets/{ticket['id']}", headers=headers)
+    if name == "timeline":
+        return await client.get(f"/api/students/{ticket['student_id']}/timeline", headers=headers)
+    if name == "kb_search":
+        return await client.post("/api/tools/search_kb_articles", json={
+            "institution_id": agent["institution_id"], "query": rng.choice(KB_QUERIES), "limit": 5,
+        })
+    if name == "reply":
+        return await client.post("/api/messages", headers=headers, params={
+            "ticket_id": ticket["id"], "body": "Thanks, we have received your documents.",
+        })
+    if name == "draft_reply":
+        return await client.post("/api/tools/draft_reply", json={
+            "institution_id": agent["institution_id"], "ticket_id": ticket["id"],
+            "student_email": "student@example.edu", "student_name": "Student",
+            "latest_message": rng.choice(KB_QUERIES), "thread_context": [],
+        })
+    raise ValueError(f"Unknown operation {name}")
+
+
+async def replay(client, agents: list, args) -> tuple:
+    recorder = Recorder()
+    names = [name for name, _ in WORKLOAD]
+    weights = [weight for _, weight in WORKLOAD]
+    remaining = args.requests
+
+    async def worker(worker_id: int):
+        nonlocal remaining
+        rng = random.Random(args.seed + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            name = rng.choices(names, weights)[0]
+            agent = rng.choice(agents)
+            started = time.perf_counter()
+            try:
+                response = await run_operation(client, name, agent, rng)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            recorder.record(name, (time.perf_counter() - started) * 1000, ok)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    return recorder, time.perf_counter() - started
+
+
+# ============================================================
+# REPORTING
+# ============================================================
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    total = 0
+    for name, values in sorted(recorder.latencies.items()):
+        values.sort()
+        total += len(values)
+        endpoints[name] = {
+            "count": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+        }
+    return {"total_requests": total, "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def print_report(summary: dict, baseline: dict = None):
+    print(f"\n{'endpoint':<14}{'count':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, row in summary["endpoints"].items():
+        line = (f"{name:<14}{row['count']:>8}{row['errors']:>6}{row['rps']:>9.1f}"
+                f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}")
+        previous = (baseline or {}).get("endpoints", {}).get(name)
+        if previous and previous["p95_ms"]:
+            change = (row["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}% vs {baseline['commit']}"
+        print(line)
+    print(f"\n⚡ {summary['throughput_rps']:.1f} req/s over {summary['elapsed_s']:.1f}s")
+
+
+async def main():
+    args = parse_args()
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db_name
+    # Deterministic local model (see llm.py) so the run needs no network
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["LLM_STUB_LATENCY"] = f"exponential:{args.llm_latency_ms}"
+    os.environ["LLM_STUB_SEED"] = str(args.seed)
+    sys.path.insert(0, str(ROOT_DIR))
+
+    import httpx
+    import server
+
+    if not args.skip_seed:
+        print(f"🌱 Seeding {args.institutions} institutions x {args.tickets} tickets into {args.db_name}...")
+        await seed(server.db, args)
+
+    await server.start_background_tasks()
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        agents = []
+        for fixture in await load_fixtures(server.db):
+            for user in fixture["users"]:
+                login = await client.post("/api/auth/login", params={"provider": "microsoft", "email": user["email"]})
+                agents.append({
+                    "institution_id": fixture["institution_id"],
+                    "tickets": fixture["tickets"],
+                    "headers": {"Authorization": f"Bearer {login.json()['token']}"},
+                })
+        if not agents:
+            print("❌ No institutions found. Run without --skip-seed first.")
+            return
+
+        print(f"🏃 Replaying {args.requests} requests with concurrency {args.concurrency}...")
+        recorder, elapsed = await replay(client, agents, args)
+
+    await server.shutdown_db_client()
+
+    summary = summarize(recorder, elapsed)
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output_dir")},
+        **summary,
+    }
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(summary, baseline)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{result['timestamp'][:19].replace(':', '')}_{result['commit']}.json"
+    output_path.write_text(json.dumps(result, indent=2))
+    print(f"💾 Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+CPU cost of building the documents written by the event and suggestion endpoints.
+
+For POST /api/tools/add_student_event and POST /api/tools/draft_reply, compares
+per request:
+
+    model       full pydantic instantiation + model_dump() (previous write path)
+    repository  repository.new_document (current write path)
+
+The suggestion case follows save_suggestion: input and output are hashed into
+blob references and the document is split into the upsert key and the fields
+set on insert.
+
+Both include the request-body validation FastAPI does at the boundary, so the
+difference is the CPU saved per request.
+
+    python benchmark_documents.py --repeat 20000
+"""
+import argparse
+import time
+
+from models import (
+    AddStudentEventRequest, AiSuggestion, DraftReplyRequest, DraftReplyResponse, StudentEvent
+)
+from repository import new_document
+from suggestion_store import SUGGESTION_KEY, blob_hash, canonical_json, suggestion_document
+
+INSTITUTION_ID = "8826d916-cdfb-41c6-81ff-91a761565a70"
+TICKET_ID = "7b5c2f17-5333-488f-aa64-7fcb72accf4d"
+STUDENT_ID = "1f3a8b13-45cf-4478-90ae-b1cbea318130"
+
+EVENT_BODY = {
+    "institution_id": INSTITUTION_ID,
+    "student_id": STUDENT_ID,
+    "ticket_id": TICKET_ID,
+    "event_type": "phone_call",
+    "content": "Called about verification documents; asked to upload the tax transcript.",
+    "created_by": "2416da6e-c212-4ddb-8d88-00160eb686b2",
+}
+
+DRAFT_BODY = {
+    "institution_id": INSTITUTION_ID,
+    "ticket_id": TICKET_ID,
+    "student_email": "student@example.edu",
+    "student_name": "Jordan Lee",
+    "latest_message": "Hi, I was selected for verification. What documents do I need to submit?",
+    "thread_context": [
+        {"direction": "inbound", "body": "When is the FAFSA deadline for next year?"},
+        {"direction": "outbound", "body": "The priority deadline is March 1."},
+    ],
+    "student_notes": "First-generation student; prefers email.",
+}
+
+DRAFT_RESULT = DraftReplyResponse(
+    summary="Student was selected for verification and asks which documents to submit.",
+    reasoning="The verification KB article lists the required documents.",
+    cited_kb=[{"title": "Verification Process", "category": "verification"}],
+    safe_reply="Thank you for reaching out. For verification, please submit ...",
+    redaction_report={"emails": 0, "phones": 0, "ssn": 0},
+    disclaimer="AI-generated draft. Review before sending.",
+    usage={"model": "gpt-4o", "prompt_tokens": 1450, "completion_tokens": 210, "latency_ms": 1830.0},
+)
+
+
+def event_model():
+    request = AddStudentEventRequest.model_validate(EVENT_BODY)
+    return StudentEvent(**request.model_dump()).model_dump()
+
+
+def event_repository():
+    request = AddStudentEventRequest.model_validate(EVENT_BODY)
+    return new_document(StudentEvent, **request.model_dump())
+
+
+def _suggestion_hashes(request: DraftReplyRequest) -> tuple:
+    # Hashing the input and output blobs, as save_suggestion does (the blob upserts themselves are I/O)
+    input_context = request.model_dump(exclude={"use_prefetched"})
+    output = DRAFT_RESULT.model_dump(exclude={"usage"})
+    return (
+        blob_hash(request.institution_id, canonical_json(input_context)),
+        blob_hash(request.institution_id, canonical_json(output)),
+        output,
+    )
+
+
+def suggestion_model():
+    request = DraftReplyRequest.model_validate(DRAFT_BODY)
+    input_hash, output_hash, output = _suggestion_hashes(request)
+    usage = DRAFT_RESULT.usage or {}
+    doc = AiSuggestion(
+        institution_id=request.institution_id,
+        ticket_id=request.ticket_id,
+        suggestion_type="draft_reply",
+        input_hash=input_hash,
+        output_hash=output_hash,
+        summary=output.get("summary"),
+        **{k: usage.get(k) for k in ("model", "prompt_tokens", "completion_tokens", "latency_ms")},
+    ).model_dump()
+    key = {field: doc.pop(field) for field in SUGGESTION_KEY}
+    for field in ("input_context", "output", "generated_count", "last_generated_at"):
+        doc.pop(field)
+    return {**key, **doc}
+
+
+def suggestion_repository():
+    request = DraftReplyRequest.model_validate(DRAFT_BODY)
+    input_hash, output_hash, output = _suggestion_hashes(request)
+    key, doc = suggestion_document(
+        institution_id=request.institution_id, ticket_id=request.ticket_id, suggestion_type="draft_reply",
+        input_hash=input_hash, output_hash=output_hash, output=output, usage=DRAFT_RESULT.usage
+    )
+    return {**key, **doc}
+
+
+CASES = [
+    ("POST /api/tools/add_student_event", event_model, event_repository),
+    ("POST /api/tools/draft_reply", suggestion_model, suggestion_repository),
+]
+
+
+def cpu_us(fn, repeat: int) -> float:
+    """Best-of-3 mean CPU microseconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        started = time.process_time()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.process_time() - started) / repeat)
+    return best * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU cost of building event/suggestion documents")
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    header = f"{'endpoint':<36}{'model us':>12}{'repository us':>16}{'saved us':>12}{'saved':>8}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, old, new in CASES:
+        # Same document shape either way
+        assert old().keys() == new().keys()
+        before, after = cpu_us(old, args.repeat), cpu_us(new, args.repeat)
+        print(
+            f"{endpoint:<36}{before:>12.2f}{after:>16.2f}{before - after:>12.2f}"
+            f"{(before - after) / before:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
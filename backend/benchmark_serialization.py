@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for response serialization.
+
+Builds synthetic payloads shaped like the list/detail endpoints' responses
+(inbox page, ticket detail, student list, timeline page) and times each
+serialization path per payload:
+
+    fastapi     jsonable_encoder + stdlib json (FastAPI's default for returned dicts)
+    stdlib      stdlib json without jsonable_encoder
+    fast_json   fast_json.dumps (orjson when installed), used by trusted_json()
+
+    python benchmark_serialization.py --tickets 100 --messages 40 --repeat 200
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+import fast_json
+
+CATEGORIES = ["fafsa", "verification", "sap_appeal", "billing", "general"]
+STATUSES = ["new", "open", "pending", "resolved"]
+WORDS = (
+    "financial aid fafsa verification transcript appeal loan grant deadline "
+    "payment plan disbursement tuition refund scholarship document"
+).split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare response serialization paths per endpoint payload")
+    parser.add_argument("--tickets", type=int, default=100, help="tickets per inbox page")
+    parser.add_argument("--messages", type=int, default=40, help="messages in the ticket detail payload")
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--timeline", type=int, default=50, help="items per timeline page")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def _text(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _timestamp(rng: random.Random) -> str:
+    moment = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(30_000_000))
+    return moment.isoformat()
+
+
+def _student(rng: random.Random) -> dict:
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "institution_id": "inst-1",
+        "name": _text(rng, 2).title(),
+        "email": f"student{rng.randrange(10**6)}@example.edu",
+        "student_id_number": str(rng.randrange(10**8)),
+        "notes": _text(rng, 12),
+        "open_ticket_count": rng.randrange(4),
+        "last_contact_at": _timestamp(rng),
+        "created_at": _timestamp(rng),
+    }
+
+
+def _ticket(rng: random.Random) -> dict:
+    student = _student(rng)
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "institution_id": "inst-1",
+        "student_id": student["id"],
+        "student_name": student["name"],
+        "student_email": student["email"],
+        "student": {"id": student["id"], "name": student["name"], "email": student["email"]},
+        "subject": _text(rng, 6),
+        "status": rng.choice(STATUSES),
+        "priority": rng.choice(["low", "medium", "high", "urgent"]),
+        "category": rng.choice(CATEGORIES),
+        "channel": "email",
+        "assignee_id": None,
+        "queue_id": "queue-1",
+        "tags": rng.sample(WORDS, 3),
+        "message_count": rng.randrange(1, 12),
+        "last_message_preview": _text(rng, 30),
+        "sla_due_at": _timestamp(rng),
+        "created_at": _timestamp(rng),
+        "updated_at": _timestamp(rng),
+    }
+
+
+def _message(rng: random.Random, ticket_id: str) -> dict:
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "ticket_id": ticket_id,
+        "direction": rng.choice(["inbound", "outbound"]),
+        "from_email": "student@example.edu",
+        "to_email": "finaid@example.edu",
+        "subject": _text(rng, 6),
+        "body": _text(rng, 150),
+        "attachments": [],
+        "created_at": _timestamp(rng),
+    }
+
+
+def _timeline_item(rng: random.Random) -> dict:
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "ticket_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "event_type": rng.choice(["ticket_created", "received_email", "sent_email", "ai_suggestion"]),
+        "kind": rng.choice(["event", "message", "ai_suggestion"]),
+        "content": _text(rng, 40),
+        "created_at": _timestamp(rng),
+    }
+
+
+def build_payloads(args) -> dict:
+    rng = random.Random(args.seed)
+    ticket = _ticket(rng)
+    return {
+        "GET /api/tickets": {"tickets": [_ticket(rng) for _ in range(args.tickets)]},
+        "GET /api/tickets/{id}": {
+            "ticket": ticket,
+            "messages": [_message(rng, ticket["id"]) for _ in range(args.messages)],
+            "student": _student(rng),
+        },
+        "GET /api/students": {"students": [_student(rng) for _ in range(args.students)]},
+        "GET /api/students/{id}/timeline": {
+            "items": [_timeline_item(rng) for _ in range(args.timeline)],
+            "next_cursor": "eyJjcmVhdGVkX2F0IjogIjIwMjUifQ==",
+        },
+    }
+
+
+def _fastapi(payload) -> bytes:
+    # Same encoder settings as starlette's JSONResponse.render
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _stdlib(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+PATHS = [("fastapi", _fastapi), ("stdlib", _stdlib), ("fast_json", fast_json.dumps)]
+
+
+def time_path(fn, payload, repeat: int) -> float:
+    """Best-of-3 mean microseconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn(payload)
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best * 1_000_000
+
+
+def main():
+    args = parse_args()
+    payloads = build_payloads(args)
+    backend = "orjson" if fast_json.orjson is not None else "stdlib fallback"
+    print(f"fast_json backend: {backend}, repeat={args.repeat}\n")
+
+    header = f"{'endpoint':<34}{'bytes':>9}" + "".join(f"{name + ' us':>14}" for name, _ in PATHS) + f"{'speedup':>10}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, payload in payloads.items():
+        size = len(fast_json.dumps(payload))
+        timings = [time_path(fn, payload, args.repeat) for _, fn in PATHS]
+        speedup = timings[0] / timings[-1] if timings[-1] else float("inf")
+        row = f"{endpoint:<34}{size:>9}" + "".join(f"{t:>14.1f}" for t in timings) + f"{speedup:>9.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
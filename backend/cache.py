@@ -0,0 +1,210 @@
+"""
+Tenant-aware in-process cache for slow-changing data (queues, users, institution config).
+
+Entries are keyed by (institution_id, namespace, key), expire after a TTL and are
+evicted least-recently-used once the cache is full. Writes invalidate explicitly;
+when running against a replica set, a change-stream listener can invalidate
+entries that were changed by other instances.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from institution_registry import institution_registry
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+TENANT_CACHE_TTL = float(os.environ.get("TENANT_CACHE_TTL", "300"))
+TENANT_CACHE_MAX_ENTRIES = int(os.environ.get("TENANT_CACHE_MAX_ENTRIES", "2048"))
+
+# Namespace used for lookups that are not scoped to a tenant (e.g. login by email)
+GLOBAL_SCOPE = "__global__"
+
+# Which cache namespaces depend on which collection
+COLLECTION_NAMESPACES = {
+    "queues": ("queues",),
+    "users": ("users", "user_by_email"),
+}
+
+# Namespaces stored in the global scope rather than under a tenant
+GLOBAL_NAMESPACES = {"user_by_email"}
+
+# Collections whose changes reload the institution registry (see institution_registry.py)
+REGISTRY_COLLECTIONS = ("institutions", "knowledge_base")
+
+
+class TenantCache:
+    """Size-bounded TTL cache with per-tenant invalidation and hit/miss counters"""
+
+    def __init__(self, ttl: float = TENANT_CACHE_TTL, max_entries: int = TENANT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple[float, Any]]" = OrderedDict()
+        self._loading = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get_or_load(
+        self,
+        institution_id: Optional[str],
+        namespace: str,
+        key: Any,
+        loader: Callable[[], Awaitable[Any]],
+        cache_none: bool = True,
+    ) -> Any:
+        """
+        Return the cached value, loading it once on miss (concurrent misses share one load).
+        With cache_none=False a None result is returned but not stored, so the next call loads again.
+        """
+        cache_key = (str(institution_id or GLOBAL_SCOPE), namespace, key)
+
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return value
+            del self._entries[cache_key]
+
+        self.misses += 1
+
+        async def load():
+            value = await loader()
+            if value is not None or cache_none:
+                self._store(cache_key, value)
+            return value
+
+        return await self._loading.do(cache_key, load)
+
+    def _store(self, cache_key: tuple, value: Any):
+        self._entries[cache_key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, institution_id: Optional[str] = None, namespace: Optional[str] = None):
+        """Drop entries for a tenant and/or namespace (None matches everything)"""
+        scope = str(institution_id) if institution_id is not None else None
+        stale = [
+            k for k in self._entries
+            if (scope is None or k[0] == scope) and (namespace is None or k[1] == namespace)
+        ]
+        for k in stale:
+            del self._entries[k]
+
+    def invalidate_collection(self, collection: str, institution_id: Optional[str] = None):
+        """
+        Drop entries derived from a collection after it was written to. The API has no
+        write paths for users/queues/institutions (they are provisioned by the seed
+        scripts), so this is driven by the change-stream listener below.
+        """
+        for namespace in COLLECTION_NAMESPACES.get(collection, ()):
+            self.invalidate(institution_id, namespace)
+            if namespace in GLOBAL_NAMESPACES:
+                # Login lookups are stored in the global scope
+                self.invalidate(GLOBAL_SCOPE, namespace)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+tenant_cache = TenantCache()
+
+
+# ============================================================
+# READ-THROUGH ACCESSORS
+# ============================================================
+
+async def get_queues(db, institution_id: str) -> list:
+    """Queues for an institution (cached; treat the result as read-only)"""
+    return await tenant_cache.get_or_load(
+        institution_id, "queues", None,
+        lambda: db.queues.find({"institution_id": institution_id}, {"_id": 0}).to_list(100)
+    )
+
+
+async def get_users(db, institution_id: str) -> list:
+    """Staff users for an institution (cached; treat the result as read-only)"""
+    return await tenant_cache.get_or_load(
+        institution_id, "users", None,
+        lambda: db.users.find({"institution_id": institution_id}, {"_id": 0}).to_list(100)
+    )
+
+
+async def get_user_by_email(db, email: str) -> Optional[dict]:
+    """User lookup for login, before the tenant is known (emails are stored lowercase)"""
+    email = email.strip().lower()
+    # Misses aren't cached: a user provisioned after a failed login can sign in right away
+    return await tenant_cache.get_or_load(
+        None, "user_by_email", email,
+        lambda: db.users.find_one({"email": email}, {"_id": 0}),
+        cache_none=False
+    )
+
+
+async def find_queue_for_category(db, institution_id: str, category: str) -> Optional[dict]:
+    """Pick the queue whose name best matches a triage category (used by AI routing)"""
+    queues = await get_queues(db, institution_id)
+    needle = category.replace("_", " ").lower()
+    for queue in queues:
+        if needle in queue["name"].lower():
+            return queue
+    for queue in queues:
+        if queue["name"].lower().startswith("general"):
+            return queue
+    return None
+
+
+# ============================================================
+# CROSS-INSTANCE INVALIDATION (REPLICA SETS ONLY)
+# ============================================================
+
+async def watch_for_invalidations(db):
+    """
+    Listen to a change stream on the cached collections and invalidate affected tenants.
+    Change streams require a replica set; on a standalone mongod this logs and exits.
+    """
+    watched = sorted(set(COLLECTION_NAMESPACES) | set(REGISTRY_COLLECTIONS))
+    pipeline = [{"$match": {"ns.coll": {"$in": watched}}}]
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                logger.info("Tenant cache change stream started")
+                async for change in stream:
+                    collection = change["ns"]["coll"]
+                    full_document = change.get("fullDocument") or {}
+                    # Deletes carry no document, so drop the collection for every tenant
+                    institution_id = full_document.get("institution_id")
+                    if collection == "institutions":
+                        institution_id = full_document.get("id")
+                    tenant_cache.invalidate_collection(collection, institution_id)
+                    if collection in REGISTRY_COLLECTIONS:
+                        institution_registry.request_refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if "replica set" in str(e).lower() or getattr(e, "code", None) == 40573:
+                logger.warning(f"Change streams unavailable, relying on TTL expiry: {e}")
+                return
+            logger.error(f"Tenant cache change stream failed, restarting: {e}")
+            # Anything cached while the stream was down may be stale
+            tenant_cache.clear()
+            institution_registry.request_refresh()
+            await asyncio.sleep(5)
@@ -0,0 +1,400 @@
+"""
+Public student self-service chatbot.
+
+`/api/chatbot/{institution_slug}/message` is unauthenticated and sees mostly the
+same questions over and over ("when is the FAFSA deadline?"), so answers are
+cached per institution under the normalized, PII-masked question:
+
+- exact match on a hash of the normalized question
+- near-duplicate match on the Jaccard similarity of content words against cached
+  questions sharing at least one word (CHATBOT_SIMILARITY_THRESHOLD)
+
+Answers come from KB passages (via `search_kb_articles`). Only confident answers
+are cached, tagged with the institution's KB version so a KB change retires
+them; when retrieval or the model is unsure the question is escalated to a
+ticket instead. Clients are rate limited per IP and per session, and each
+institution accepts at most CHATBOT_ESCALATIONS_PER_HOUR escalated tickets.
+
+Institutions can override the defaults below in an optional `chatbot` field:
+{"enabled": bool, "escalation_threshold": float, "similarity_threshold": float}.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, List, Mapping, Optional
+
+from ai_tools import mask_pii, search_kb_articles
+from cache import find_queue_for_category
+from llm import get_llm_backend
+from llm_json import IncrementalJSONParser, LlmOutputError
+from models import (
+    ChatbotMessageRequest, ChatbotMessageResponse, ChatbotModelOutput,
+    SearchKBRequest, Student, Ticket
+)
+from prompt_context import query_terms, select_passages, truncate_to_tokens
+from repository import new_document
+from ticket_summary import apply_message_to_ticket, student_summary_fields
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+CHATBOT_CACHE_TTL_SECONDS = int(os.getenv("CHATBOT_CACHE_TTL_SECONDS", "86400"))
+CHATBOT_SIMILARITY_THRESHOLD = float(os.getenv("CHATBOT_SIMILARITY_THRESHOLD", "0.8"))
+CHATBOT_ESCALATION_THRESHOLD = float(os.getenv("CHATBOT_ESCALATION_THRESHOLD", "0.5"))
+CHATBOT_CONTEXT_TOKENS = int(os.getenv("CHATBOT_CONTEXT_TOKENS", "1200"))
+CHATBOT_RATE_PER_MINUTE = float(os.getenv("CHATBOT_RATE_PER_MINUTE", "10"))
+CHATBOT_RATE_BURST = int(os.getenv("CHATBOT_RATE_BURST", "5"))
+CHATBOT_ESCALATIONS_PER_HOUR = float(os.getenv("CHATBOT_ESCALATIONS_PER_HOUR", "60"))
+CHATBOT_ESCALATION_BURST = int(os.getenv("CHATBOT_ESCALATION_BURST", "10"))
+NEAR_DUPLICATE_CANDIDATES = 50
+# Recipient domain of escalated messages for institutions without a `domain`
+CHATBOT_FALLBACK_DOMAIN = os.getenv("CHATBOT_FALLBACK_DOMAIN", "localhost")
+
+# Words that carry no meaning for matching questions against each other
+STOPWORDS = {
+    "the", "and", "for", "what", "when", "where", "how", "why", "who", "which",
+    "does", "can", "could", "would", "should", "will", "are", "was", "were",
+    "you", "your", "have", "has", "had", "about", "with", "this", "that",
+    "there", "get", "need", "want", "please", "hello", "thanks", "thank",
+}
+
+SYSTEM_MESSAGE = """You are the financial aid office's self-service assistant, answering students' questions on the office website.
+
+RULES:
+1. Answer ONLY from the Knowledge Base passages provided. If they do not answer the question, say so.
+2. NEVER state award amounts, balances or anything about a specific student's account.
+3. Keep answers short (under 120 words), friendly and plain.
+4. Rate how fully the passages answer the question as "confidence" between 0 and 1.
+
+Respond in this exact JSON format (answer first):
+{"answer": "...", "confidence": 0.0}
+"""
+
+ESCALATED_ANSWER = (
+    "I'm not able to answer that confidently, so I've passed your question to a "
+    "financial aid counselor. They will reply to {email}."
+)
+ESCALATION_LIMITED_ANSWER = (
+    "I'm not able to answer that confidently, and our counselors are receiving a lot "
+    "of questions right now. Please try again later or contact the financial aid office directly."
+)
+NEEDS_EMAIL_ANSWER = (
+    "I'm not able to answer that confidently. If you share your email address, "
+    "a financial aid counselor will follow up with you."
+)
+
+
+def chatbot_settings(institution: Mapping) -> dict:
+    """Defaults overridden by the institution's `chatbot` settings"""
+    return {
+        "enabled": True,
+        "escalation_threshold": CHATBOT_ESCALATION_THRESHOLD,
+        "similarity_threshold": CHATBOT_SIMILARITY_THRESHOLD,
+        **(institution.get("chatbot") or {}),
+    }
+
+
+# ============================================================
+# QUESTION NORMALIZATION
+# ============================================================
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^a-z0-9\s]", " ", text.lower()).split())
+
+
+def question_words(normalized: str) -> List[str]:
+    """Sorted content words used for near-duplicate matching"""
+    return sorted(set(query_terms(normalized)) - STOPWORDS)
+
+
+def question_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def jaccard(a: List[str], b: List[str]) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+# ============================================================
+# RATE LIMITING
+# ============================================================
+
+class TokenBucket:
+    """`capacity` requests at once, refilled at `rate` per second"""
+
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per client key, keeping the most recently seen `max_keys`"""
+
+    def __init__(
+        self,
+        capacity: int = CHATBOT_RATE_BURST,
+        per_minute: float = CHATBOT_RATE_PER_MINUTE,
+        max_keys: int = 10000
+    ):
+        self.capacity = capacity
+        self.rate = per_minute / 60
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, *keys: str) -> float:
+        """Charge every key; returns the longest wait if any of them is exhausted"""
+        wait = 0.0
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.capacity, self.rate)
+            self._buckets.move_to_end(key)
+            wait = max(wait, bucket.take())
+        while len(self._buckets) > self.max_keys:
+            # A bucket unused long enough to be evicted has refilled anyway
+            self._buckets.popitem(last=False)
+        return wait
+
+
+rate_limiter = RateLimiter()
+# Escalations create Student and Ticket documents, so each institution gets its own budget
+escalation_limiter = RateLimiter(capacity=CHATBOT_ESCALATION_BURST, per_minute=CHATBOT_ESCALATIONS_PER_HOUR / 60)
+
+
+# ============================================================
+# ANSWER CACHE
+# ============================================================
+
+async def find_cached_answer(db, institution: Mapping, normalized: str, words: List[str],
+                             similarity_threshold: float = CHATBOT_SIMILARITY_THRESHOLD) -> Optional[dict]:
+    """Cached answer, built from the current KB, for the same or a near-duplicate question"""
+    institution_id = institution["id"]
+    live = {"kb_version": institution.get("kb_version"), "expires_at": {"$gt": datetime.now(timezone.utc)}}
+    projection = {"_id": 0, "question_hash": 1, "words": 1, "answer": 1, "confidence": 1, "cited_kb": 1}
+
+    hit = await db.chatbot_answers.find_one(
+        {"institution_id": institution_id, "question_hash": question_hash(normalized), **live},
+        projection
+    )
+    if hit is None and words:
+        candidates = await db.chatbot_answers.find(
+            {"institution_id": institution_id, "words": {"$in": words}, **live},
+            projection
+        ).sort("hits", -1).to_list(NEAR_DUPLICATE_CANDIDATES)
+        scored = [(jaccard(words, c["words"]), c) for c in candidates]
+        best = max(scored, key=lambda pair: pair[0], default=(0.0, None))
+        if best[0] >= similarity_threshold:
+            hit = best[1]
+
+    if hit is not None:
+        await db.chatbot_answers.update_one(
+            {"institution_id": institution_id, "question_hash": hit["question_hash"]},
+            {"$inc": {"hits": 1}}
+        )
+    return hit
+
+
+async def store_answer(db, institution: Mapping, normalized: str, words: List[str], answer: str,
+                       confidence: float, cited_kb: List[dict]):
+    now = utcnow()
+    await db.chatbot_answers.update_one(
+        {"institution_id": institution["id"], "question_hash": question_hash(normalized)},
+        {
+            "$set": {
+                "kb_version": institution.get("kb_version"),
+                "question": normalized,
+                "words": words,
+                "answer": answer,
+                "confidence": confidence,
+                "cited_kb": cited_kb,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=CHATBOT_CACHE_TTL_SECONDS),
+            },
+            "$setOnInsert": {"hits": 0},
+        },
+        upsert=True
+    )
+
+
+# ============================================================
+# ESCALATION
+# ============================================================
+
+async def escalate_to_ticket(db, institution: Mapping, question: str, email: str,
+                             name: Optional[str], category: str) -> dict:
+    """Open a chat-channel ticket with the student's question as its first message"""
+    institution_id = institution["id"]
+    email = email.strip().lower()
+
+    student = await db.students.find_one({"institution_id": institution_id, "email": email}, {"_id": 0})
+    if student is None:
+        student = new_document(Student, institution_id=institution_id, email=email, name=name or email)
+        await db.students.insert_one(dict(student))
+
+    queue = await find_queue_for_category(db, institution_id, category)
+    ticket = new_document(
+        Ticket,
+        institution_id=institution_id,
+        student_id=student["id"],
+        subject=truncate_to_tokens(question.strip(), 20),
+        category=category,
+        channel="chat",
+        queue_id=queue["id"] if queue else None
+    )
+    ticket.update(student_summary_fields(student))
+    await db.tickets.insert_one(dict(ticket))
+
+    message = {
+        "id": str(uuid.uuid4()),
+        "institution_id": institution_id,
+        "ticket_id": ticket["id"],
+        "sender_email": email,
+        "recipient_email": f"finaid@{institution.get('domain') or CHATBOT_FALLBACK_DOMAIN}",
+        "subject": ticket["subject"],
+        "body": question,
+        "direction": "inbound",
+        "thread_id": None,
+        "created_at": ticket["created_at"]
+    }
+    await db.messages.insert_one(dict(message))
+    await apply_message_to_ticket(db, message)
+    return ticket
+
+
+# ============================================================
+# ANSWERING
+# ============================================================
+
+TICKET_CATEGORIES = {"fafsa", "verification", "sap_appeal", "billing", "general"}
+
+
+def _retrieval_confidence(words: List[str], passages: list) -> float:
+    """Share of the question's content words found in the selected passages"""
+    if not words or not passages:
+        return 0.0
+    text = " ".join(f"{p.heading} {p.text}" for p in passages).lower()
+    return sum(1 for w in words if w in text) / len(words)
+
+
+async def answer_stream(
+    db,
+    institution: Mapping,
+    request: ChatbotMessageRequest,
+    session_id: str,
+    on_escalated: Optional[Callable[[dict], Awaitable]] = None
+) -> AsyncIterator[dict]:
+    """
+    Yield `{"type": "delta", "text": ...}` events while the answer streams in, then
+    one `{"type": "result", ...}` event with the ChatbotMessageResponse fields. The
+    result's answer is authoritative (a streamed answer may end up escalated).
+    """
+    institution_id = institution["id"]
+    settings = chatbot_settings(institution)
+    # Cache keys and the stored question are built from the masked text, like the prompt
+    masked_question, _ = mask_pii(request.message)
+    normalized = normalize_question(masked_question)
+    words = question_words(normalized)
+
+    cached = await find_cached_answer(db, institution, normalized, words, settings["similarity_threshold"])
+    if cached is not None:
+        yield {"type": "result", **ChatbotMessageResponse(
+            answer=cached["answer"],
+            confidence=cached["confidence"],
+            cited_kb=cached["cited_kb"],
+            cached=True,
+            session_id=session_id
+        ).model_dump()}
+        return
+
+    kb_response = await search_kb_articles(db, SearchKBRequest(
+        institution_id=institution_id, query=request.message, limit=5
+    ))
+    passages = select_passages(kb_response.articles, request.message, CHATBOT_CONTEXT_TOKENS)
+    confidence = _retrieval_confidence(words, passages)
+    cited_kb = []
+    for passage in passages:
+        if all(c["title"] != passage.article["title"] for c in cited_kb):
+            cited_kb.append({"title": passage.article["title"], "category": passage.article["category"]})
+
+    answer = ""
+    threshold = settings["escalation_threshold"]
+    if confidence >= threshold:
+        kb_context = "".join(
+            f"\n\n[{p.article['title']} > {p.heading}]\n{p.text}" for p in passages
+        )
+        prompt = f"Student question:\n{masked_question}\n\nKnowledge Base passages:{kb_context}"
+
+        parser = IncrementalJSONParser()
+        try:
+            async for chunk in get_llm_backend().stream(
+                system_message=SYSTEM_MESSAGE,
+                prompt=prompt,
+                session_id=f"chatbot_{institution_id}_{session_id}",
+                tool="chatbot"
+            ):
+                partial = parser.feed(chunk).get("answer")
+                if isinstance(partial, str) and partial.startswith(answer) and len(partial) > len(answer):
+                    yield {"type": "delta", "text": partial[len(answer):]}
+                    answer = partial
+            output = parser.result(ChatbotModelOutput)
+            answer = output.answer
+            # Trust the weaker of retrieval coverage and the model's own rating
+            confidence = min(confidence, output.confidence)
+        except LlmOutputError as e:
+            logger.error(f"Chatbot returned unusable output: {e}")
+            confidence = 0.0
+        except Exception as e:
+            logger.error(f"Chatbot LLM call failed: {e}")
+            confidence = 0.0
+
+    if confidence >= threshold:
+        await store_answer(db, institution, normalized, words, answer, round(confidence, 2), cited_kb)
+        yield {"type": "result", **ChatbotMessageResponse(
+            answer=answer, confidence=round(confidence, 2), cited_kb=cited_kb, session_id=session_id
+        ).model_dump()}
+        return
+
+    ticket_id = None
+    if request.student_email and escalation_limiter.check(f"institution:{institution_id}"):
+        logger.warning(f"Chatbot escalation limit reached for institution {institution_id}")
+        answer = ESCALATION_LIMITED_ANSWER
+    elif request.student_email:
+        top_category = passages[0].article["category"] if passages else "general"
+        ticket = await escalate_to_ticket(
+            db, institution, request.message, request.student_email, request.student_name,
+            top_category if top_category in TICKET_CATEGORIES else "general"
+        )
+        ticket_id = ticket["id"]
+        if on_escalated is not None:
+            await on_escalated(ticket)
+        answer = ESCALATED_ANSWER.format(email=request.student_email.strip().lower())
+    else:
+        answer = NEEDS_EMAIL_ANSWER
+
+    yield {"type": "result", **ChatbotMessageResponse(
+        answer=answer,
+        confidence=round(confidence, 2),
+        cited_kb=cited_kb,
+        escalated=ticket_id is not None,
+        ticket_id=ticket_id,
+        session_id=session_id
+    ).model_dump()}
@@ -0,0 +1,243 @@
+"""
+Speculative draft pre-generation for hot tickets.
+
+Agents pay the full LLM latency when they open a ticket and the draft is
+generated on demand. For urgent/high priority tickets this scheduler generates
+the draft ahead of time and stores it in `draft_cache`, so `api_draft_reply` can
+return it instantly when the workspace auto-generates a draft on open
+(`use_prefetched`); an explicit "Regenerate" always calls the model.
+
+- Tickets are enqueued when they become hot (priority change, new inbound message)
+  and by a periodic sweep; the queue is ordered by priority, then SLA age.
+  Tickets whose last message is outbound are waiting on the student and skipped.
+- Each institution gets at most DRAFT_PREFETCH_CONCURRENCY generations at a time
+  and DRAFT_PREFETCH_HOURLY_BUDGET per rolling hour.
+- Cached drafts are keyed by a hash of the latest inbound message and dropped
+  whenever a new message arrives on the ticket. A draft whose thread changed
+  while it was being generated is discarded after writing (write, then re-check
+  the latest message), so it is never served for the newer thread.
+- The sweep only looks at hot tickets updated in the last
+  DRAFT_PREFETCH_SWEEP_WINDOW_HOURS (indexed on status, priority, updated_at) and
+  skips tickets whose `draft_prefetched_for` already equals their `last_inbound_at`.
+"""
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Optional
+
+from models import DraftReplyRequest, DraftReplyResponse
+from timestamps import parse_timestamp, utcnow
+
+logger = logging.getLogger(__name__)
+
+DRAFT_PREFETCH_CONCURRENCY = int(os.getenv("DRAFT_PREFETCH_CONCURRENCY", "2"))
+DRAFT_PREFETCH_HOURLY_BUDGET = int(os.getenv("DRAFT_PREFETCH_HOURLY_BUDGET", "60"))
+DRAFT_PREFETCH_WORKERS = int(os.getenv("DRAFT_PREFETCH_WORKERS", "4"))
+DRAFT_PREFETCH_SWEEP_SECONDS = float(os.getenv("DRAFT_PREFETCH_SWEEP_SECONDS", "60"))
+DRAFT_PREFETCH_SWEEP_WINDOW_HOURS = float(os.getenv("DRAFT_PREFETCH_SWEEP_WINDOW_HOURS", "24"))
+
+HOT_PRIORITIES = {"urgent": 0, "high": 1}
+OPEN_STATUSES = ("open", "in_progress")
+THREAD_CONTEXT_MESSAGES = 3  # matches what the workspace sends with a draft request
+
+
+def message_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _timestamp(value) -> float:
+    """Sortable SLA age key for stored timestamps (BSON dates, or ISO strings not yet migrated)"""
+    moment = parse_timestamp(value)
+    return moment.timestamp() if moment is not None else time.time()
+
+
+def is_hot(ticket: dict) -> bool:
+    return (
+        ticket.get("priority") in HOT_PRIORITIES
+        and ticket.get("status") != "closed"
+        and ticket.get("last_message_direction") != "outbound"
+    )
+
+
+async def get_cached_draft(db, request: DraftReplyRequest) -> Optional[DraftReplyResponse]:
+    """Pre-generated draft for exactly this latest message, if there is one"""
+    doc = await db.draft_cache.find_one({
+        "institution_id": request.institution_id,
+        "ticket_id": request.ticket_id,
+        "message_hash": message_hash(request.latest_message),
+    }, {"_id": 0, "draft": 1})
+    return DraftReplyResponse(**doc["draft"]) if doc else None
+
+
+async def invalidate_draft(db, ticket_id: str):
+    """Drop pre-generated drafts for a ticket (its thread changed)"""
+    await db.draft_cache.delete_many({"ticket_id": ticket_id})
+
+
+def _undrafted_filter() -> dict:
+    """Recently active hot tickets whose latest inbound message has no prefetched draft"""
+    return {
+        "status": {"$in": list(OPEN_STATUSES)},
+        "priority": {"$in": list(HOT_PRIORITIES)},
+        "updated_at": {"$gte": utcnow() - timedelta(hours=DRAFT_PREFETCH_SWEEP_WINDOW_HOURS)},
+        "last_message_direction": "inbound",
+        # Drafted tickets are filtered before the sweep's limit so they can't crowd out the others
+        "$expr": {"$ne": [{"$ifNull": ["$draft_prefetched_for", None]}, "$last_inbound_at"]},
+    }
+
+
+class DraftPrefetcher:
+    """Priority-ordered background generation of drafts, bounded per institution"""
+
+    def __init__(self, db):
+        self.db = db
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._queued = set()
+        self._sequence = itertools.count()
+        self._semaphores: dict = {}
+        self._spent: dict = {}
+        self._tasks = []
+        self.enabled = False
+        self.generated = 0
+        self.skipped_budget = 0
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, ticket: dict):
+        """Schedule a draft for the ticket if it is hot and not already queued"""
+        if not self.enabled or not is_hot(ticket) or ticket["id"] in self._queued:
+            return
+        self._queued.add(ticket["id"])
+        key = (HOT_PRIORITIES[ticket["priority"]], _timestamp(ticket.get("created_at")), next(self._sequence))
+        self._queue.put_nowait((key, ticket["id"], ticket["institution_id"]))
+
+    async def start(self):
+        self.enabled = True
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(DRAFT_PREFETCH_WORKERS)]
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self):
+        self.enabled = False
+        for task in self._tasks:
+            task.cancel()
+
+    def _take_budget(self, institution_id: str) -> bool:
+        """Spend one generation from the institution's rolling hourly budget if any is left"""
+        spent = self._spent.setdefault(institution_id, deque())
+        cutoff = time.monotonic() - 3600
+        while spent and spent[0] < cutoff:
+            spent.popleft()
+        if len(spent) >= DRAFT_PREFETCH_HOURLY_BUDGET:
+            return False
+        spent.append(time.monotonic())
+        return True
+
+    async def _worker(self):
+        while True:
+            _, ticket_id, institution_id = await self._queue.get()
+            self._queued.discard(ticket_id)
+            semaphore = self._semaphores.setdefault(institution_id, asyncio.Semaphore(DRAFT_PREFETCH_CONCURRENCY))
+            async with semaphore:
+                try:
+                    await self._generate(ticket_id, institution_id)
+                except Exception as e:
+                    logger.error(f"Draft prefetch failed for ticket {ticket_id}: {e}")
+
+    async def _generate(self, ticket_id: str, institution_id: str):
+        from ai_tools import draft_reply_with_ai
+
+        ticket = await self.db.tickets.find_one({"id": ticket_id, "institution_id": institution_id}, {"_id": 0})
+        if not ticket or not is_hot(ticket):
+            return
+
+        messages = await self.db.messages.find(
+            {"ticket_id": ticket_id},
+            {"_id": 0, "id": 1, "sender_email": 1, "body": 1, "direction": 1, "created_at": 1}
+        ).sort("created_at", -1).to_list(20)
+        latest_inbound = next((m for m in messages if m["direction"] == "inbound"), None)
+        if latest_inbound is None:
+            return
+
+        latest_hash = message_hash(latest_inbound["body"])
+        if await self.db.draft_cache.find_one({"ticket_id": ticket_id, "message_hash": latest_hash}, {"_id": 1}):
+            await self._mark_prefetched(ticket_id, latest_inbound)
+            return
+
+        student = await self.db.students.find_one({"id": ticket["student_id"]}, {"_id": 0})
+        if not student:
+            return
+
+        request = DraftReplyRequest(
+            institution_id=institution_id,
+            ticket_id=ticket_id,
+            student_email=student["email"],
+            student_name=student["name"],
+            latest_message=latest_inbound["body"],
+            thread_context=[
+                {"sender": m["sender_email"], "body": m["body"]}
+                for m in reversed(messages[:THREAD_CONTEXT_MESSAGES])
+            ],
+            student_notes=student.get("notes")
+        )
+        if not self._take_budget(institution_id):
+            self.skipped_budget += 1
+            return
+        draft = await draft_reply_with_ai(self.db, request)
+
+        key = {"ticket_id": ticket_id, "message_hash": latest_hash}
+        await self.db.draft_cache.update_one(
+            key,
+            {"$set": {
+                "institution_id": institution_id,
+                "message_id": messages[0]["id"],
+                "draft": draft.model_dump(),
+                "created_at": utcnow(),
+            }},
+            upsert=True
+        )
+        # A message stored after the write invalidates the cache itself; one stored while
+        # the model was running did so too early, so the draft is dropped here instead
+        latest = await self.db.messages.find(
+            {"ticket_id": ticket_id}, {"_id": 0, "id": 1}
+        ).sort("created_at", -1).to_list(1)
+        if latest and latest[0]["id"] != messages[0]["id"]:
+            await self.db.draft_cache.delete_one({**key, "message_id": messages[0]["id"]})
+            return
+        await self._mark_prefetched(ticket_id, latest_inbound)
+        self.generated += 1
+
+    async def _mark_prefetched(self, ticket_id: str, message: dict):
+        """Record on the ticket which inbound message has a draft, so the sweep can skip it"""
+        await self.db.tickets.update_one(
+            {"id": ticket_id}, {"$set": {"draft_prefetched_for": message["created_at"]}}
+        )
+
+    async def _sweep_loop(self):
+        """Periodically enqueue hot tickets that have no cached draft"""
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Draft prefetch sweep failed: {e}")
+            await asyncio.sleep(DRAFT_PREFETCH_SWEEP_SECONDS)
+
+    async def backlog(self) -> int:
+        """Hot tickets the sweep would pick up (no draft for their latest inbound message)"""
+        return await self.db.tickets.count_documents(_undrafted_filter())
+
+    async def sweep(self, limit: int = 500):
+        """Enqueue recently active hot tickets whose latest inbound message has no draft yet"""
+        tickets = await self.db.tickets.find(
+            _undrafted_filter(),
+            {"_id": 0, "id": 1, "institution_id": 1, "priority": 1, "status": 1, "created_at": 1}
+        ).sort("updated_at", 1).to_list(limit)
+        for ticket in tickets:
+            self.enqueue(ticket)
@@ -0,0 +1,64 @@
+"""
+Fast JSON responses for trusted Mongo documents.
+
+By default FastAPI walks every returned dict with `jsonable_encoder` and then
+serializes it with the stdlib encoder. Documents read from Motor with `_id`
+projected out are already JSON-safe (strings, numbers, lists, dicts, datetimes),
+so list endpoints return `trusted_json(payload)` instead: the payload goes
+straight to orjson (or the stdlib encoder when orjson is not installed) without
+the extra walk. FAST_JSON=false restores FastAPI's default path everywhere.
+
+See benchmark_serialization.py for the per-payload cost of each path.
+"""
+import json
+import os
+from datetime import date, datetime
+from typing import Any
+from uuid import UUID
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = os.environ.get("FAST_JSON", "true").lower() == "true"
+
+
+def _default(value: Any):
+    """Types orjson/json can't serialize natively (ObjectId, models, sets, ...)"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, UUID):
+        return str(value)
+    # bson.ObjectId, Decimal128, ...
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with `dumps`"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def trusted_json(content: Any, status_code: int = 200) -> JSONResponse:
+    """Response for a payload built from Mongo documents, skipping jsonable_encoder"""
+    if FAST_JSON:
+        return FastJSONResponse(content, status_code=status_code)
+    return JSONResponse(jsonable_encoder(content), status_code=status_code)
@@ -0,0 +1,330 @@
+"""
+Compact binary UUID storage for ids.
+
+Application code handles ids as 36-character UUID strings. With
+UUID_STORAGE=binary, the database handle returned by `wrap_database` stores the
+id fields below as BSON Binary subtype 4 (16 bytes) instead: filters, documents,
+updates, bulk operations and aggregation `$match` stages are encoded on the way
+in, and every uuid.UUID in results (documents, cursors, aggregations, change
+streams) is decoded back to the same string on the way out. Index entries on
+id fields shrink to well under half their string size.
+
+    UUID_STORAGE=string   (default) ids stay strings; wrap_database is a no-op
+    UUID_STORAGE=mixed    writes binary; filters match both representations
+                          (use while migrate_ids.py runs)
+    UUID_STORAGE=binary   writes and filters binary only
+
+In mixed mode equality and `$in` conditions on id fields match either form, and
+range conditions (`$lt`/`$gt`...) become an `$or` over both, since Mongo only
+compares values of the same BSON type. Sorts still order all binary ids after
+all string ids, so keyset pagination on (created_at, id) can misplace items
+that share the exact same created_at until migrate_ids.py finishes. `$lookup`
+joins on id fields (localField/foreignField, `$expr`) are not translated: they
+only match documents whose ids are already in the same form, so queries that
+must be exact during the migration filter on explicit id values instead.
+
+Only strings that round-trip exactly through uuid.UUID are converted, so
+non-UUID values in id fields (e.g. a student's SIS number in `student_id`) are
+stored unchanged. Upserts always filter on the binary form, so the inserted
+document gets binary ids even in mixed mode.
+"""
+import copy
+import os
+import uuid
+from typing import Any
+
+UUID_STORAGE = os.environ.get("UUID_STORAGE", "string").lower()
+
+# Keyword arguments for AsyncIOMotorClient: uuid.UUID <-> Binary subtype 4
+MONGO_UUID_OPTIONS = {"uuidRepresentation": "standard"}
+
+ID_FIELDS = frozenset({
+    "id", "institution_id", "ticket_id", "student_id", "queue_id", "assignee_id",
+    "user_id", "created_by", "previous_queue_id", "covered_message_id", "thread_id", "event_id",
+})
+
+_LOGICAL = ("$and", "$or", "$nor")
+_RANGE = ("$lt", "$lte", "$gt", "$gte")
+
+
+def _as_uuid(value: Any):
+    """uuid.UUID for a canonical UUID string, else the value unchanged"""
+    if isinstance(value, str) and len(value) == 36 and value[8] == "-":
+        try:
+            parsed = uuid.UUID(value)
+        except ValueError:
+            return value
+        if str(parsed) == value:
+            return parsed
+    return value
+
+
+def _is_id_field(key: str) -> bool:
+    return key.rsplit(".", 1)[-1] in ID_FIELDS
+
+
+def encode_document(value: Any) -> Any:
+    """Copy of a document (or update spec) with UUID-string id fields as uuid.UUID"""
+    if isinstance(value, dict):
+        encoded = {}
+        for key, item in value.items():
+            if _is_id_field(key):
+                if isinstance(item, list):
+                    encoded[key] = [_as_uuid(v) for v in item]
+                elif isinstance(item, str):
+                    encoded[key] = _as_uuid(item)
+                else:
+                    encoded[key] = encode_document(item)
+            else:
+                encoded[key] = encode_document(item)
+        return encoded
+    if isinstance(value, list):
+        return [encode_document(v) for v in value]
+    return value
+
+
+def _both(values: list, mixed: bool) -> list:
+    out = []
+    for value in values:
+        converted = _as_uuid(value)
+        out.append(converted)
+        if mixed and converted is not value:
+            out.append(value)
+    return out
+
+
+def _encode_condition(condition: Any, mixed: bool) -> Any:
+    if isinstance(condition, str):
+        converted = _as_uuid(condition)
+        if mixed and converted is not condition:
+            return {"$in": [converted, condition]}
+        return converted
+    if not isinstance(condition, dict):
+        return condition
+    encoded = {}
+    for op, operand in condition.items():
+        if op in ("$in", "$nin") and isinstance(operand, list):
+            encoded[op] = _both(operand, mixed)
+        elif op in ("$eq", "$ne") and isinstance(operand, str):
+            converted = _as_uuid(operand)
+            if mixed and converted is not operand:
+                encoded["$in" if op == "$eq" else "$nin"] = [converted, operand]
+            else:
+                encoded[op] = converted
+        elif op in _RANGE:
+            encoded[op] = _as_uuid(operand)
+        else:
+            encoded[op] = operand
+    return encoded
+
+
+def _is_uuid_range(condition: Any) -> bool:
+    return isinstance(condition, dict) and any(
+        op in _RANGE and _as_uuid(operand) is not operand for op, operand in condition.items()
+    )
+
+
+def encode_filter(query: Any, mixed: bool = False) -> Any:
+    """Copy of a query filter with conditions on id fields encoded"""
+    if not isinstance(query, dict):
+        return query
+    encoded = {}
+    either_form = []
+    for key, condition in query.items():
+        if key in _LOGICAL and isinstance(condition, list):
+            encoded[key] = [encode_filter(q, mixed) for q in condition]
+        elif _is_id_field(key) and mixed and _is_uuid_range(condition):
+            # Comparisons don't cross BSON types: compare binary ids to the binary form, strings to the string
+            either_form.append({"$or": [{key: _encode_condition(condition, False)}, {key: condition}]})
+        elif _is_id_field(key):
+            encoded[key] = _encode_condition(condition, mixed)
+        else:
+            encoded[key] = condition
+    if either_form:
+        encoded["$and"] = encoded.get("$and", []) + either_form
+    return encoded
+
+
+def encode_pipeline(pipeline: list, mixed: bool = False) -> list:
+    """Encode `$match` stages, including those in `$lookup`/`$unionWith` sub-pipelines"""
+    encoded = []
+    for stage in pipeline:
+        stage = dict(stage)
+        if "$match" in stage:
+            stage["$match"] = encode_filter(stage["$match"], mixed)
+        for op in ("$lookup", "$unionWith"):
+            if isinstance(stage.get(op), dict) and "pipeline" in stage[op]:
+                stage[op] = {**stage[op], "pipeline": encode_pipeline(stage[op]["pipeline"], mixed)}
+        encoded.append(stage)
+    return encoded
+
+
+def decode(value: Any) -> Any:
+    """uuid.UUID values anywhere in a result turned back into strings (in place for dicts/lists)"""
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (uuid.UUID, dict, list)):
+                value[key] = decode(item)
+        return value
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            if isinstance(item, (uuid.UUID, dict, list)):
+                value[i] = decode(item)
+        return value
+    return value
+
+
+# ============================================================
+# MOTOR WRAPPERS
+# ============================================================
+
+class _DecodingCursor:
+    """Wraps a Motor cursor (find/aggregate); chained modifiers return the wrapper"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in ("sort", "limit", "skip", "batch_size", "hint", "max_time_ms", "collation"):
+            def chained(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chained
+        return attr
+
+    async def to_list(self, length):
+        return decode(await self._cursor.to_list(length))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return decode(await self._cursor.__anext__())
+
+
+class _DecodingStream:
+    """Wraps a change stream so events carry string ids"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def __aenter__(self):
+        self._stream = await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._stream.__aexit__(*exc)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return decode(await self._stream.__anext__())
+
+
+class IdCodecCollection:
+    def __init__(self, collection, mixed: bool):
+        self._collection = collection
+        self._mixed = mixed
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def _filter(self, query, upsert: bool = False):
+        return encode_filter(query, self._mixed and not upsert)
+
+    def _encode_request(self, request):
+        request = copy.copy(request)
+        if getattr(request, "_filter", None) is not None:
+            request._filter = self._filter(request._filter, getattr(request, "_upsert", False))
+        if getattr(request, "_doc", None) is not None:
+            request._doc = encode_document(request._doc)
+        return request
+
+    def find(self, filter=None, *args, **kwargs):
+        return _DecodingCursor(self._collection.find(self._filter(filter or {}), *args, **kwargs))
+
+    async def find_one(self, filter=None, *args, **kwargs):
+        return decode(await self._collection.find_one(self._filter(filter or {}), *args, **kwargs))
+
+    async def find_one_and_update(self, filter, update, *args, **kwargs):
+        return decode(await self._collection.find_one_and_update(
+            self._filter(filter, kwargs.get("upsert", False)), encode_document(update), *args, **kwargs
+        ))
+
+    async def insert_one(self, document, *args, **kwargs):
+        encoded = encode_document(document)
+        result = await self._collection.insert_one(encoded, *args, **kwargs)
+        document.setdefault("_id", encoded["_id"])
+        return result
+
+    async def insert_many(self, documents, *args, **kwargs):
+        documents = list(documents)
+        encoded = [encode_document(doc) for doc in documents]
+        result = await self._collection.insert_many(encoded, *args, **kwargs)
+        for doc, enc in zip(documents, encoded):
+            doc.setdefault("_id", enc["_id"])
+        return result
+
+    async def update_one(self, filter, update, *args, **kwargs):
+        return await self._collection.update_one(
+            self._filter(filter, kwargs.get("upsert", False)), encode_document(update), *args, **kwargs
+        )
+
+    async def update_many(self, filter, update, *args, **kwargs):
+        return await self._collection.update_many(
+            self._filter(filter, kwargs.get("upsert", False)), encode_document(update), *args, **kwargs
+        )
+
+    async def delete_one(self, filter, *args, **kwargs):
+        return await self._collection.delete_one(self._filter(filter), *args, **kwargs)
+
+    async def delete_many(self, filter, *args, **kwargs):
+        return await self._collection.delete_many(self._filter(filter), *args, **kwargs)
+
+    async def count_documents(self, filter, *args, **kwargs):
+        return await self._collection.count_documents(self._filter(filter), *args, **kwargs)
+
+    async def distinct(self, key, filter=None, *args, **kwargs):
+        return decode(await self._collection.distinct(key, self._filter(filter or {}), *args, **kwargs))
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        return _DecodingCursor(self._collection.aggregate(encode_pipeline(pipeline, self._mixed), *args, **kwargs))
+
+    async def bulk_write(self, requests, *args, **kwargs):
+        return await self._collection.bulk_write([self._encode_request(r) for r in requests], *args, **kwargs)
+
+
+class IdCodecDatabase:
+    """Database handle whose collections encode/decode ids; other attributes pass through"""
+
+    def __init__(self, db, mixed: bool):
+        self._db = db
+        self._mixed = mixed
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> IdCodecCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = IdCodecCollection(self._db[name], self._mixed)
+        return collection
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or hasattr(type(self._db), name):
+            return getattr(self._db, name)
+        return self[name]
+
+    def watch(self, *args, **kwargs):
+        return _DecodingStream(self._db.watch(*args, **kwargs))
+
+
+def wrap_database(db, storage: str = UUID_STORAGE):
+    """`db` itself for string storage, else an id-encoding wrapper"""
+    if storage == "string":
+        return db
+    if storage not in ("binary", "mixed"):
+        raise ValueError(f"Unknown UUID_STORAGE: {storage}")
+    return IdCodecDatabase(db, mixed=storage == "mixed")
@@ -0,0 +1,187 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+Clients that retry (axios timeouts, double-clicked send buttons) send the same
+`Idempotency-Key` header with each attempt, and the request runs once:
+
+- The first request claims the key in `idempotency_keys` (unique _id) and runs.
+  Its response (status, all headers, body) is stored for
+  IDEMPOTENCY_TTL_SECONDS; a TTL index on `expires_at` removes it.
+- Later duplicates get the stored response with `Idempotent-Replayed: true`.
+- Duplicates that arrive while the first request is still running wait for it:
+  in the same process they share one future, across instances they poll the
+  stored record (up to IDEMPOTENCY_WAIT_SECONDS, then 409).
+- Reusing a key for a different request (query string or body) is a 422.
+- 5xx, streaming (STREAMING_CONTENT_TYPES: SSE, the chatbot's NDJSON) and
+  oversized responses are not stored and pass through unbuffered; the key is
+  released so the client can retry.
+
+Keys are scoped per caller (Authorization header), method and path.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+
+from pymongo.errors import DuplicateKeyError
+from starlette.responses import JSONResponse, Response
+
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_ENABLED = os.environ.get("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "3600"))
+# How long a claimed key may stay in progress before another attempt can take it over
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "120"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "60"))
+IDEMPOTENCY_POLL_SECONDS = 0.25
+IDEMPOTENCY_MAX_BODY_BYTES = 1024 * 1024
+MAX_KEY_LENGTH = 255
+
+HEADER = "idempotency-key"
+
+# Incremental responses: buffering them would hold every event until the stream ends
+STREAMING_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+# Requests running in this process, by scope; duplicates await the stored record
+_inflight: dict = {}
+
+
+class _KeyConflict(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _scope(request, key: str) -> str:
+    caller = request.headers.get("authorization", "")
+    return hashlib.sha256("\0".join((caller, request.method, request.url.path, key)).encode()).hexdigest()
+
+
+def _fingerprint(request, body: bytes) -> str:
+    return hashlib.sha256(request.url.query.encode() + b"\0" + body).hexdigest()
+
+
+def _replay(record: dict) -> Response:
+    response = Response(content=bytes(record["body"]), status_code=record["status_code"])
+    # Raw pairs so repeated headers (Set-Cookie) come back as they were sent; older records kept only the type
+    headers = record.get("headers") or [["content-type", record.get("content_type", "")]]
+    response.raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1")) for name, value in headers
+    ] + [(b"idempotent-replayed", b"true")]
+    return response
+
+
+async def _claim(db, scope: str, fingerprint: str) -> Optional[dict]:
+    """None once this request owns the key; the stored record if another request already completed it"""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        now = utcnow()
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": scope, "fingerprint": fingerprint, "status": "in_progress",
+                "created_at": now, "expires_at": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await db.idempotency_keys.find_one({"_id": scope})
+        if existing is None:
+            # Released (failed attempt) or expired in between; try again
+            continue
+        if existing["fingerprint"] != fingerprint:
+            raise _KeyConflict(422, "Idempotency-Key was already used for a different request")
+        if existing["status"] == "completed":
+            return existing
+        if existing["expires_at"] <= now:
+            # The first attempt died without finishing: take the key over
+            taken = await db.idempotency_keys.find_one_and_update(
+                {"_id": scope, "status": "in_progress", "expires_at": existing["expires_at"]},
+                {"$set": {"created_at": now, "expires_at": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}}
+            )
+            if taken is not None:
+                return None
+            continue
+        if time.monotonic() > deadline:
+            raise _KeyConflict(409, "A request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+async def _execute(db, request, call_next, scope: str, fingerprint: str):
+    """(response, stored record or None) for the request that owns the key"""
+    stored = await _claim(db, scope, fingerprint)
+    if stored is not None:
+        return _replay(stored), stored
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await db.idempotency_keys.delete_one({"_id": scope})
+        raise
+
+    if response.headers.get("content-type", "").startswith(STREAMING_CONTENT_TYPES):
+        await db.idempotency_keys.delete_one({"_id": scope})
+        return response, None
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = list(response.raw_headers)
+    response = Response(content=body, status_code=response.status_code)
+    response.raw_headers = headers
+
+    if response.status_code >= 500 or len(body) > IDEMPOTENCY_MAX_BODY_BYTES:
+        await db.idempotency_keys.delete_one({"_id": scope})
+        return response, None
+
+    record = {
+        "status": "completed", "status_code": response.status_code,
+        "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers], "body": body,
+        "expires_at": utcnow() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    }
+    await db.idempotency_keys.update_one({"_id": scope}, {"$set": record})
+    return response, record
+
+
+def create_idempotency_middleware(get_db: Callable):
+    """HTTP middleware honouring Idempotency-Key on POST requests (get_db returns the database)"""
+
+    async def idempotency_middleware(request, call_next):
+        key = request.headers.get(HEADER)
+        if not IDEMPOTENCY_ENABLED or request.method != "POST" or not key:
+            return await call_next(request)
+        if len(key) > MAX_KEY_LENGTH:
+            return JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)
+
+        body = await request.body()
+        scope, fingerprint = _scope(request, key), _fingerprint(request, body)
+
+        pending = _inflight.get(scope)
+        if pending is not None:
+            owner_fingerprint, future = pending
+            if owner_fingerprint != fingerprint:
+                return JSONResponse(
+                    {"detail": "Idempotency-Key was already used for a different request"}, status_code=422
+                )
+            record = await asyncio.shield(future)
+            if record is not None:
+                return _replay(record)
+            # The first attempt's response wasn't stored; run (and claim) this one normally
+            return await idempotency_middleware(request, call_next)
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[scope] = (fingerprint, future)
+        record = None
+        try:
+            response, record = await _execute(get_db(), request, call_next, scope, fingerprint)
+            return response
+        except _KeyConflict as e:
+            return JSONResponse({"detail": e.detail}, status_code=e.status_code)
+        finally:
+            _inflight.pop(scope, None)
+            future.set_result(record)
+
+    return idempotency_middleware
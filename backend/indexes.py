@@ -0,0 +1,81 @@
+"""MongoDB index definitions, created idempotently at startup"""
+import logging
+
+from pymongo import ASCENDING, DESCENDING
+
+from jobs import JOB_RETENTION_SECONDS
+from retention import RETENTION_DELETE_AFTER_SECONDS
+from ticket_search import SEARCH_INDEXES
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "tickets": [
+        [("institution_id", ASCENDING), ("updated_at", DESCENDING)],
+        [("institution_id", ASCENDING), ("student_id", ASCENDING)],
+        # Draft prefetch sweep (draft_prefetch.py): open hot tickets with recent activity
+        [("status", ASCENDING), ("priority", ASCENDING), ("updated_at", ASCENDING)],
+        *SEARCH_INDEXES,
+    ],
+    "messages": [
+        [("ticket_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+    ],
+    "student_events": [
+        [("institution_id", ASCENDING), ("student_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+    ],
+    "ai_suggestions": [
+        [("ticket_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+        [("created_at", ASCENDING)],
+        # One document per distinct draft (suggestion_store.py); older inline suggestions have no hashes
+        ([("ticket_id", ASCENDING), ("suggestion_type", ASCENDING),
+          ("input_hash", ASCENDING), ("output_hash", ASCENDING)],
+         {"unique": True, "partialFilterExpression": {"input_hash": {"$exists": True}}}),
+        # Hot copies are removed only after retention.py has archived them
+        ([("archived_at", ASCENDING)], {"expireAfterSeconds": RETENTION_DELETE_AFTER_SECONDS}),
+    ],
+    "ai_blobs": [
+        [("institution_id", ASCENDING)],
+        [("last_referenced_at", ASCENDING)],
+        # Marked by retention.py once no hot suggestion references the blob
+        ([("archived_at", ASCENDING)], {"expireAfterSeconds": RETENTION_DELETE_AFTER_SECONDS}),
+    ],
+    "audit_logs": [
+        [("institution_id", ASCENDING), ("ticket_id", ASCENDING), ("timestamp", DESCENDING)],
+        [("timestamp", ASCENDING)],
+        ([("archived_at", ASCENDING)], {"expireAfterSeconds": RETENTION_DELETE_AFTER_SECONDS}),
+    ],
+    "jobs": [
+        # Claim: ready jobs of one institution, highest priority first
+        [("status", ASCENDING), ("institution_id", ASCENDING), ("priority", DESCENDING), ("run_after", ASCENDING)],
+        [("status", ASCENDING), ("lease_expires_at", ASCENDING)],
+        [("institution_id", ASCENDING), ("created_at", DESCENDING)],
+        # Only finished jobs have finished_at
+        ([("finished_at", ASCENDING)], {"expireAfterSeconds": JOB_RETENTION_SECONDS}),
+    ],
+    "institutions": [
+        [("slug", ASCENDING)],
+    ],
+    "chatbot_answers": [
+        ([("institution_id", ASCENDING), ("question_hash", ASCENDING)], {"unique": True}),
+        [("institution_id", ASCENDING), ("words", ASCENDING), ("kb_version", ASCENDING)],
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "idempotency_keys": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "draft_cache": [
+        ([("ticket_id", ASCENDING), ("message_hash", ASCENDING)], {"unique": True}),
+    ],
+}
+
+
+async def ensure_indexes(db):
+    """Create all indexes (no-op for ones that already exist)"""
+    for collection, specs in INDEXES.items():
+        for spec in specs:
+            # Either a key list or a (key list, create_index options) pair
+            keys, options = spec if isinstance(spec, tuple) else (spec, {})
+            try:
+                await db[collection].create_index(keys, **options)
+            except Exception as e:
+                logger.error(f"Failed to create index {keys} on {collection}: {e}")
@@ -0,0 +1,141 @@
+"""
+In-memory institution registry for public, slug-keyed routes (the chatbot).
+
+Every institution is loaded at startup into a read-only map
+
+    slug -> {...institution document, "kb_version": str, "chatbot": {...settings}}
+
+which is rebuilt in the background and swapped in with a single assignment, so
+readers never see a half-updated registry. Unknown slugs are remembered for
+INSTITUTION_REGISTRY_NEGATIVE_TTL seconds, so bots probing random URLs cost at
+most one Mongo query per slug rather than one per request.
+
+`kb_version` is a fingerprint of the institution's knowledge base; it changes
+whenever an article is added, removed or updated, and keys the chatbot's answer
+cache so answers built from an old KB are not served.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from single_flight import SingleFlight
+from timestamps import to_iso
+
+logger = logging.getLogger(__name__)
+
+INSTITUTION_REGISTRY_REFRESH_SECONDS = float(os.environ.get("INSTITUTION_REGISTRY_REFRESH_SECONDS", "60"))
+INSTITUTION_REGISTRY_NEGATIVE_TTL = float(os.environ.get("INSTITUTION_REGISTRY_NEGATIVE_TTL", "300"))
+INSTITUTION_REGISTRY_NEGATIVE_MAX = 10000
+
+
+def _freeze(institution: dict, kb_version: str) -> Mapping:
+    entry = dict(institution)
+    entry["kb_version"] = kb_version
+    entry["chatbot"] = MappingProxyType(dict(institution.get("chatbot") or {}))
+    return MappingProxyType(entry)
+
+
+async def _kb_versions(db, institution_ids: Optional[list] = None) -> dict:
+    """institution_id -> fingerprint of its KB articles' ids and update times"""
+    match = {"institution_id": {"$in": institution_ids}} if institution_ids is not None else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$institution_id",
+            "articles": {"$push": {"id": "$id", "updated_at": "$updated_at"}},
+        }},
+    ]
+    versions = {}
+    async for row in db.knowledge_base.aggregate(pipeline):
+        # Fingerprinted here rather than with $concat, which rejects binary ids and dates
+        articles = sorted(f"{a['id']}@{to_iso(a.get('updated_at')) or ''}" for a in row["articles"])
+        digest = hashlib.sha256("|".join(articles).encode()).hexdigest()
+        versions[row["_id"]] = digest[:16]
+    return versions
+
+
+class InstitutionRegistry:
+    """Copy-on-write slug map with negative caching for unknown slugs"""
+
+    def __init__(self):
+        self._by_slug: Mapping = MappingProxyType({})
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self._loading = SingleFlight()
+        self._refresh_requested = asyncio.Event()
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._by_slug)
+
+    async def load(self, db):
+        """Rebuild the whole registry and swap it in"""
+        institutions = await db.institutions.find({}, {"_id": 0}).to_list(None)
+        versions = await _kb_versions(db)
+        by_slug = {
+            inst["slug"]: _freeze(inst, versions.get(inst["id"], "empty"))
+            for inst in institutions if inst.get("slug")
+        }
+        self._by_slug = MappingProxyType(by_slug)
+        # Forget only slugs that exist now; the rest stay cached until their TTL runs out
+        for slug in [slug for slug in self._missing if slug in by_slug]:
+            del self._missing[slug]
+        self.loaded_at = time.time()
+        logger.info(f"Institution registry loaded {len(self._by_slug)} institutions")
+
+    def get(self, slug: str) -> Optional[Mapping]:
+        """Registry entry without touching Mongo (None if not loaded)"""
+        return self._by_slug.get(slug)
+
+    async def resolve(self, db, slug: str) -> Optional[Mapping]:
+        """Entry for a slug; falls back to Mongo once for slugs the registry hasn't seen"""
+        entry = self._by_slug.get(slug)
+        if entry is not None:
+            return entry
+
+        expires_at = self._missing.get(slug)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                return None
+            del self._missing[slug]
+
+        return await self._loading.do(slug, lambda: self._load_one(db, slug))
+
+    async def _load_one(self, db, slug: str) -> Optional[Mapping]:
+        institution = await db.institutions.find_one({"slug": slug}, {"_id": 0})
+        if institution is None:
+            self._missing[slug] = time.monotonic() + INSTITUTION_REGISTRY_NEGATIVE_TTL
+            while len(self._missing) > INSTITUTION_REGISTRY_NEGATIVE_MAX:
+                self._missing.popitem(last=False)
+            return None
+
+        versions = await _kb_versions(db, [institution["id"]])
+        entry = _freeze(institution, versions.get(institution["id"], "empty"))
+        self._by_slug = MappingProxyType({**self._by_slug, slug: entry})
+        return entry
+
+    def request_refresh(self):
+        """Reload soon (called when institutions or KB articles change)"""
+        self._refresh_requested.set()
+
+    async def refresh_loop(self, db):
+        """Reload every INSTITUTION_REGISTRY_REFRESH_SECONDS, or sooner when requested"""
+        while True:
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), INSTITUTION_REGISTRY_REFRESH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+            try:
+                await self.load(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Institution registry refresh failed: {e}")
+
+
+institution_registry = InstitutionRegistry()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Background jobs for work that doesn't belong on the request path.
+
+Jobs are documents in the `jobs` collection:
+
+    queued -> running -> succeeded
+                      -> queued (retry after backoff) -> ... -> failed
+    queued | running -> cancelled
+
+- Workers claim a job atomically with find_one_and_update and hold a lease
+  (JOB_LEASE_SECONDS) that a heartbeat extends while the handler runs. A job
+  whose lease expires (worker crashed) is re-queued by any worker.
+- Failures are retried with exponential backoff up to `max_attempts`.
+- Within an institution, higher `priority` runs first. Across institutions,
+  tenants with the most urgent ready work go first and tenants with equally
+  urgent work take turns; an institution normally runs at most
+  JOB_TENANT_CONCURRENCY jobs at once, so one tenant's backfill can't starve
+  everyone else. This is a soft limit: the running count is read before the
+  claim, so workers claiming at the same moment can each take a slot.
+- Handlers are registered with @register_job. Tenant job types can be enqueued
+  through the API; system job types (institution_id None) only from here.
+
+    python jobs.py worker                       # run until stopped
+    python jobs.py worker --drain               # run until no job is ready
+    python jobs.py enqueue retention_archive
+    python jobs.py enqueue bulk_triage --institution-id <id> --payload '{"ticket_ids": [...]}'
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from ai_tools import triage_ticket_with_ai
+from cache import find_queue_for_category
+from models import StudentEvent
+from repository import new_document
+from retention import Archiver
+from suggestion_store import compact as compact_suggestions
+from ticket_summary import recompute_ticket_summaries
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "20"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.environ.get("JOB_BACKOFF_SECONDS", "10"))
+JOB_BACKOFF_MAX_SECONDS = float(os.environ.get("JOB_BACKOFF_MAX_SECONDS", "3600"))
+JOB_WORKER_CONCURRENCY = int(os.environ.get("JOB_WORKER_CONCURRENCY", "4"))
+JOB_TENANT_CONCURRENCY = int(os.environ.get("JOB_TENANT_CONCURRENCY", "2"))
+# Finished jobs are removed by a TTL index (indexes.py)
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", str(7 * 86400)))
+
+BULK_TRIAGE_LIMIT = 1000
+
+# What the jobs API returns
+JOB_PROJECTION = {"_id": 0, "payload": 0}
+
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    handler: Callable[..., Awaitable[Optional[dict]]]
+    tenant: bool  # enqueued per institution (and through the API)
+
+
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def register_job(name: str, tenant: bool = True):
+    """Register `async def handler(db, job) -> Optional[dict]` (the return value is stored as the result)"""
+    def register(handler):
+        JOB_TYPES[name] = JobType(name, handler, tenant)
+        return handler
+    return register
+
+
+async def enqueue(db, job_type: str, institution_id: Optional[str] = None, payload: Optional[dict] = None,
+                  priority: int = 0, max_attempts: int = JOB_MAX_ATTEMPTS,
+                  run_after: Optional[datetime] = None, created_by: Optional[str] = None) -> dict:
+    """Queue a job and return it"""
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {job_type}")
+    tenant = JOB_TYPES[job_type].tenant
+    if tenant != (institution_id is not None):
+        raise ValueError(f"Job type {job_type} {'needs' if tenant else 'takes no'} institution_id")
+    now = utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "institution_id": institution_id,
+        "type": job_type,
+        "payload": payload or {},
+        "status": "queued",
+        "priority": priority,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_after": run_after or now,
+        "progress": None,
+        "result": None,
+        "error": None,
+        "created_by": created_by,
+        "created_at": now,
+        "updated_at": now,
+    }
+    await db.jobs.insert_one(dict(job))
+    return job
+
+
+async def report_progress(db, job: dict, done: int, total: Optional[int] = None):
+    """Record handler progress (shown by GET /api/jobs/{id})"""
+    await db.jobs.update_one(
+        {"id": job["id"]}, {"$set": {"progress": {"done": done, "total": total}, "updated_at": utcnow()}}
+    )
+
+
+async def job_counts(db) -> Dict[tuple, int]:
+    """Queued and running jobs as {(type, status): count}, for the metrics gauges"""
+    rows = await db.jobs.aggregate([
+        {"$match": {"status": {"$in": ["queued", "running"]}}},
+        {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}},
+    ]).to_list(None)
+    return {(row["_id"]["type"], row["_id"]["status"]): row["count"] for row in rows}
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number `attempts`, with jitter so failed batches don't retry in lockstep"""
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), JOB_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+class Worker:
+    """Claims and runs jobs, up to `concurrency` at a time"""
+
+    def __init__(self, db, concurrency: int = JOB_WORKER_CONCURRENCY):
+        self.db = db
+        self.concurrency = concurrency
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._served: Dict[Optional[str], float] = {}
+        self._lost: set = set()
+        self._tasks: set = set()
+        self.processed = 0
+
+    async def _ready_tenants(self, now: datetime) -> list:
+        """
+        Institutions with ready jobs and spare tenant concurrency, in claim order.
+        The running counts are a snapshot, not re-checked by the claim: concurrent
+        workers can overshoot JOB_TENANT_CONCURRENCY by up to one job each.
+        """
+        ready = {"$and": [{"$eq": ["$status", "queued"]}, {"$lte": ["$run_after", now]}]}
+        rows = await self.db.jobs.aggregate([
+            {"$match": {"status": {"$in": ["queued", "running"]}, "type": {"$in": list(JOB_TYPES)}}},
+            {"$group": {
+                "_id": "$institution_id",
+                "running": {"$sum": {"$cond": [{"$eq": ["$status", "running"]}, 1, 0]}},
+                "ready": {"$sum": {"$cond": [ready, 1, 0]}},
+                "priority": {"$max": {"$cond": [ready, "$priority", None]}},
+            }},
+            {"$match": {"ready": {"$gt": 0}, "running": {"$lt": JOB_TENANT_CONCURRENCY}}},
+        ]).to_list(None)
+        # Most urgent first; among equally urgent tenants, the one served longest ago
+        rows.sort(key=lambda row: (-(row["priority"] or 0), self._served.get(row["_id"], 0.0)))
+        return [row["_id"] for row in rows]
+
+    async def claim(self) -> Optional[dict]:
+        now = utcnow()
+        for institution_id in await self._ready_tenants(now):
+            job = await self.db.jobs.find_one_and_update(
+                {
+                    "status": "queued", "run_after": {"$lte": now},
+                    "institution_id": institution_id, "type": {"$in": list(JOB_TYPES)},
+                },
+                {
+                    "$set": {
+                        "status": "running", "worker_id": self.id, "started_at": now, "heartbeat_at": now,
+                        "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS), "updated_at": now,
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("priority", -1), ("run_after", 1)],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if job is not None:
+                self._served[institution_id] = time.monotonic()
+                return job
+        return None
+
+    async def requeue_expired(self) -> int:
+        """Return jobs whose worker stopped heartbeating to the queue (or fail them if out of attempts)"""
+        now = utcnow()
+        expired = {"status": "running", "lease_expires_at": {"$lt": now}}
+        release = {"$unset": {"worker_id": "", "lease_expires_at": ""}}
+        retried = await self.db.jobs.update_many(
+            {**expired, "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+            {"$set": {"status": "queued", "run_after": now, "error": "Lease expired", "updated_at": now}, **release}
+        )
+        await self.db.jobs.update_many(
+            expired,
+            {"$set": {"status": "failed", "error": "Lease expired", "finished_at": now, "updated_at": now}, **release}
+        )
+        return retried.modified_count
+
+    async def _heartbeat(self, job: dict, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            now = utcnow()
+            result = await self.db.jobs.update_one(
+                {"id": job["id"], "worker_id": self.id, "status": "running", "cancel_requested": {"$ne": True}},
+                {"$set": {
+                    "heartbeat_at": now, "updated_at": now,
+                    "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                }}
+            )
+            if result.matched_count == 0:
+                # Cancelled through the API, or the lease expired and another worker owns the job
+                self._lost.add(job["id"])
+                task.cancel()
+                return
+
+    async def _settle(self, job: dict, fields: dict, unset: Optional[dict] = None):
+        """Final update for a claimed job, only if this worker still owns it"""
+        update = {"$set": {**fields, "updated_at": utcnow()}, "$unset": {"lease_expires_at": "", **(unset or {})}}
+        await self.db.jobs.update_one({"id": job["id"], "worker_id": self.id, "status": "running"}, update)
+
+    async def run_job(self, job: dict):
+        handler = JOB_TYPES[job["type"]].handler
+        task = asyncio.create_task(handler(self.db, job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if job["id"] in self._lost:
+                self._lost.discard(job["id"])
+                await self._settle(job, {"status": "cancelled", "finished_at": utcnow()})
+                return
+            # Worker shutting down: hand the job back without spending an attempt
+            await self.db.jobs.update_one(
+                {"id": job["id"], "worker_id": self.id, "status": "running"},
+                {"$set": {"status": "queued", "updated_at": utcnow()}, "$inc": {"attempts": -1},
+                 "$unset": {"worker_id": "", "lease_expires_at": ""}}
+            )
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['type']}) failed: {e}")
+            if job["attempts"] < job["max_attempts"]:
+                retry_at = utcnow() + timedelta(seconds=backoff_seconds(job["attempts"]))
+                await self._settle(
+                    job, {"status": "queued", "run_after": retry_at, "error": str(e)}, {"worker_id": ""}
+                )
+            else:
+                await self._settle(job, {"status": "failed", "error": str(e), "finished_at": utcnow()})
+        else:
+            await self._settle(job, {"status": "succeeded", "result": result, "error": None, "finished_at": utcnow()})
+        finally:
+            heartbeat.cancel()
+            self.processed += 1
+
+    async def run(self, drain: bool = False):
+        """Claim and run jobs until cancelled (or, with drain, until none is ready)"""
+        slots = asyncio.Semaphore(self.concurrency)
+        reaped_at = 0.0
+        try:
+            while True:
+                await slots.acquire()
+                try:
+                    if time.monotonic() - reaped_at > JOB_LEASE_SECONDS / 2:
+                        await self.requeue_expired()
+                        reaped_at = time.monotonic()
+                    job = await self.claim()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Job claim failed: {e}")
+                    job = None
+                if job is None:
+                    slots.release()
+                    if drain and not self._tasks:
+                        return
+                    await asyncio.sleep(0.05 if drain else JOB_POLL_SECONDS)
+                    continue
+                task = asyncio.create_task(self.run_job(job))
+                self._tasks.add(task)
+                task.add_done_callback(lambda t: (self._tasks.discard(t), slots.release()))
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# ============================================================
+# JOB TYPES
+# ============================================================
+
+@register_job("recompute_ticket_summaries")
+async def _recompute_ticket_summaries(db, job: dict) -> dict:
+    return {"updated": await recompute_ticket_summaries(db, job["institution_id"])}
+
+
+@register_job("bulk_triage")
+async def _bulk_triage(db, job: dict) -> dict:
+    """AI triage for payload.ticket_ids, or every open ticket still in the general category"""
+    institution_id = job["institution_id"]
+    query = {"institution_id": institution_id}
+    if job["payload"].get("ticket_ids"):
+        query["id"] = {"$in": job["payload"]["ticket_ids"][:BULK_TRIAGE_LIMIT]}
+    else:
+        query.update(status="open", category="general")
+    tickets = await db.tickets.find(
+        query, {"_id": 0, "id": 1, "student_id": 1, "subject": 1}
+    ).to_list(BULK_TRIAGE_LIMIT)
+
+    events, skipped = [], 0
+    for n, ticket in enumerate(tickets, 1):
+        message = await db.messages.find_one(
+            {"ticket_id": ticket["id"], "direction": "inbound"}, {"_id": 0, "body": 1}, sort=[("created_at", -1)]
+        )
+        try:
+            triage = await triage_ticket_with_ai(
+                db, message["body"] if message else ticket["subject"], institution_id, fallback=False
+            )
+        except Exception:
+            # Keep the current category/priority rather than the fallback (the failure is logged)
+            skipped += 1
+            continue
+        fields = {"category": triage["category"], "priority": triage["priority"], "updated_at": utcnow()}
+        queue = await find_queue_for_category(db, institution_id, triage["category"])
+        if queue:
+            fields["queue_id"] = queue["id"]
+        await db.tickets.update_one({"id": ticket["id"], "institution_id": institution_id}, {"$set": fields})
+        events.append(new_document(
+            StudentEvent,
+            institution_id=institution_id,
+            student_id=ticket["student_id"],
+            ticket_id=ticket["id"],
+            event_type="ai_routed",
+            content=f"AI triage: {triage['category']} / {triage['priority']}. {triage['reasoning']}"
+        ))
+        if n % 25 == 0:
+            await report_progress(db, job, n, len(tickets))
+
+    if events:
+        await db.student_events.insert_many(events, ordered=False)
+    return {"triaged": len(events), "skipped": skipped}
+
+
+@register_job("retention_archive", tenant=False)
+async def _retention_archive(db, job: dict) -> dict:
+    return await Archiver(db).run_once(job["payload"].get("collections"))
+
+
+@register_job("compact_suggestions", tenant=False)
+async def _compact_suggestions(db, job: dict) -> dict:
+    return await compact_suggestions(db)
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from id_codec import MONGO_UUID_OPTIONS, wrap_database
+    from timestamps import MONGO_CODEC_OPTIONS
+
+    parser = argparse.ArgumentParser(description="Background job worker")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="claim and run jobs")
+    worker.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY)
+    worker.add_argument("--drain", action="store_true", help="exit once no job is ready")
+    add = commands.add_parser("enqueue", help="queue a job")
+    add.add_argument("type", choices=sorted(JOB_TYPES))
+    add.add_argument("--institution-id")
+    add.add_argument("--payload", type=json.loads, default={})
+    add.add_argument("--priority", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    client = AsyncIOMotorClient(
+        os.getenv("MONGO_URL", "mongodb://localhost:27017"), **MONGO_CODEC_OPTIONS, **MONGO_UUID_OPTIONS
+    )
+    db = wrap_database(client[os.getenv("DB_NAME", "test_database")])
+
+    if args.command == "enqueue":
+        job = await enqueue(db, args.type, args.institution_id, args.payload, args.priority)
+        print(f"📥 Queued {job['type']} job {job['id']}")
+    else:
+        from llm import load_encoding
+        await load_encoding()
+        runner = Worker(db, args.concurrency)
+        print(f"⚙️  Worker {runner.id} running up to {runner.concurrency} jobs...")
+        await runner.run(drain=args.drain)
+        print(f"✅ Processed {runner.processed} jobs")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
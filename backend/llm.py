@@ -0,0 +1,281 @@
+"""
+Pluggable LLM backends.
+
+All AI tools call the model through `get_llm_backend()` instead of constructing
+`LlmChat` directly, so the hosted model can be swapped for a deterministic local
+stub (LLM_BACKEND=stub) to benchmark and regression-test the AI endpoints offline.
+
+Stub configuration (environment):
+    LLM_STUB_LATENCY       fixed:<ms> | uniform:<min_ms>:<max_ms> | exponential:<mean_ms>
+                           | lognormal:<median_ms>:<sigma>          (default fixed:0)
+    LLM_STUB_FAILURE_RATE  probability in [0, 1] that a call raises LlmUnavailableError
+    LLM_STUB_SEED          seed mixed into every per-call RNG (default 0)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from metrics import LLM_ERRORS, LLM_LATENCY, LLM_TOKENS
+from profiling import span
+
+logger = logging.getLogger(__name__)
+
+# Get Emergent LLM key from environment
+EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY", "sk-emergent-c150a2a7f7f397a8aD")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+
+
+class LlmUnavailableError(Exception):
+    """The model call failed (used by the stub for injected failures)"""
+
+
+@dataclass
+class LlmResult:
+    text: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: float
+
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _load_encoding():
+    """tiktoken encoding for the configured model, or None if tiktoken/its data is unavailable"""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(LLM_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+async def load_encoding():
+    """Load the tokenizer off the event loop (it may download its BPE file); call once at startup"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding = await asyncio.to_thread(_load_encoding)
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Token count for text (exact once load_encoding() has run, ~4 chars per token otherwise)"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, math.ceil(len(text) / 4))
+
+
+class LlmBackend:
+    """Interface every backend implements"""
+
+    model = "unknown"
+
+    async def complete(self, system_message: str, prompt: str, session_id: str, tool: str) -> LlmResult:
+        raise NotImplementedError
+
+    async def stream(self, system_message: str, prompt: str, session_id: str, tool: str) -> AsyncIterator[str]:
+        """Yield the completion in chunks (default: one chunk once complete)"""
+        result = await self.complete(system_message, prompt, session_id, tool)
+        yield result.text
+
+
+class EmergentBackend(LlmBackend):
+    """Hosted model through emergentintegrations' LlmChat"""
+
+    def __init__(self, provider: str = LLM_PROVIDER, model: str = LLM_MODEL, api_key: str = EMERGENT_LLM_KEY):
+        self.provider = provider
+        self.model = model
+        self.api_key = api_key
+
+    async def complete(self, system_message: str, prompt: str, session_id: str, tool: str) -> LlmResult:
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+        started = time.perf_counter()
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(self.provider, self.model)
+
+        text = await chat.send_message(UserMessage(text=prompt))
+        return LlmResult(
+            text=text,
+            model=self.model,
+            prompt_tokens=count_tokens(system_message) + count_tokens(prompt),
+            completion_tokens=count_tokens(text),
+            latency_ms=(time.perf_counter() - started) * 1000,
+        )
+
+
+class StubBackend(LlmBackend):
+    """
+    Deterministic local stand-in: schema-valid JSON for each tool, configurable
+    latency distribution, chunked streaming and injected failures. The same
+    (seed, tool, prompt) always yields the same output and latency.
+    """
+
+    model = "stub"
+
+    def __init__(self, latency: str = "fixed:0", failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls) -> "StubBackend":
+        return cls(
+            latency=os.getenv("LLM_STUB_LATENCY", "fixed:0"),
+            failure_rate=float(os.getenv("LLM_STUB_FAILURE_RATE", "0")),
+            seed=int(os.getenv("LLM_STUB_SEED", "0")),
+        )
+
+    def _rng(self, tool: str, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{tool}:{prompt}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _latency_seconds(self, rng: random.Random) -> float:
+        kind, *params = self.latency.split(":")
+        values = [float(p) for p in params]
+        if kind == "fixed":
+            ms = values[0] if values else 0.0
+        elif kind == "uniform":
+            ms = rng.uniform(values[0], values[1])
+        elif kind == "exponential":
+            ms = rng.expovariate(1.0 / values[0]) if values[0] else 0.0
+        elif kind == "lognormal":
+            ms = rng.lognormvariate(math.log(values[0]), values[1])
+        else:
+            raise ValueError(f"Unknown LLM_STUB_LATENCY distribution: {self.latency}")
+        return ms / 1000
+
+    def _output(self, tool: str, rng: random.Random) -> str:
+        if tool == "triage":
+            return json.dumps({
+                "category": rng.choice(["fafsa", "verification", "sap_appeal", "billing", "general"]),
+                "priority": rng.choice(["low", "medium", "high", "urgent"]),
+                "reasoning": "Stub triage based on keywords in the message.",
+            })
+        if tool == "summarize":
+            return json.dumps({"summary": "Stub summary of the conversation so far."})
+        if tool == "chatbot":
+            return json.dumps({
+                "answer": "Stub answer based on the Knowledge Base articles provided.",
+                "confidence": round(rng.uniform(0.3, 1.0), 2),
+            })
+        return json.dumps({
+            "summary": "Student is asking about their financial aid.",
+            "reasoning": "Stub response; the relevant KB article covers this question.",
+            "reply": (
+                "Thank you for reaching out to the Financial Aid Office. Based on our "
+                "Knowledge Base, a counselor will review your account and follow up."
+            ),
+        })
+
+    def _maybe_fail(self, rng: random.Random):
+        if self.failure_rate and rng.random() < self.failure_rate:
+            raise LlmUnavailableError("Injected stub LLM failure")
+
+    async def complete(self, system_message: str, prompt: str, session_id: str, tool: str) -> LlmResult:
+        rng = self._rng(tool, prompt)
+        started = time.perf_counter()
+        await asyncio.sleep(self._latency_seconds(rng))
+        self._maybe_fail(rng)
+        text = self._output(tool, rng)
+        return LlmResult(
+            text=text,
+            model=self.model,
+            prompt_tokens=count_tokens(system_message) + count_tokens(prompt),
+            completion_tokens=count_tokens(text),
+            latency_ms=(time.perf_counter() - started) * 1000,
+        )
+
+    async def stream(self, system_message: str, prompt: str, session_id: str, tool: str) -> AsyncIterator[str]:
+        rng = self._rng(tool, prompt)
+        total = self._latency_seconds(rng)
+        self._maybe_fail(rng)
+        text = self._output(tool, rng)
+        chunks = [text[i:i + 16] for i in range(0, len(text), 16)]
+        # Spend ~20% of the latency before the first token, the rest spread over chunks
+        await asyncio.sleep(total * 0.2)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(total * 0.8 / len(chunks))
+
+
+class InstrumentedBackend(LlmBackend):
+    """Wraps a backend so every call is timed as the request's "llm" stage and counted in metrics"""
+
+    def __init__(self, inner: LlmBackend):
+        self.inner = inner
+        self.model = inner.model
+
+    async def complete(self, system_message: str, prompt: str, session_id: str, tool: str) -> LlmResult:
+        started = time.perf_counter()
+        try:
+            with span("llm"):
+                result = await self.inner.complete(system_message, prompt, session_id, tool)
+        except Exception:
+            LLM_ERRORS.inc(self.model, tool)
+            raise
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - started, self.model, tool)
+        LLM_TOKENS.inc(self.model, tool, "prompt", amount=result.prompt_tokens)
+        LLM_TOKENS.inc(self.model, tool, "completion", amount=result.completion_tokens)
+        return result
+
+    async def stream(self, system_message: str, prompt: str, session_id: str, tool: str) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        chunks = []
+        try:
+            with span("llm"):
+                async for chunk in self.inner.stream(system_message, prompt, session_id, tool):
+                    chunks.append(chunk)
+                    yield chunk
+        except Exception:
+            LLM_ERRORS.inc(self.model, tool)
+            raise
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - started, self.model, tool)
+        LLM_TOKENS.inc(self.model, tool, "prompt", amount=count_tokens(system_message) + count_tokens(prompt))
+        LLM_TOKENS.inc(self.model, tool, "completion", amount=count_tokens("".join(chunks)))
+
+
+_backend: Optional[LlmBackend] = None
+
+
+def get_llm_backend() -> LlmBackend:
+    """Backend selected by LLM_BACKEND (emergent | stub), created once per process"""
+    global _backend
+    if _backend is None:
+        name = os.getenv("LLM_BACKEND", "emergent").lower()
+        if name == "stub":
+            backend = StubBackend.from_env()
+        elif name == "emergent":
+            backend = EmergentBackend()
+        else:
+            raise ValueError(f"Unknown LLM_BACKEND: {name}")
+        _backend = InstrumentedBackend(backend)
+        logger.info(f"Using LLM backend: {name}")
+    return _backend
+
+
+def set_llm_backend(backend: Optional[LlmBackend]):
+    """Override the process-wide backend (None resets to the environment default)"""
+    global _backend
+    _backend = InstrumentedBackend(backend) if backend is not None else None
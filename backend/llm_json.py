@@ -0,0 +1,147 @@
+"""
+Tolerant JSON extraction for LLM output.
+
+Models wrap JSON in markdown fences, add prose around it, leave trailing commas
+or get cut off mid-object. Rather than discarding the whole call on a
+`json.loads` error, `extract_json_object` finds the first object in the text and
+repairs common damage (trailing commas, unterminated strings, unclosed
+brackets). `IncrementalJSONParser` applies the same repair to a growing buffer so
+fields can be surfaced while a response is still streaming.
+"""
+import json
+import re
+from typing import Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_KEY_START = re.compile(r'\{\s*"')
+
+
+class LlmOutputError(ValueError):
+    """Model output contained no usable JSON object for the expected schema"""
+
+
+def _scan_object(text: str, start: int) -> tuple:
+    """
+    Walk from the '{' at `start` to its matching '}'.
+    Returns (end_index or None if truncated, open bracket stack, inside_string).
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return i, stack, False
+    return None, stack, in_string
+
+
+def _close(fragment: str, stack: list, in_string: bool) -> str:
+    """Terminate an open string and close every open bracket"""
+    if in_string:
+        if fragment.endswith("\\"):
+            fragment = fragment[:-1]
+        fragment += '"'
+    closers = {"{": "}", "[": "]"}
+    return fragment.rstrip() + "".join(closers[b] for b in reversed(stack))
+
+
+def _repair_truncated(fragment: str) -> Optional[dict]:
+    """
+    Parse an object that was cut off. If closing it as-is fails (e.g. it ends in a
+    bare key or half a literal), back off to the previous comma and try again; an
+    object cut off inside its first member is empty so far.
+    """
+    for _ in range(8):
+        _, stack, in_string = _scan_object(fragment, 0)
+        value = _loads_lenient(_close(fragment, stack, in_string))
+        if value is not None:
+            return value
+        cut = fragment.rfind(",")
+        if cut <= 0:
+            return {} if _KEY_START.match(fragment) else None
+        fragment = fragment[:cut]
+    return None
+
+
+def _loads_lenient(candidate: str) -> Optional[dict]:
+    for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+        try:
+            value = json.loads(attempt, strict=False)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def extract_json_object(text: str) -> Optional[dict]:
+    """First JSON object in `text` (fenced or not), repairing truncation; None if there is none"""
+    if not text:
+        return None
+    candidates = [m.group(1) for m in _FENCE.finditer(text)] + [text]
+    for candidate in candidates:
+        start = candidate.find("{")
+        while start != -1:
+            end, _, _ = _scan_object(candidate, start)
+            if end is not None:
+                value = _loads_lenient(candidate[start:end + 1])
+            else:
+                value = _repair_truncated(candidate[start:])
+            if value is not None:
+                return value
+            start = candidate.find("{", start + 1)
+    return None
+
+
+def parse_model_output(text: str, schema: Type[T]) -> T:
+    """Extract the first object from model output and validate it against `schema`"""
+    value = extract_json_object(text)
+    if value is None:
+        raise LlmOutputError("No JSON object found in model output")
+    try:
+        return schema.model_validate(value)
+    except ValidationError as e:
+        raise LlmOutputError(f"Model output does not match {schema.__name__}: {e}") from e
+
+
+class IncrementalJSONParser:
+    """
+    Feed streamed chunks; each `feed` returns the top-level fields whose value
+    changed since the previous call (string fields grow as their text arrives).
+    The buffer is re-parsed on every chunk, which is cheap at model-output sizes.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: dict = {}
+
+    def feed(self, chunk: str) -> dict:
+        self.buffer += chunk
+        current = extract_json_object(self.buffer) or {}
+        changed = {k: v for k, v in current.items() if self.fields.get(k) != v}
+        self.fields.update(current)
+        return changed
+
+    def result(self, schema: Type[T]) -> T:
+        """Validate the complete (or best-effort repaired) object"""
+        return parse_model_output(self.buffer, schema)
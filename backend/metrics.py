@@ -0,0 +1,184 @@
+"""
+Prometheus-compatible metrics without a client library.
+
+Counters and histograms are written to per-thread shards (a plain dict per
+thread), so recording never takes a lock: the event loop and the Mongo listener
+threads each only touch their own shard, and `/metrics` sums the shards when it
+is scraped. Gauges are callbacks evaluated at scrape time (session counts,
+queue depths, cache stats), so they cost nothing between scrapes; counters kept
+by other components (cache hit/miss totals) are exported the same way.
+"""
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_local = threading.local()
+_shards: List[dict] = []
+_shards_lock = threading.Lock()  # only taken the first time a thread records anything
+
+
+def _shard() -> dict:
+    shard = getattr(_local, "values", None)
+    if shard is None:
+        shard = _local.values = {}
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        shard = _shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        totals: Dict[Tuple, float] = {}
+        for shard in list(_shards):
+            for (name, labels), value in list(shard.items()):
+                if name == self.name:
+                    totals[labels] = totals.get(labels, 0) + value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.label_names, k)} {v}" for k, v in sorted(totals.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        shard = _shard()
+        key = (self.name, labels)
+        state = shard.get(key)
+        if state is None:
+            # Per-bucket counts (not cumulative), then sum and count
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        state[i] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def collect(self) -> List[str]:
+        merged: Dict[Tuple, list] = {}
+        for shard in list(_shards):
+            for (name, labels), state in list(shard.items()):
+                if name != self.name:
+                    continue
+                total = merged.setdefault(labels, [0] * len(state))
+                for i, v in enumerate(state):
+                    total[i] += v
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), state):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {state[-1]}")
+        return lines
+
+
+class Gauge:
+    """Value(s) computed at scrape time: the callback returns a number or {label tuple: number}"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Callable, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            return lines + [f"# {self.name} unavailable: {_escape(e)}"]
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        lines += [f"{self.name}{_format_labels(self.label_names, k)} {v}" for k, v in sorted(samples)]
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """Monotonic total read at scrape time from a counter kept elsewhere"""
+
+    type = "counter"
+
+
+REGISTRY: list = []
+
+
+def render() -> str:
+    """Prometheus text exposition format (0.0.4) for every registered metric"""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.collect()
+    return "\n".join(lines) + "\n"
+
+
+def gauge(name: str, help_text: str, callback: Callable, labels: Iterable[str] = ()) -> Optional[Gauge]:
+    """Register a scrape-time gauge once (re-registering a name replaces the callback)"""
+    return _register_callback(Gauge, name, help_text, callback, labels)
+
+
+def callback_counter(name: str, help_text: str, callback: Callable, labels: Iterable[str] = ()) -> Optional[Gauge]:
+    """Register a scrape-time counter once (the name should end in _total)"""
+    return _register_callback(CallbackCounter, name, help_text, callback, labels)
+
+
+def _register_callback(cls, name: str, help_text: str, callback: Callable, labels: Iterable[str]) -> Gauge:
+    for metric in REGISTRY:
+        if type(metric) is cls and metric.name == name:
+            metric.callback = callback
+            return metric
+    return cls(name, help_text, callback, labels)
+
+
+# ============================================================
+# APPLICATION METRICS
+# ============================================================
+
+HTTP_REQUESTS = Counter("aidhub_http_requests_total", "HTTP requests by route and status", ("route", "status"))
+HTTP_LATENCY = Histogram(
+    "aidhub_http_request_duration_seconds", "HTTP request latency by route and status", ("route", "status")
+)
+MONGO_LATENCY = Histogram(
+    "aidhub_mongo_command_duration_seconds", "Mongo command round trip by collection and command",
+    ("collection", "command")
+)
+MONGO_ERRORS = Counter("aidhub_mongo_command_errors_total", "Failed Mongo commands", ("collection", "command"))
+LLM_LATENCY = Histogram(
+    "aidhub_llm_request_duration_seconds", "LLM call latency by model and tool", ("model", "tool")
+)
+LLM_TOKENS = Counter("aidhub_llm_tokens_total", "LLM tokens by model, tool and kind", ("model", "tool", "kind"))
+LLM_ERRORS = Counter("aidhub_llm_errors_total", "Failed LLM calls by model and tool", ("model", "tool"))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Convert UUID-string id fields to BSON Binary subtype 4 (or back with --reverse).
+
+    UUID_STORAGE=mixed  ...deploy...
+    python migrate_ids.py
+    UUID_STORAGE=binary ...deploy...
+
+    python migrate_ids.py --collection messages --batch-size 5000
+    python migrate_ids.py --reverse                 # back to strings before UUID_STORAGE=string
+
+Each collection is scanned in `_id` order for documents with an id field still in
+the source representation (see id_codec.ID_FIELDS) and rewritten in unordered
+bulk_write batches. Every update is guarded by the values it replaces, so
+concurrent writes are never overwritten. The last `_id` of each finished batch
+is checkpointed in the `migrations` collection, so an interrupted run resumes
+where it stopped (--restart scans from the beginning again).
+"""
+import argparse
+import asyncio
+import copy
+import os
+import time
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from id_codec import ID_FIELDS, MONGO_UUID_OPTIONS, decode, encode_document
+from timestamps import MONGO_CODEC_OPTIONS
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "test_database")
+
+MIGRATION = "ids_to_binary"
+
+COLLECTIONS = (
+    "institutions", "users", "students", "queues", "tickets", "messages", "student_events",
+    "knowledge_base", "ai_suggestions", "ai_blobs", "audit_logs", "draft_cache", "chatbot_answers", "jobs",
+)
+
+
+async def migrate_collection(db, collection: str, batch_size: int = 1000, reverse: bool = False,
+                             dry_run: bool = False, restart: bool = False) -> dict:
+    """Convert one collection's id fields; returns counts for the report"""
+    checkpoint_id = f"{MIGRATION}{':reverse' if reverse else ''}:{collection}"
+    checkpoint = None if restart else await db.migrations.find_one({"_id": checkpoint_id})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+
+    stats = {"scanned": 0, "modified": 0}
+    source_type = "binData" if reverse else "string"
+    query = {"$or": [{field: {"$type": source_type}} for field in sorted(ID_FIELDS)]}
+
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+        docs = await db[collection].find(page).sort("_id", 1).to_list(batch_size)
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            converted = decode(copy.deepcopy(doc)) if reverse else encode_document(doc)
+            changed = [key for key in doc if key != "_id" and converted[key] != doc[key]]
+            if changed:
+                guard = {"_id": doc["_id"], **{key: doc[key] for key in changed}}
+                operations.append(UpdateOne(guard, {"$set": {key: converted[key] for key in changed}}))
+
+        stats["scanned"] += len(docs)
+        if operations and not dry_run:
+            result = await db[collection].bulk_write(operations, ordered=False)
+            stats["modified"] += result.modified_count
+        elif dry_run:
+            stats["modified"] += len(operations)
+
+        last_id = docs[-1]["_id"]
+        if not dry_run:
+            await db.migrations.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"last_id": last_id, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+
+    if not dry_run:
+        await db.migrations.delete_one({"_id": checkpoint_id})
+    return stats
+
+
+async def migrate(db, collections=COLLECTIONS, batch_size: int = 1000, reverse: bool = False,
+                  dry_run: bool = False, restart: bool = False) -> dict:
+    report = {}
+    for collection in collections:
+        started = time.perf_counter()
+        stats = await migrate_collection(db, collection, batch_size, reverse, dry_run, restart)
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        report[collection] = stats
+        print(
+            f"   {collection:<16} scanned {stats['scanned']:>9}  converted {stats['modified']:>9}"
+            f"  ({stats['seconds']}s)"
+        )
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert UUID-string ids to BSON Binary subtype 4")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    parser.add_argument("--db-name", default=DB_NAME)
+    parser.add_argument("--collection", action="append", choices=COLLECTIONS,
+                        help="limit to this collection (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--reverse", action="store_true", help="convert binary ids back to strings")
+    parser.add_argument("--dry-run", action="store_true", help="count conversions without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    # The raw database: this script does the encoding itself
+    client = AsyncIOMotorClient(args.mongo_url, **MONGO_CODEC_OPTIONS, **MONGO_UUID_OPTIONS)
+    db = client[args.db_name]
+    direction = "binary -> string" if args.reverse else "string -> binary"
+    print(f"🆔 Converting ids ({direction}) in {args.db_name}{' (dry run)' if args.dry_run else ''}...")
+    await migrate(db, args.collection or COLLECTIONS, args.batch_size, args.reverse, args.dry_run, args.restart)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Convert ISO-string timestamps to native BSON dates.
+
+    python migrate_timestamps.py                      # every collection in timestamps.TIMESTAMP_FIELDS
+    python migrate_timestamps.py --collection tickets --batch-size 5000
+    python migrate_timestamps.py --dry-run
+
+Each collection is scanned in `_id` order for documents with at least one
+string-typed timestamp field and rewritten in unordered bulk_write batches.
+Every update is guarded by the string value it replaces, so concurrent writes
+are never overwritten. The last `_id` of each finished batch is checkpointed in
+the `migrations` collection, so an interrupted run resumes where it stopped
+(--restart scans from the beginning again). Strings that don't parse as ISO-8601
+are left in place and counted.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from timestamps import MONGO_CODEC_OPTIONS, TIMESTAMP_FIELDS, parse_timestamp
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "test_database")
+
+MIGRATION = "timestamps_to_dates"
+
+
+def _get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+async def migrate_collection(db, collection: str, fields: list, batch_size: int = 1000,
+                             dry_run: bool = False, restart: bool = False) -> dict:
+    """Convert one collection's string timestamps; returns counts for the report"""
+    checkpoint_id = f"{MIGRATION}:{collection}"
+    checkpoint = None if restart else await db.migrations.find_one({"_id": checkpoint_id})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+
+    stats = {"scanned": 0, "modified": 0, "unparseable": 0}
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+        docs = await db[collection].find(page, projection).sort("_id", 1).to_list(batch_size)
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            guard, update = {"_id": doc["_id"]}, {}
+            for field in fields:
+                value = _get_path(doc, field)
+                if not isinstance(value, str):
+                    continue
+                parsed = parse_timestamp(value)
+                if parsed is None:
+                    stats["unparseable"] += 1
+                    continue
+                guard[field] = value
+                update[field] = parsed
+            if update:
+                operations.append(UpdateOne(guard, {"$set": update}))
+
+        stats["scanned"] += len(docs)
+        if operations and not dry_run:
+            result = await db[collection].bulk_write(operations, ordered=False)
+            stats["modified"] += result.modified_count
+        elif dry_run:
+            stats["modified"] += len(operations)
+
+        last_id = docs[-1]["_id"]
+        if not dry_run:
+            await db.migrations.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"last_id": last_id, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+
+    if not dry_run:
+        # Finished: a later run (e.g. after more legacy writes) starts from the top again
+        await db.migrations.delete_one({"_id": checkpoint_id})
+    return stats
+
+
+async def migrate(db, collections: dict = TIMESTAMP_FIELDS, batch_size: int = 1000,
+                  dry_run: bool = False, restart: bool = False) -> dict:
+    report = {}
+    for collection, fields in collections.items():
+        started = time.perf_counter()
+        stats = await migrate_collection(db, collection, fields, batch_size, dry_run, restart)
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        report[collection] = stats
+        print(
+            f"   {collection:<16} scanned {stats['scanned']:>9}  converted {stats['modified']:>9}"
+            f"  unparseable {stats['unparseable']:>6}  ({stats['seconds']}s)"
+        )
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert ISO-string timestamps to BSON dates")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    parser.add_argument("--db-name", default=DB_NAME)
+    parser.add_argument("--collection", action="append", choices=sorted(TIMESTAMP_FIELDS),
+                        help="limit to this collection (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="count conversions without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    collections = {c: TIMESTAMP_FIELDS[c] for c in (args.collection or TIMESTAMP_FIELDS)}
+    client = AsyncIOMotorClient(args.mongo_url, **MONGO_CODEC_OPTIONS)
+    db = client[args.db_name]
+    print(f"🕒 Converting string timestamps in {args.db_name}{' (dry run)' if args.dry_run else ''}...")
+    await migrate(db, collections, args.batch_size, args.dry_run, args.restart)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator
 from typing import List, Optional, Literal
 from datetime import datetime, timezone
 import uuid
@@ -98,7 +98,9 @@ class StudentEvent(BaseModel):
     institution_id: str
     student_id: str
     ticket_id: Optional[str] = None
-    event_type: Literal["note", "phone_call", "walk_in", "ai_routed", "sent_email", "received_email"]
+    event_type: Literal[
+        "note", "phone_call", "walk_in", "ai_routed", "sent_email", "received_email", "ticket_updated"
+    ]
     content: str
     created_by: Optional[str] = None  # user_id
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -123,10 +125,20 @@ class AiSuggestion(BaseModel):
     institution_id: str
     ticket_id: str
     suggestion_type: Literal["triage", "draft_reply"]
-    input_context: dict
-    output: dict
+    # ai_blobs references (see suggestion_store.py); older suggestions store input_context/output inline
+    input_hash: Optional[str] = None
+    output_hash: Optional[str] = None
+    summary: Optional[str] = None
+    input_context: Optional[dict] = None
+    output: Optional[dict] = None
     accepted: bool = False
+    model: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    latency_ms: Optional[float] = None
+    generated_count: int = 1
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_generated_at: Optional[datetime] = None
 
 
 # API Request/Response Models
@@ -150,6 +162,8 @@ class DraftReplyRequest(BaseModel):
     latest_message: str
     thread_context: Optional[List[dict]] = []
     student_notes: Optional[str] = None
+    # Only the automatic draft on ticket open may be served from draft_cache; "Regenerate" leaves it False
+    use_prefetched: bool = False
 
 
 class DraftReplyResponse(BaseModel):
@@ -159,6 +173,7 @@ class DraftReplyResponse(BaseModel):
     safe_reply: str
     redaction_report: dict
     disclaimer: str
+    usage: Optional[dict] = None  # model, token counts and latency of the LLM call
 
 
 class UpdateTicketMetadataRequest(BaseModel):
@@ -170,6 +185,38 @@ class UpdateTicketMetadataRequest(BaseModel):
     assignee_id: Optional[str] = None
 
 
+class BulkTicketFilter(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    status: Optional[Literal["open", "in_progress", "closed"]] = None
+    queue_id: Optional[str] = None
+    assignee_id: Optional[str] = None  # "unassigned" matches tickets without an assignee
+    category: Optional[Literal["fafsa", "verification", "sap_appeal", "billing", "general"]] = None
+    priority: Optional[Literal["low", "medium", "high", "urgent"]] = None
+    updated_before: Optional[datetime] = None
+
+
+class BulkTicketUpdate(BaseModel):
+    # Only fields that were sent are applied, so an explicit null assignee_id unassigns
+    model_config = ConfigDict(extra="forbid")
+    status: Optional[Literal["open", "in_progress", "closed"]] = None
+    queue_id: Optional[str] = None
+    assignee_id: Optional[str] = None
+    priority: Optional[Literal["low", "medium", "high", "urgent"]] = None
+
+
+class BulkTicketRequest(BaseModel):
+    # Exactly one of ticket_ids / filter
+    ticket_ids: Optional[List[str]] = Field(default=None, min_length=1)
+    filter: Optional[BulkTicketFilter] = None
+    update: BulkTicketUpdate
+
+
+class CreateJobRequest(BaseModel):
+    type: str
+    payload: dict = {}
+    priority: int = Field(default=0, ge=-10, le=10)
+
+
 class AddStudentEventRequest(BaseModel):
     institution_id: str
     student_id: str
@@ -177,3 +224,51 @@ class AddStudentEventRequest(BaseModel):
     event_type: Literal["note", "phone_call", "walk_in", "ai_routed", "sent_email", "received_email"]
     content: str
     created_by: Optional[str] = None
+
+
+class ChatbotMessageRequest(BaseModel):
+    message: str = Field(min_length=1, max_length=2000)
+    session_id: Optional[str] = None
+    # Needed to escalate to a ticket when the bot can't answer confidently
+    student_email: Optional[EmailStr] = None
+    student_name: Optional[str] = None
+
+
+class ChatbotMessageResponse(BaseModel):
+    answer: str
+    confidence: float
+    cited_kb: List[dict] = []
+    cached: bool = False
+    escalated: bool = False
+    ticket_id: Optional[str] = None
+    session_id: str
+
+
+# LLM Output Models (what the model is asked to return)
+
+class DraftModelOutput(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    summary: str = "Student inquiry"
+    reasoning: str = "N/A"
+    reply: str
+
+
+class TriageModelOutput(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    category: Literal["fafsa", "verification", "sap_appeal", "billing", "general"]
+    priority: Literal["low", "medium", "high", "urgent"]
+    reasoning: str = ""
+
+    @field_validator("category", "priority", mode="before")
+    @classmethod
+    def normalize_label(cls, value):
+        # Models sometimes answer "FAFSA" or "SAP Appeal"
+        if isinstance(value, str):
+            return value.strip().lower().replace(" ", "_")
+        return value
+
+
+class ChatbotModelOutput(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    answer: str
+    confidence: float = Field(default=0.0, ge=0.0, le=1.0)
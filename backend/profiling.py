@@ -0,0 +1,321 @@
+"""
+Per-request stage timing and sampled profiles.
+
+Every HTTP request gets a `RequestProfile` in a context variable; code records
+time spent in a stage with
+
+    with span("kb_search"):
+        ...
+
+Stages recorded out of the box:
+
+    auth        session lookup (get_current_user)
+    mongo       every Mongo command, via a pymongo CommandListener
+    pii_mask    mask_pii
+    kb_search   search_kb_articles
+    llm         model calls (complete and stream)
+    endpoint    the route function itself (includes the stages it calls)
+    framework   route handling outside the endpoint: body parsing, dependencies,
+                response serialization
+
+Stages are inclusive and may overlap (mongo inside endpoint). Each response
+carries a `Server-Timing` header, and per-route/stage histograms are kept in
+process (`timing_stats()`).
+
+A PROFILE_SAMPLE_RATE fraction of requests runs under a profiler (pyinstrument
+when installed, else cProfile). The profile is written to PROFILE_DIR only when
+the request took at least PROFILE_SLOW_MS.
+"""
+import asyncio
+import cProfile
+import functools
+import logging
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+from metrics import HTTP_LATENCY, HTTP_REQUESTS, MONGO_ERRORS, MONGO_LATENCY
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "1000"))
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", Path(__file__).parent / "profiles"))
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+except ImportError:
+    _Pyinstrument = None
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is everything above
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (plain ints, updated on the event loop)"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms: float):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the pct-th percentile"""
+        if not self.count:
+            return None
+        target = self.count * pct / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+
+class RequestProfile:
+    """Stage durations for one request"""
+
+    def __init__(self):
+        self.route = "unmatched"
+        self.started = time.perf_counter()
+        # (stage, ms) pairs; list.append is atomic, so Mongo listener threads can record too
+        self.records: list = []
+        self.finished = False
+
+    def record(self, stage: str, ms: float):
+        if not self.finished:
+            self.records.append((stage, ms))
+
+    def stages(self) -> dict:
+        """stage -> (total ms, calls)"""
+        totals = {}
+        for stage, ms in list(self.records):
+            total, calls = totals.get(stage, (0.0, 0))
+            totals[stage] = (total + ms, calls + 1)
+        return totals
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+# (route, stage) -> Histogram; stage "total" is the whole request
+_histograms: dict = {}
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as `stage` of the current request (no-op outside requests)"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.record(stage, (time.perf_counter() - started) * 1000)
+
+
+def _observe(route: str, stage: str, ms: float):
+    histogram = _histograms.get((route, stage))
+    if histogram is None:
+        histogram = _histograms[(route, stage)] = Histogram()
+    histogram.observe(ms)
+
+
+def timing_stats() -> dict:
+    """{route: {stage: {count, avg_ms, p50_ms, p95_ms, p99_ms}}} since startup"""
+    stats = {}
+    for (route, stage), h in sorted(_histograms.items()):
+        stats.setdefault(route, {})[stage] = {
+            "count": h.count,
+            "avg_ms": round(h.total / h.count, 2) if h.count else None,
+            "p50_ms": h.percentile(50),
+            "p95_ms": h.percentile(95),
+            "p99_ms": h.percentile(99),
+        }
+    return stats
+
+
+def route_histograms() -> dict:
+    return _histograms
+
+
+# ============================================================
+# MONGO COMMAND TIMING
+# ============================================================
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Records every command's server round trip as the "mongo" stage and in the
+    Mongo latency metrics. Motor runs pymongo on executor threads with a copy of
+    the caller's context, so the request's profile is visible here.
+    """
+
+    def __init__(self):
+        # (connection, request id) -> (collection, command) of commands in flight
+        self._inflight: dict = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        # getMore names the cursor id first and the collection separately
+        collection = target if isinstance(target, str) else event.command.get("collection", "")
+        self._inflight[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def _finish(self, event) -> tuple:
+        labels = self._inflight.pop((event.connection_id, event.request_id), ("", event.command_name))
+        ms = event.duration_micros / 1000
+        MONGO_LATENCY.observe(ms / 1000, *labels)
+        profile = _current.get()
+        if profile is not None:
+            profile.record("mongo", ms)
+        return labels
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        MONGO_ERRORS.inc(*self._finish(event))
+
+
+# ============================================================
+# ROUTES AND MIDDLEWARE
+# ============================================================
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that names the request's profile and times the endpoint vs. framework work"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed_endpoint(*a, **kw):
+                with span("endpoint"):
+                    return await call(*a, **kw)
+            self.dependant.call = timed_endpoint
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        path = self.path_format
+
+        async def profiled_handler(request):
+            profile = _current.get()
+            if profile is None:
+                return await handler(request)
+            profile.route = f"{request.method} {path}"
+            started = time.perf_counter()
+            before = len(profile.records)
+            try:
+                return await handler(request)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                endpoint = sum(ms for stage, ms in profile.records[before:] if stage == "endpoint")
+                profile.record("framework", elapsed - endpoint)
+
+        return profiled_handler
+
+
+def _server_timing(stages: dict, total_ms: float) -> str:
+    parts = [
+        f'{stage};dur={ms:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+        for stage, (ms, calls) in sorted(stages.items())
+    ]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+class _SampledProfiler:
+    """Wraps pyinstrument (async-aware) or cProfile for one request"""
+
+    # cProfile can only profile one thing at a time per thread
+    _cprofile_active = False
+
+    def __init__(self):
+        self._profiler = None
+        if _Pyinstrument is not None:
+            self._profiler = _Pyinstrument(async_mode="enabled")
+        elif not _SampledProfiler._cprofile_active:
+            _SampledProfiler._cprofile_active = True
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self._profiler is not None:
+            (self._profiler.start if _Pyinstrument else self._profiler.enable)()
+
+    def stop(self):
+        if self._profiler is None:
+            return
+        if _Pyinstrument:
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+            _SampledProfiler._cprofile_active = False
+
+    def save(self, name: str):
+        if self._profiler is None:
+            return
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        if _Pyinstrument:
+            (PROFILE_DIR / f"{name}.html").write_text(self._profiler.output_html())
+        else:
+            self._profiler.dump_stats(str(PROFILE_DIR / f"{name}.prof"))
+
+
+async def profiling_middleware(request, call_next):
+    """Install a RequestProfile, add Server-Timing and feed the route/stage histograms"""
+    profile = RequestProfile()
+    token = _current.set(profile)
+    sampler = _SampledProfiler() if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE else None
+    if sampler:
+        sampler.start()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+    finally:
+        if sampler:
+            sampler.stop()
+        _current.reset(token)
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        HTTP_REQUESTS.inc(profile.route, status)
+        HTTP_LATENCY.observe(total_ms / 1000, profile.route, status)
+
+    profile.finished = True
+    stages = profile.stages()
+    response.headers["Server-Timing"] = _server_timing(stages, total_ms)
+
+    _observe(profile.route, "total", total_ms)
+    for stage, (ms, _) in stages.items():
+        _observe(profile.route, stage, ms)
+
+    if sampler and total_ms >= PROFILE_SLOW_MS:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}_{re.sub(r'[^A-Za-z0-9]+', '_', profile.route).strip('_')}_{total_ms:.0f}ms"
+        try:
+            sampler.save(name)
+        except Exception as e:
+            logger.error(f"Failed to write request profile {name}: {e}")
+    return response
@@ -0,0 +1,174 @@
+"""
+Token-budgeted context building for draft generation.
+
+Instead of concatenating article prefixes and truncated thread messages, KB
+articles are split into passages (one per markdown section), passages and thread
+turns are ranked, and the best ones are packed into a token budget:
+
+    KB passages      highest query-term score first   (DRAFT_KB_TOKEN_SHARE of budget)
+    thread summary   rolling summary of older turns   (up to half of what is left)
+    thread turns     newest first                     (the rest, plus unused KB budget)
+    student notes    whatever budget remains, truncated
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from llm import count_tokens
+
+DRAFT_CONTEXT_TOKEN_BUDGET = int(os.getenv("DRAFT_CONTEXT_TOKEN_BUDGET", "1800"))
+DRAFT_KB_TOKEN_SHARE = float(os.getenv("DRAFT_KB_TOKEN_SHARE", "0.6"))
+NOTES_MIN_TOKENS = 60
+
+_HEADING = re.compile(r"^#{1,6}\s+(.*)$", re.MULTILINE)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+@dataclass
+class Passage:
+    article: dict
+    heading: str
+    text: str
+    score: int = 0
+    tokens: int = 0
+
+
+@dataclass
+class DraftContext:
+    kb_context: str = ""
+    thread_context: str = ""
+    notes_context: str = ""
+    cited_articles: List[dict] = field(default_factory=list)
+    token_counts: dict = field(default_factory=dict)
+
+
+def query_terms(text: str) -> List[str]:
+    """Lowercased words of 3+ characters (drops 'a', 'is', ... that match everywhere)"""
+    return [w for w in _WORD.findall(text.lower()) if len(w) > 2]
+
+
+def split_passages(article: dict) -> List[Passage]:
+    """One passage per markdown section; text before the first heading is its own passage"""
+    content = article.get("content", "")
+    matches = list(_HEADING.finditer(content))
+    passages = []
+
+    starts = [m.start() for m in matches] or [len(content)]
+    if content[:starts[0]].strip():
+        passages.append(Passage(article, article["title"], content[:starts[0]].strip()))
+
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        body = content[match.end():end].strip()
+        if body:
+            passages.append(Passage(article, match.group(1).strip(), body))
+    return passages
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, on a word boundary"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Tokens are ~4 chars; shrink until it fits
+    cut = text[:max_tokens * 4]
+    while cut and count_tokens(cut) > max_tokens:
+        cut = cut[:int(len(cut) * 0.9)]
+    return cut.rsplit(" ", 1)[0] + "..."
+
+
+def select_passages(articles: List[dict], query: str, budget: int) -> List[Passage]:
+    """Highest-scoring passages across all articles that fit in the budget"""
+    terms = query_terms(query)
+    candidates = []
+    for article in articles:
+        title_hits = sum(article["title"].lower().count(t) for t in terms)
+        for passage in split_passages(article):
+            text = f"{passage.heading} {passage.text}".lower()
+            passage.score = sum(text.count(t) for t in terms) + title_hits
+            if passage.score > 0:
+                candidates.append(passage)
+
+    candidates.sort(key=lambda p: p.score, reverse=True)
+    selected, used = [], 0
+    for passage in candidates:
+        passage.tokens = count_tokens(passage.text) + count_tokens(passage.heading) + 8
+        if used + passage.tokens <= budget:
+            selected.append(passage)
+            used += passage.tokens
+    return selected
+
+
+def select_thread_turns(thread: List[dict], budget: int) -> List[str]:
+    """Newest thread turns (oldest first in the result) that fit in the budget"""
+    lines, used = [], 0
+    for msg in reversed(thread or []):
+        line = f"- {msg.get('sender', 'Unknown')}: {msg.get('body', '').strip()}"
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            # Fit a truncated version of the turn that didn't fit, then stop
+            remaining = budget - used
+            if remaining > 20:
+                lines.append(truncate_to_tokens(line, remaining))
+            break
+        lines.append(line)
+        used += tokens
+    return list(reversed(lines))
+
+
+def build_draft_context(
+    articles: List[dict],
+    query: str,
+    thread: Optional[List[dict]],
+    notes: Optional[str],
+    budget: int = DRAFT_CONTEXT_TOKEN_BUDGET,
+    thread_summary: Optional[str] = None,
+) -> DraftContext:
+    """Pack KB passages, thread turns and notes into `budget` tokens"""
+    context = DraftContext()
+
+    passages = select_passages(articles, query, int(budget * DRAFT_KB_TOKEN_SHARE))
+    kb_tokens = sum(p.tokens for p in passages)
+    for i, passage in enumerate(passages, 1):
+        context.kb_context += f"\n\n[KB {i}: {passage.article['title']} > {passage.heading}]\n{passage.text}\n"
+
+    seen = set()
+    for passage in passages:
+        article = passage.article
+        if article["title"] not in seen:
+            seen.add(article["title"])
+            context.cited_articles.append({
+                "title": article["title"],
+                "category": article["category"],
+                "excerpt": truncate_to_tokens(passage.text, 50),
+            })
+
+    notes_reserve = NOTES_MIN_TOKENS if notes else 0
+    available = budget - kb_tokens - notes_reserve
+
+    summary_text = truncate_to_tokens(thread_summary, available // 2) if thread_summary else ""
+    summary_tokens = count_tokens(summary_text)
+
+    thread_lines = select_thread_turns(thread, available - summary_tokens)
+    thread_tokens = summary_tokens + sum(count_tokens(line) for line in thread_lines)
+    if summary_text:
+        context.thread_context = f"\n\nSummary of earlier conversation:\n{summary_text}\n"
+    if thread_lines:
+        context.thread_context += "\n\nPrevious conversation:\n" + "\n".join(thread_lines) + "\n"
+
+    notes_tokens = 0
+    if notes:
+        notes_text = truncate_to_tokens(notes, budget - kb_tokens - thread_tokens)
+        notes_tokens = count_tokens(notes_text)
+        if notes_text:
+            context.notes_context = f"\n\nStudent notes: {notes_text}"
+
+    context.token_counts = {
+        "kb": kb_tokens,
+        "thread": thread_tokens,
+        "notes": notes_tokens,
+        "budget": budget,
+    }
+    return context
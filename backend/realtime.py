@@ -0,0 +1,172 @@
+"""
+Realtime ticket/message deltas pushed to connected agents.
+
+Events are published to a per-institution channel and fanned out in-process to
+every subscriber of that channel (optionally filtered by queue). For
+multi-instance deployments the broker is pluggable: `MongoBroker` relays events
+between instances through a capped collection, so every instance sees every
+event without adding Redis to the stack.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    """One connected client: a bounded queue of events for a channel, optionally queue-filtered"""
+
+    def __init__(self, channel: str, queue_ids: Optional[Iterable[str]] = None):
+        self.channel = channel
+        self.queue_ids = set(queue_ids) if queue_ids else None
+        self._events: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, event: dict) -> bool:
+        if self.queue_ids is None:
+            return True
+        # Tickets moving out of a watched queue are still delivered
+        return (
+            event.get("queue_id") in self.queue_ids
+            or event.get("previous_queue_id") in self.queue_ids
+        )
+
+    def deliver(self, event: dict):
+        try:
+            self._events.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop the backlog and ask the client to refetch
+            while not self._events.empty():
+                self._events.get_nowait()
+            self._events.put_nowait({"type": "resync", "at": event.get("at")})
+
+    async def get(self) -> dict:
+        return await self._events.get()
+
+
+class Broker:
+    """Pub/sub interface; implementations decide how events reach other instances"""
+
+    def __init__(self):
+        self._subscribers: dict = {}
+
+    def subscribe(self, channel: str, queue_ids: Optional[Iterable[str]] = None) -> Subscription:
+        subscription = Subscription(channel, queue_ids)
+        self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.channel)
+        if subscribers:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+    def _fan_out(self, channel: str, event: dict):
+        for subscription in list(self._subscribers.get(channel, ())):
+            if subscription.wants(event):
+                subscription.deliver(event)
+
+    async def publish(self, channel: str, event: dict):
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class InProcessBroker(Broker):
+    """Single-instance broker: publish fans out directly to local subscribers"""
+
+    async def publish(self, channel: str, event: dict):
+        self._fan_out(channel, event)
+
+
+class MongoBroker(Broker):
+    """
+    Multi-instance broker relaying events through a capped collection.
+    Every instance tails the collection and fans out to its own subscribers.
+    """
+
+    def __init__(self, db, collection: str = "realtime_events", size_bytes: int = 16 * 1024 * 1024):
+        super().__init__()
+        self.db = db
+        self.collection_name = collection
+        self.size_bytes = size_bytes
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        try:
+            await self.db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def publish(self, channel: str, event: dict):
+        await self.db[self.collection_name].insert_one({"channel": channel, "event": event})
+
+    async def _tail(self):
+        collection = self.db[self.collection_name]
+        # Only relay events published after this instance started
+        newest = await collection.find_one({}, sort=[("$natural", -1)])
+        last_id = newest["_id"] if newest else None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                while cursor.alive:
+                    async for doc in cursor:
+                        last_id = doc["_id"]
+                        self._fan_out(doc["channel"], doc["event"])
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Realtime broker tail failed, restarting: {e}")
+            await asyncio.sleep(1)
+
+
+def create_broker(db) -> Broker:
+    """Pick the broker from REALTIME_BROKER (memory | mongo)"""
+    if os.environ.get("REALTIME_BROKER", "memory").lower() == "mongo":
+        return MongoBroker(db)
+    return InProcessBroker()
+
+
+def institution_channel(institution_id: str) -> str:
+    return f"institution:{institution_id}"
+
+
+def make_event(
+    event_type: str,
+    ticket_id: str,
+    queue_id: Optional[str],
+    data: dict,
+    previous_queue_id: Optional[str] = None,
+) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "type": event_type,
+        "ticket_id": ticket_id,
+        "queue_id": queue_id,
+        "previous_queue_id": previous_queue_id,
+        "data": data,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
@@ -0,0 +1,62 @@
+"""
+Building and validating documents without per-request model instantiation.
+
+Request bodies are validated once, by FastAPI's request models, at the API
+boundary; that is the only place untrusted data enters a document. Documents
+assembled from already-validated values (a request model, a parsed LLM output,
+ids and timestamps the server generated) don't need a second full pydantic
+instantiation and `model_dump()` before they are inserted:
+
+    doc = new_document(StudentEvent, institution_id=..., event_type=..., content=...)
+
+fills the model's defaults (ids, timestamps, empty lists) from a per-model plan
+computed once and returns the plain dict. Missing required fields and unknown
+field names still raise, so typos don't reach the database.
+"""
+import copy
+from functools import lru_cache
+from typing import Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+_REQUIRED = object()
+
+
+@lru_cache(maxsize=None)
+def _plan(model: Type[BaseModel]) -> tuple:
+    """(field name, default factory, default) per field, in declaration order"""
+    plan = []
+    for name, info in model.model_fields.items():
+        if info.default_factory is not None:
+            plan.append((name, info.default_factory, None))
+        elif info.default is PydanticUndefined:
+            plan.append((name, None, _REQUIRED))
+        else:
+            plan.append((name, None, info.default))
+    return tuple(plan)
+
+
+@lru_cache(maxsize=None)
+def _field_names(model: Type[BaseModel]) -> frozenset:
+    return frozenset(model.model_fields)
+
+
+def new_document(model: Type[BaseModel], /, **fields) -> dict:
+    """Document for `model` from trusted values: defaults filled in, no validation"""
+    unknown = fields.keys() - _field_names(model)
+    if unknown:
+        raise TypeError(f"{model.__name__} has no field(s): {', '.join(sorted(unknown))}")
+    doc = {}
+    for name, factory, default in _plan(model):
+        if name in fields:
+            doc[name] = fields[name]
+        elif factory is not None:
+            doc[name] = factory()
+        elif default is _REQUIRED:
+            raise TypeError(f"{model.__name__}.{name} is required")
+        else:
+            # Mutable defaults ([] / {}) must not be shared between documents
+            doc[name] = copy.copy(default) if isinstance(default, (list, dict, set)) else default
+    return doc
+
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Retention tiering for the fastest-growing collections.
+
+audit_logs (one document per ticket view) and ai_suggestions (one per distinct
+draft) are rarely read once they are a few weeks old, but they
+compete with tickets and messages for the WiredTiger cache. Documents older than
+their policy's hot window are moved to an archive tier:
+
+    RETENTION_ARCHIVE=file        gzip JSONL partitioned by tenant and document date under
+                                  RETENTION_ARCHIVE_DIR/<collection>/<institution_id>/<YYYY>/<MM>/<DD>/
+                                  (default)
+    RETENTION_ARCHIVE=collection  the <collection>_archive collection
+
+Each batch is written to the archive first and only then marked `archived_at`.
+A TTL index on `archived_at` (indexes.py) removes the hot copy
+RETENTION_DELETE_AFTER_SECONDS later, so nothing is deleted before it has been
+archived. A crash between the two steps re-archives the batch on the next pass;
+`query` de-duplicates by `_id`.
+
+AI suggestions reference their input and output in ai_blobs (suggestion_store.py),
+so they are archived hydrated. After they are archived, each pass marks blobs that
+no hot suggestion can still reference, and the same TTL removes them.
+
+`query()` reads the hot collection and the archive and merges the results
+newest first, for compliance lookups that span both tiers.
+
+    python retention.py                  # archive once and exit
+    python retention.py --collection audit_logs
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from pymongo import ReplaceOne
+
+from fast_json import dumps
+from suggestion_store import AI_BLOB_TOUCH_SECONDS, collect_blobs, hydrate
+from timestamps import parse_timestamp, utcnow
+
+logger = logging.getLogger(__name__)
+
+RETENTION_ARCHIVE = os.environ.get("RETENTION_ARCHIVE", "file").lower()
+RETENTION_ARCHIVE_DIR = Path(os.environ.get("RETENTION_ARCHIVE_DIR", Path(__file__).parent / "archive"))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "1000"))
+RETENTION_INTERVAL_SECONDS = float(os.environ.get("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_DELETE_AFTER_SECONDS = int(os.environ.get("RETENTION_DELETE_AFTER_SECONDS", "86400"))
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    collection: str
+    time_field: str
+    hot_days: float
+
+
+RETENTION_POLICIES = {
+    "audit_logs": RetentionPolicy(
+        "audit_logs", "timestamp", float(os.environ.get("AUDIT_LOGS_HOT_DAYS", "30"))
+    ),
+    "ai_suggestions": RetentionPolicy(
+        "ai_suggestions", "created_at", float(os.environ.get("AI_SUGGESTIONS_HOT_DAYS", "90"))
+    ),
+}
+
+
+def _matches(doc: dict, match: dict) -> bool:
+    return all(doc.get(key) == value for key, value in match.items())
+
+
+def _in_range(moment: Optional[datetime], start: Optional[datetime], end: Optional[datetime]) -> bool:
+    if moment is None:
+        return start is None and end is None
+    return (start is None or moment >= start) and (end is None or moment < end)
+
+
+# ============================================================
+# ARCHIVE TIERS
+# ============================================================
+
+def _tenant_dir(institution_id) -> str:
+    """Directory name for a tenant's partitions (ids are UUIDs; anything else is made path-safe)"""
+    if institution_id is None:
+        return "_shared"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(institution_id))
+
+
+def _day_dirs(base: Path) -> List[Path]:
+    return sorted(p for p in base.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]/[0-9][0-9]") if p.is_dir())
+
+
+class FileArchive:
+    """
+    gzip JSONL files, one directory per tenant and day of the documents' time field.
+    Lookups always name the tenant, so they only open that tenant's files. Archives
+    written before the tenant level existed (<collection>/<YYYY>/<MM>/<DD>/) are still read.
+    """
+
+    def __init__(self, root: Path = RETENTION_ARCHIVE_DIR):
+        self.root = Path(root)
+
+    async def write(self, policy: RetentionPolicy, docs: List[dict]):
+        await asyncio.to_thread(self._write, policy, docs)
+
+    def _write(self, policy: RetentionPolicy, docs: List[dict]):
+        by_day = {}
+        for doc in docs:
+            moment = parse_timestamp(doc.get(policy.time_field))
+            day = moment.strftime("%Y/%m/%d") if moment else "undated"
+            by_day.setdefault((_tenant_dir(doc.get("institution_id")), day), []).append(doc)
+
+        batch = f"part-{utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        for (tenant, day), day_docs in by_day.items():
+            directory = self.root / policy.collection / tenant / day
+            directory.mkdir(parents=True, exist_ok=True)
+            # Written under a temporary name and renamed, so readers never see a partial file
+            tmp = directory / f".{batch}.tmp"
+            with gzip.open(tmp, "wb") as f:
+                for doc in day_docs:
+                    f.write(dumps(doc) + b"\n")
+            os.replace(tmp, directory / batch)
+
+    def _partitions(self, policy: RetentionPolicy, match: dict, start: Optional[datetime],
+                    end: Optional[datetime]):
+        base = self.root / policy.collection
+        if not base.exists():
+            return []
+        if "institution_id" in match:
+            tenants = [base / _tenant_dir(match["institution_id"])]
+        else:
+            tenants = [p for p in base.iterdir() if p.is_dir() and not p.name.isdigit() and p.name != "undated"]
+        # The legacy layout, without a tenant level
+        tenants.append(base)
+
+        days, undated = [], []
+        for tenant in tenants:
+            days += _day_dirs(tenant)
+            if (tenant / "undated").is_dir():
+                undated.append(tenant / "undated")
+        days.sort(key=lambda path: path.parts[-3:])
+        if start is None and end is None:
+            return undated + days
+        selected = []
+        for path in days:
+            try:
+                day = datetime.strptime("/".join(path.parts[-3:]), "%Y/%m/%d").replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            if (start is None or day + timedelta(days=1) > start) and (end is None or day < end):
+                selected.append(path)
+        return selected
+
+    async def read(self, policy: RetentionPolicy, match: dict, start: Optional[datetime],
+                   end: Optional[datetime], limit: int) -> List[dict]:
+        return await asyncio.to_thread(self._read, policy, match, start, end, limit)
+
+    def _read(self, policy, match, start, end, limit) -> List[dict]:
+        found = []
+        # Newest partitions first so the limit keeps the most recent documents
+        for directory in reversed(self._partitions(policy, match, start, end)):
+            for path in sorted(directory.glob("part-*.jsonl.gz"), reverse=True):
+                with gzip.open(path, "rb") as f:
+                    for line in f:
+                        doc = json.loads(line)
+                        moment = parse_timestamp(doc.get(policy.time_field))
+                        if _matches(doc, match) and _in_range(moment, start, end):
+                            if moment is not None:
+                                doc[policy.time_field] = moment
+                            found.append(doc)
+            if len(found) >= limit:
+                break
+        return found
+
+
+class CollectionArchive:
+    """Documents copied to <collection>_archive (e.g. on cheaper storage or another cluster)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def write(self, policy: RetentionPolicy, docs: List[dict]):
+        # Replace by _id so a re-archived batch doesn't duplicate documents
+        await self.db[f"{policy.collection}_archive"].bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False
+        )
+
+    async def read(self, policy: RetentionPolicy, match: dict, start: Optional[datetime],
+                   end: Optional[datetime], limit: int) -> List[dict]:
+        query = dict(match)
+        time_filter = {**({"$gte": start} if start else {}), **({"$lt": end} if end else {})}
+        if time_filter:
+            query[policy.time_field] = time_filter
+        return await self.db[f"{policy.collection}_archive"].find(query).sort(
+            policy.time_field, -1
+        ).to_list(limit)
+
+
+def create_archive(db):
+    """Archive tier from RETENTION_ARCHIVE (file | collection)"""
+    if RETENTION_ARCHIVE == "collection":
+        return CollectionArchive(db)
+    if RETENTION_ARCHIVE == "file":
+        return FileArchive()
+    raise ValueError(f"Unknown RETENTION_ARCHIVE: {RETENTION_ARCHIVE}")
+
+
+# ============================================================
+# ARCHIVER
+# ============================================================
+
+class Archiver:
+    """Moves documents past their hot window into the archive tier, in batches"""
+
+    def __init__(self, db, archive=None, batch_size: int = RETENTION_BATCH_SIZE):
+        self.db = db
+        self.archive = archive or create_archive(db)
+        self.batch_size = batch_size
+        self.archived = 0
+
+    async def archive_collection(self, policy: RetentionPolicy, now: Optional[datetime] = None) -> int:
+        cutoff = (now or utcnow()) - timedelta(days=policy.hot_days)
+        collection = self.db[policy.collection]
+        moved = 0
+        while True:
+            docs = await collection.find(
+                {policy.time_field: {"$lt": cutoff}, "archived_at": {"$exists": False}}
+            ).sort(policy.time_field, 1).to_list(self.batch_size)
+            if not docs:
+                break
+            if policy.collection == "ai_suggestions":
+                # The archive must not depend on ai_blobs, which is collected below
+                await hydrate(self.db, docs)
+            await self.archive.write(policy, docs)
+            # The TTL index on archived_at removes the hot copies later
+            await collection.update_many(
+                {"_id": {"$in": [doc["_id"] for doc in docs]}}, {"$set": {"archived_at": utcnow()}}
+            )
+            moved += len(docs)
+        self.archived += moved
+        return moved
+
+    async def collect_blobs(self, now: Optional[datetime] = None) -> int:
+        """Mark ai_blobs only referenced by archived suggestions (call after archiving ai_suggestions)"""
+        # A reference may be up to AI_BLOB_TOUCH_SECONDS older than the suggestion that made it
+        cutoff = (now or utcnow()) - timedelta(
+            days=RETENTION_POLICIES["ai_suggestions"].hot_days, seconds=AI_BLOB_TOUCH_SECONDS
+        )
+        return await collect_blobs(self.db, cutoff)
+
+    async def run_once(self, collections: Optional[List[str]] = None) -> dict:
+        moved = {
+            name: await self.archive_collection(RETENTION_POLICIES[name])
+            for name in (collections or RETENTION_POLICIES)
+        }
+        if "ai_suggestions" in moved:
+            moved["ai_blobs"] = await self.collect_blobs()
+        return moved
+
+    async def loop(self):
+        while True:
+            try:
+                moved = await self.run_once()
+                if any(moved.values()):
+                    logger.info(f"Archived {moved}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retention archiver pass failed: {e}")
+            await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+# ============================================================
+# CROSS-TIER QUERIES
+# ============================================================
+
+async def query(db, collection: str, match: dict, start: Optional[datetime] = None,
+                end: Optional[datetime] = None, limit: int = 100, archive=None) -> List[dict]:
+    """Documents matching `match` (equality) in [start, end), newest first, from both tiers"""
+    policy = RETENTION_POLICIES[collection]
+    start, end = parse_timestamp(start), parse_timestamp(end)
+
+    hot_query = dict(match)
+    time_filter = {**({"$gte": start} if start else {}), **({"$lt": end} if end else {})}
+    if time_filter:
+        hot_query[policy.time_field] = time_filter
+    hot = await db[collection].find(hot_query, {"archived_at": 0}).sort(policy.time_field, -1).to_list(limit)
+
+    cold = []
+    # Only documents older than the hot window are ever archived
+    if start is None or start < utcnow() - timedelta(days=policy.hot_days):
+        cold = await (archive or create_archive(db)).read(policy, match, start, end, limit)
+
+    merged, seen = [], set()
+    for tier, docs in (("hot", hot), ("archive", cold)):
+        for doc in docs:
+            key = str(doc.pop("_id", None) or id(doc))
+            if key in seen:
+                continue
+            seen.add(key)
+            doc["tier"] = tier
+            merged.append(doc)
+
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    merged.sort(key=lambda d: parse_timestamp(d.get(policy.time_field)) or oldest, reverse=True)
+    return merged[:limit]
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from id_codec import MONGO_UUID_OPTIONS, wrap_database
+    from timestamps import MONGO_CODEC_OPTIONS
+
+    parser = argparse.ArgumentParser(description="Archive audit logs and AI suggestions past their hot window")
+    parser.add_argument("--collection", action="append", choices=sorted(RETENTION_POLICIES))
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(
+        os.getenv("MONGO_URL", "mongodb://localhost:27017"), **MONGO_CODEC_OPTIONS, **MONGO_UUID_OPTIONS
+    )
+    db = wrap_database(client[os.getenv("DB_NAME", "test_database")])
+    print(f"🗄️  Archiving to {RETENTION_ARCHIVE} tier...")
+    moved = await Archiver(db).run_once(args.collection)
+    for collection, count in moved.items():
+        print(f"   {collection:<16} {count:>9} archived")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,6 +6,8 @@ import uuid
 from datetime import datetime, timezone, timedelta
 import random
 from motor.motor_asyncio import AsyncIOMotorClient
+from ticket_summary import recompute_ticket_summaries
+from id_codec import MONGO_UUID_OPTIONS, wrap_database
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "test_database")
@@ -13,8 +15,8 @@ DB_NAME = os.getenv("DB_NAME", "test_database")
 
 async def seed_massive_tickets():
     """Add 500+ tickets to the database"""
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DB_NAME]
+    client = AsyncIOMotorClient(MONGO_URL, **MONGO_UUID_OPTIONS)
+    db = wrap_database(client[DB_NAME])
     
     print("🌱 Seeding 500+ additional tickets for stress testing...")
     
@@ -27,9 +29,9 @@ async def seed_massive_tickets():
     institution_id = institution["id"]
     
     # Get existing students, queues, users
-    students = await db.students.find({"institution_id": institution_id}).to_list(100)
-    queues = await db.queues.find({"institution_id": institution_id}).to_list(100)
-    users = await db.users.find({"institution_id": institution_id}).to_list(100)
+    students = await db.students.find({"institution_id": institution_id}).to_list(None)
+    queues = await db.queues.find({"institution_id": institution_id}).to_list(None)
+    users = await db.users.find({"institution_id": institution_id}).to_list(None)
     
     # Extended subjects pool for variety
     subjects = [
@@ -121,8 +123,8 @@ async def seed_massive_tickets():
                 "queue_id": queue["id"],
                 "assignee_id": assignee,
                 "channel": random.choice(channels),
-                "created_at": created_at.isoformat(),
-                "updated_at": updated_at.isoformat()
+                "created_at": created_at,
+                "updated_at": updated_at
             }
             tickets_batch.append(ticket)
             
@@ -137,7 +139,7 @@ async def seed_massive_tickets():
                 "body": f"Hi, I have a question about {ticket['category'].replace('_', ' ')}. Can you help me with this issue? I need assistance with the process.",
                 "direction": "inbound",
                 "thread_id": None,
-                "created_at": created_at.isoformat()
+                "created_at": created_at
             }
             messages_batch.append(message)
         
@@ -147,6 +149,9 @@ async def seed_massive_tickets():
         total_created += len(tickets_batch)
         print(f"✅ Batch {batch + 1}/5: Created {len(tickets_batch)} tickets (Total: {total_created}/500)")
     
+    # Fill in denormalized inbox fields for the new tickets
+    await recompute_ticket_summaries(db, institution_id)
+    
     # Get final count
     total_tickets = await db.tickets.count_documents({"institution_id": institution_id})
     print(f"\n📊 Final ticket count: {total_tickets}")
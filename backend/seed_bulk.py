@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Bulk, deterministic dataset generator for load tests.
+
+    python seed_bulk.py --institutions 5 --tickets 200000
+    python seed_bulk.py --institutions 1 --tickets 1000000 --batch-size 20000 --parallel 8
+
+Every id, timestamp and field value is derived from --seed and --anchor, so
+re-running with the same arguments replaces each generated institution (found
+by its slug, `<prefix>-<n>`) with identical data. Random values are drawn as
+numpy arrays per chunk of tickets, ticket inbox summaries (see ticket_summary.py)
+are computed while generating instead of in a second pass, and each chunk is
+written with unordered insert_many batches in parallel across collections.
+Indexes are built once at the end, which is much faster than maintaining them
+during the load.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from id_codec import MONGO_UUID_OPTIONS, wrap_database
+from indexes import ensure_indexes
+from kb_data import sample_kb_articles
+from ticket_summary import SEARCH_MESSAGES, make_snippet, search_fragment
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "test_database")
+
+# Collections holding per-institution data (cleared before an institution is regenerated)
+TENANT_COLLECTIONS = (
+    "users", "queues", "students", "tickets", "messages", "student_events",
+    "knowledge_base", "ai_suggestions", "ai_blobs", "draft_cache", "chatbot_answers", "jobs",
+)
+
+QUEUES = [
+    ("General Inquiries", "General financial aid questions"),
+    ("FAFSA Support", "FAFSA application assistance"),
+    ("Verification", "Document verification requests"),
+    ("SAP Appeals", "Satisfactory Academic Progress appeals"),
+    ("Billing", "Billing and payment questions"),
+]
+CATEGORIES = np.array(["fafsa", "verification", "sap_appeal", "billing", "general"])
+CATEGORY_WEIGHTS = [0.3, 0.25, 0.1, 0.15, 0.2]
+STATUSES = np.array(["open", "in_progress", "closed"])
+STATUS_WEIGHTS = [0.35, 0.25, 0.4]
+PRIORITIES = np.array(["low", "medium", "high", "urgent"])
+PRIORITY_WEIGHTS = [0.3, 0.45, 0.18, 0.07]
+
+FIRST_NAMES = np.array([
+    "Emma", "Liam", "Olivia", "Noah", "Ava", "Mateo", "Sophia", "Ethan", "Mia", "Lucas",
+    "Amara", "Kai", "Priya", "Diego", "Chloe", "Malik", "Hana", "Omar", "Grace", "Wei",
+])
+LAST_NAMES = np.array([
+    "Johnson", "Garcia", "Nguyen", "Smith", "Patel", "Kim", "Brown", "Martinez", "Lee", "Davis",
+    "Okafor", "Rossi", "Chen", "Lopez", "Cohen", "Singh", "Wilson", "Ahmed", "Silva", "Park",
+])
+SUBJECTS = np.array([
+    "FAFSA application question", "Verification documents needed", "SAP appeal process inquiry",
+    "Payment plan setup", "Loan disbursement timing", "Grant eligibility question",
+    "Missing financial aid award letter", "Tax transcript submission", "Refund check status",
+    "Change of enrollment status", "Parent PLUS loan questions", "Cost of attendance clarification",
+])
+INBOUND_BODIES = np.array([
+    "Hi, I submitted my FAFSA last week but my portal still shows it as missing. Can you check?",
+    "I received a verification request. Which documents do I need to upload and by when?",
+    "My aid was suspended for SAP. How do I file an appeal and what should I include?",
+    "Is it possible to set up a payment plan for the remaining balance this semester?",
+    "When will my loan be disbursed? My tuition payment is due soon.",
+    "I dropped a class this week. Will that affect my Pell Grant?",
+    "Could you tell me what the deadline is for submitting my tax transcript?",
+])
+OUTBOUND_BODIES = np.array([
+    "Thanks for reaching out. I've reviewed your file and a counselor will follow up shortly.",
+    "Please upload the requested documents through the student portal and reply once done.",
+    "You can find the appeal form in the Knowledge Base; submit it with a short personal statement.",
+    "Payment plans can be set up through the Bursar's office; I've included the link below.",
+])
+NOTES = np.array([
+    "Called to follow up on documents", "Walk-in visit, answered questions about deadlines",
+    "Left voicemail regarding verification", "Reviewed file, waiting on student response",
+])
+
+
+@dataclass
+class SeedConfig:
+    institutions: int = 1
+    students: int = 500
+    tickets: int = 5000
+    messages: float = 4.0  # mean messages per ticket (Poisson, at least 1)
+    notes: float = 0.5  # mean extra note events per ticket
+    kb_articles: int = len(sample_kb_articles)
+    agents: int = 5
+    seed: int = 42
+    anchor: datetime = field(default_factory=lambda: datetime(2025, 9, 1, tzinfo=timezone.utc))
+    history_days: int = 90
+    slug_prefix: str = "load"
+    batch_size: int = 10000
+    parallel: int = 4
+    chunk_size: int = 50000  # tickets generated per round
+
+
+class BatchWriter:
+    """Unordered insert_many batches, at most `parallel` in flight, with per-collection counts"""
+
+    def __init__(self, db, batch_size: int, parallel: int):
+        self.db = db
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(parallel)
+        self.counts: dict = {}
+
+    async def _insert(self, collection: str, docs: list):
+        async with self._semaphore:
+            await self.db[collection].insert_many(docs, ordered=False)
+        self.counts[collection] = self.counts.get(collection, 0) + len(docs)
+
+    async def write(self, batches: dict):
+        """Insert {collection: docs} concurrently across and within collections"""
+        await asyncio.gather(*(
+            self._insert(collection, docs[i:i + self.batch_size])
+            for collection, docs in batches.items()
+            for i in range(0, len(docs), self.batch_size)
+        ))
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+# ============================================================
+# VECTORIZED HELPERS
+# ============================================================
+
+def uuids(rng: np.random.Generator, n: int) -> list:
+    """n deterministic version-4 UUID strings"""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    return [str(uuid.UUID(bytes=row.tobytes())) for row in raw]
+
+
+def utc_datetimes(anchor: datetime, seconds_before: np.ndarray) -> list:
+    """Aware UTC datetimes (whole seconds) for anchor minus offsets"""
+    anchor64 = np.datetime64(anchor.replace(tzinfo=None, microsecond=0), "s")
+    stamps = (anchor64 - seconds_before.astype("timedelta64[s]")).tolist()
+    return [stamp.replace(tzinfo=timezone.utc) for stamp in stamps]
+
+
+# ============================================================
+# GENERATION
+# ============================================================
+
+async def clear_institution(db, slug: str):
+    """Remove a previously generated institution and everything scoped to it"""
+    existing = await db.institutions.find_one({"slug": slug}, {"_id": 0, "id": 1})
+    if existing is None:
+        return
+    await asyncio.gather(*(
+        db[name].delete_many({"institution_id": existing["id"]}) for name in TENANT_COLLECTIONS
+    ))
+    await db.institutions.delete_one({"slug": slug})
+
+
+async def seed_institution(db, n: int, config: SeedConfig, writer: BatchWriter):
+    rng = np.random.default_rng([config.seed, n])
+    slug = f"{config.slug_prefix}-{n}"
+    domain = f"{config.slug_prefix}{n}.edu"
+    anchored = config.anchor.replace(microsecond=0)
+    await clear_institution(db, slug)
+
+    institution_id = uuids(rng, 1)[0]
+    await db.institutions.insert_one({
+        "id": institution_id, "name": f"{config.slug_prefix.title()} University {n}",
+        "slug": slug, "domain": domain, "created_at": anchored,
+    })
+
+    users = [{
+        "id": user_id, "institution_id": institution_id, "email": f"agent{i}@{domain}",
+        "name": f"Agent {i}", "role": "staff", "oauth_provider": "microsoft", "created_at": anchored,
+    } for i, user_id in enumerate(uuids(rng, config.agents))]
+    queues = [{
+        "id": queue_id, "institution_id": institution_id, "name": name, "description": description,
+    } for queue_id, (name, description) in zip(uuids(rng, len(QUEUES)), QUEUES)]
+
+    first = rng.choice(FIRST_NAMES, config.students)
+    last = rng.choice(LAST_NAMES, config.students)
+    students = [{
+        "id": student_id, "institution_id": institution_id,
+        "email": f"student{i}@{domain}", "name": f"{first[i]} {last[i]}",
+        "student_id": str(1000000 + i), "created_at": anchored,
+    } for i, student_id in enumerate(uuids(rng, config.students))]
+
+    kb = []
+    for i, article_id in enumerate(uuids(rng, config.kb_articles)):
+        article = sample_kb_articles[i % len(sample_kb_articles)]
+        edition = i // len(sample_kb_articles)
+        kb.append({
+            **article, "id": article_id, "institution_id": institution_id,
+            "title": article["title"] if edition == 0 else f"{article['title']} ({edition + 1})",
+        })
+
+    await writer.write({"users": users, "queues": queues, "students": students, "knowledge_base": kb})
+
+    inbound_snippets = np.array([make_snippet(b) for b in INBOUND_BODIES])
+    outbound_snippets = np.array([make_snippet(b) for b in OUTBOUND_BODIES])
+    inbound_fragments = [search_fragment(b) for b in INBOUND_BODIES]
+    outbound_fragments = [search_fragment(b) for b in OUTBOUND_BODIES]
+    user_ids = np.array([None] + [u["id"] for u in users], dtype=object)
+    queue_ids = np.array([q["id"] for q in queues], dtype=object)
+    student_ids = [s["id"] for s in students]
+    student_names = [s["name"] for s in students]
+    student_emails = [s["email"] for s in students]
+    history = config.history_days * 86400
+
+    for start in range(0, config.tickets, config.chunk_size):
+        k = min(config.chunk_size, config.tickets - start)
+        ticket_ids = uuids(rng, k)
+        who = rng.integers(0, config.students, k)
+        created_before = rng.integers(3600, history, k)
+        category = rng.choice(CATEGORIES, k, p=CATEGORY_WEIGHTS)
+        status = rng.choice(STATUSES, k, p=STATUS_WEIGHTS)
+        priority = rng.choice(PRIORITIES, k, p=PRIORITY_WEIGHTS)
+        queue = rng.choice(queue_ids, k)
+        assignee = rng.choice(user_ids, k)
+        subject = rng.choice(SUBJECTS, k)
+
+        # Messages: per-ticket counts, alternating inbound/outbound, spaced by a per-ticket gap
+        counts = np.maximum(rng.poisson(config.messages, k), 1)
+        owner = np.repeat(np.arange(k), counts)
+        starts = np.cumsum(counts) - counts
+        position = np.arange(owner.size) - starts[owner]
+        gap = rng.integers(600, 86400, k)
+        sent_before = np.maximum(created_before[owner] - position * gap[owner], 0)
+        inbound = position % 2 == 0
+        body_choice = np.where(
+            inbound,
+            rng.integers(0, len(INBOUND_BODIES), owner.size),
+            rng.integers(0, len(OUTBOUND_BODIES), owner.size),
+        )
+        sent_at = utc_datetimes(config.anchor, sent_before)
+        created_at = utc_datetimes(config.anchor, created_before)
+        message_ids = uuids(rng, owner.size)
+
+        last = starts + counts - 1
+        last_inbound = starts + (counts - 1) - (counts - 1) % 2
+
+        tickets = []
+        for t in range(k):
+            s = who[t]
+            m = last[t]
+            tickets.append({
+                "id": ticket_ids[t], "institution_id": institution_id, "student_id": student_ids[s],
+                "subject": str(subject[t]), "status": str(status[t]), "priority": str(priority[t]),
+                "category": str(category[t]), "queue_id": queue[t], "assignee_id": assignee[t],
+                "channel": "email", "created_at": created_at[t], "updated_at": sent_at[m],
+                "message_count": int(counts[t]),
+                "last_message_at": sent_at[m],
+                "last_message_snippet": str(
+                    inbound_snippets[body_choice[m]] if inbound[m] else outbound_snippets[body_choice[m]]
+                ),
+                "last_message_direction": "inbound" if inbound[m] else "outbound",
+                "last_inbound_at": sent_at[last_inbound[t]],
+                "student_name": student_names[s], "student_email": student_emails[s],
+                "search_messages": [
+                    inbound_fragments[body_choice[i]] if inbound[i] else outbound_fragments[body_choice[i]]
+                    for i in range(max(starts[t], m + 1 - SEARCH_MESSAGES), m + 1)
+                ],
+            })
+
+        messages, events = [], []
+        event_ids = uuids(rng, owner.size)
+        staff = f"finaid@{domain}"
+        for i in range(owner.size):
+            t = owner[i]
+            email = student_emails[who[t]]
+            is_inbound = bool(inbound[i])
+            messages.append({
+                "id": message_ids[i], "institution_id": institution_id, "ticket_id": ticket_ids[t],
+                "sender_email": email if is_inbound else staff,
+                "recipient_email": staff if is_inbound else email,
+                "subject": str(subject[t]) if position[i] == 0 else f"Re: {subject[t]}",
+                "body": str(INBOUND_BODIES[body_choice[i]] if is_inbound else OUTBOUND_BODIES[body_choice[i]]),
+                "direction": "inbound" if is_inbound else "outbound", "thread_id": None,
+                "created_at": sent_at[i],
+            })
+            events.append({
+                "id": event_ids[i], "institution_id": institution_id,
+                "student_id": student_ids[who[t]], "ticket_id": ticket_ids[t],
+                "event_type": "received_email" if is_inbound else "sent_email",
+                "content": str(subject[t]), "created_by": None, "created_at": sent_at[i],
+            })
+
+        note_counts = rng.poisson(config.notes, k)
+        note_owner = np.repeat(np.arange(k), note_counts)
+        if note_owner.size:
+            note_before = created_before[note_owner] - rng.integers(0, 86400, note_owner.size)
+            note_at = utc_datetimes(config.anchor, np.maximum(note_before, 0))
+            note_text = rng.choice(NOTES, note_owner.size)
+            note_author = rng.choice(user_ids[1:], note_owner.size)
+            for i, event_id in enumerate(uuids(rng, note_owner.size)):
+                t = note_owner[i]
+                events.append({
+                    "id": event_id, "institution_id": institution_id,
+                    "student_id": student_ids[who[t]], "ticket_id": ticket_ids[t],
+                    "event_type": "note", "content": str(note_text[i]),
+                    "created_by": note_author[i], "created_at": note_at[i],
+                })
+
+        await writer.write({"tickets": tickets, "messages": messages, "student_events": events})
+        print(f"   {slug}: {start + k}/{config.tickets} tickets")
+
+
+async def seed(db, config: SeedConfig, build_indexes: bool = True) -> dict:
+    """Generate every configured institution; returns per-collection counts and throughput"""
+    writer = BatchWriter(db, config.batch_size, config.parallel)
+    started = time.perf_counter()
+    for n in range(config.institutions):
+        await seed_institution(db, n, config, writer)
+    load_seconds = time.perf_counter() - started
+
+    if build_indexes:
+        await ensure_indexes(db)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "counts": dict(writer.counts),
+        "documents": writer.total,
+        "load_seconds": round(load_seconds, 2),
+        "total_seconds": round(elapsed, 2),
+        "docs_per_second": round(writer.total / load_seconds) if load_seconds else 0,
+    }
+
+
+def parse_args():
+    defaults = SeedConfig()
+    parser = argparse.ArgumentParser(description="Generate a large, reproducible AidHub Pro dataset")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    parser.add_argument("--db-name", default=DB_NAME)
+    parser.add_argument("--institutions", type=int, default=defaults.institutions)
+    parser.add_argument("--students", type=int, default=defaults.students, help="students per institution")
+    parser.add_argument("--tickets", type=int, default=defaults.tickets, help="tickets per institution")
+    parser.add_argument("--messages", type=float, default=defaults.messages, help="mean messages per ticket")
+    parser.add_argument("--notes", type=float, default=defaults.notes, help="mean note events per ticket")
+    parser.add_argument("--kb-articles", type=int, default=defaults.kb_articles, help="KB articles per institution")
+    parser.add_argument("--agents", type=int, default=defaults.agents, help="staff users per institution")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--anchor", default=defaults.anchor.isoformat(),
+                        help="ISO timestamp data is generated back from, or 'now' (not reproducible)")
+    parser.add_argument("--history-days", type=int, default=defaults.history_days)
+    parser.add_argument("--slug-prefix", default=defaults.slug_prefix)
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    parser.add_argument("--parallel", type=int, default=defaults.parallel, help="insert batches in flight")
+    parser.add_argument("--chunk-size", type=int, default=defaults.chunk_size, help="tickets generated per round")
+    parser.add_argument("--skip-indexes", action="store_true")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    anchor = datetime.now(timezone.utc) if args.anchor == "now" else datetime.fromisoformat(args.anchor)
+    config = SeedConfig(
+        institutions=args.institutions, students=args.students, tickets=args.tickets,
+        messages=args.messages, notes=args.notes, kb_articles=args.kb_articles, agents=args.agents,
+        seed=args.seed, anchor=anchor.astimezone(timezone.utc), history_days=args.history_days,
+        slug_prefix=args.slug_prefix, batch_size=args.batch_size, parallel=args.parallel,
+        chunk_size=args.chunk_size,
+    )
+
+    client = AsyncIOMotorClient(args.mongo_url, **MONGO_UUID_OPTIONS)
+    db = wrap_database(client[args.db_name])
+    print(f"🌱 Seeding {config.institutions} institutions x {config.tickets} tickets into {args.db_name}...")
+    report = await seed(db, config, build_indexes=not args.skip_indexes)
+    client.close()
+
+    for collection, count in sorted(report["counts"].items()):
+        print(f"   {collection:<16} {count:>10}")
+    print(
+        f"📦 Inserted {report['documents']} documents in {report['load_seconds']}s "
+        f"({report['docs_per_second']} docs/s); {report['total_seconds']}s including indexes"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,6 +5,8 @@ import os
 import uuid
 from datetime import datetime, timezone, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
+from ticket_summary import recompute_ticket_summaries
+from id_codec import MONGO_UUID_OPTIONS, wrap_database
 from kb_data import sample_kb_articles
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
@@ -13,8 +15,8 @@ DB_NAME = os.getenv("DB_NAME", "test_database")
 
 async def seed_database():
     """Seed the database with sample institution, users, students, tickets, and KB"""
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DB_NAME]
+    client = AsyncIOMotorClient(MONGO_URL, **MONGO_UUID_OPTIONS)
+    db = wrap_database(client[DB_NAME])
     
     print("🌱 Seeding AidHub Pro database...")
     
@@ -25,7 +27,7 @@ async def seed_database():
         "name": "University of Demo",
         "slug": "demo-u",
         "domain": "demou.edu",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     await db.institutions.delete_many({"slug": "demo-u"})
     await db.institutions.insert_one(institution)
@@ -53,7 +55,7 @@ async def seed_database():
             "role": "staff",
             "oauth_provider": "microsoft",
             "oauth_token": "mock_token_1",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -63,7 +65,7 @@ async def seed_database():
             "role": "staff",
             "oauth_provider": "google",
             "oauth_token": "mock_token_2",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -73,7 +75,7 @@ async def seed_database():
             "role": "admin",
             "oauth_provider": "microsoft",
             "oauth_token": "mock_token_3",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     await db.users.delete_many({"institution_id": institution_id})
@@ -91,7 +93,7 @@ async def seed_database():
             "phone": "(555) 123-4567",
             "notes": "First-year student, priority for state grants",
             "sis_url": "https://sis.demou.edu/students/1234567",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -102,7 +104,7 @@ async def seed_database():
             "phone": "(555) 234-5678",
             "notes": "Selected for verification, submitted documents 2 days ago",
             "sis_url": "https://sis.demou.edu/students/2345678",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -113,7 +115,7 @@ async def seed_database():
             "phone": None,
             "notes": "SAP appeal pending, meeting scheduled for next week",
             "sis_url": "https://sis.demou.edu/students/3456789",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -124,7 +126,7 @@ async def seed_database():
             "phone": "(555) 456-7890",
             "notes": "Transfer student, questions about credit evaluation",
             "sis_url": "https://sis.demou.edu/students/4567890",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     await db.students.delete_many({"institution_id": institution_id})
@@ -146,8 +148,8 @@ async def seed_database():
                 "queue_id": queues[1]["id"],
                 "assignee_id": users[0]["id"],
                 "channel": "email",
-                "created_at": (now - timedelta(hours=2)).isoformat(),
-                "updated_at": (now - timedelta(hours=2)).isoformat()
+                "created_at": now - timedelta(hours=2),
+                "updated_at": now - timedelta(hours=2)
             },
             "messages": [
                 {
@@ -160,7 +162,7 @@ async def seed_database():
                     "body": "Hi, I'm trying to figure out when I need to submit my FAFSA for next year. What's the priority deadline? I want to make sure I get the most aid possible. Thanks!",
                     "direction": "inbound",
                     "thread_id": None,
-                    "created_at": (now - timedelta(hours=2)).isoformat()
+                    "created_at": now - timedelta(hours=2)
                 }
             ]
         },
@@ -176,8 +178,8 @@ async def seed_database():
                 "queue_id": queues[2]["id"],
                 "assignee_id": users[0]["id"],
                 "channel": "email",
-                "created_at": (now - timedelta(days=1)).isoformat(),
-                "updated_at": (now - timedelta(hours=3)).isoformat()
+                "created_at": now - timedelta(days=1),
+                "updated_at": now - timedelta(hours=3)
             },
             "messages": [
                 {
@@ -190,7 +192,7 @@ async def seed_database():
                     "body": "I got selected for verification and I'm confused about what documents I need. Can you help? I need this resolved ASAP because my aid hasn't disbursed yet.",
                     "direction": "inbound",
                     "thread_id": None,
-                    "created_at": (now - timedelta(days=1)).isoformat()
+                    "created_at": now - timedelta(days=1)
                 },
                 {
                     "id": str(uuid.uuid4()),
@@ -202,7 +204,7 @@ async def seed_database():
                     "body": "Hi Sam,\\n\\nThank you for reaching out. For verification, you'll need to submit:\\n\\n1. IRS Tax Transcript for 2023\\n2. Signed verification worksheet (download from student portal)\\n3. W-2 forms if applicable\\n\\nPlease submit within 30 days to avoid delays. You can upload to the student portal or email to verify@demou.edu.\\n\\nLet me know if you have questions!\\n\\nBest,\\nSarah Chen",
                     "direction": "outbound",
                     "thread_id": None,
-                    "created_at": (now - timedelta(hours=20)).isoformat()
+                    "created_at": now - timedelta(hours=20)
                 }
             ]
         },
@@ -218,8 +220,8 @@ async def seed_database():
                 "queue_id": queues[3]["id"],
                 "assignee_id": users[1]["id"],
                 "channel": "email",
-                "created_at": (now - timedelta(days=3)).isoformat(),
-                "updated_at": (now - timedelta(days=3)).isoformat()
+                "created_at": now - timedelta(days=3),
+                "updated_at": now - timedelta(days=3)
             },
             "messages": [
                 {
@@ -232,7 +234,7 @@ async def seed_database():
                     "body": "Hi, I failed to meet SAP standards last semester due to a family emergency. I'd like to submit an appeal. Can you tell me what documents I need and the deadline?",
                     "direction": "inbound",
                     "thread_id": None,
-                    "created_at": (now - timedelta(days=3)).isoformat()
+                    "created_at": now - timedelta(days=3)
                 }
             ]
         },
@@ -248,8 +250,8 @@ async def seed_database():
                 "queue_id": queues[4]["id"],
                 "assignee_id": users[1]["id"],
                 "channel": "email",
-                "created_at": (now - timedelta(days=7)).isoformat(),
-                "updated_at": (now - timedelta(days=6)).isoformat()
+                "created_at": now - timedelta(days=7),
+                "updated_at": now - timedelta(days=6)
             },
             "messages": [
                 {
@@ -262,7 +264,7 @@ async def seed_database():
                     "body": "Can you explain how the payment plan works? I'd like to set up monthly payments instead of paying everything upfront.",
                     "direction": "inbound",
                     "thread_id": None,
-                    "created_at": (now - timedelta(days=7)).isoformat()
+                    "created_at": now - timedelta(days=7)
                 }
             ]
         }
@@ -304,7 +306,7 @@ async def seed_database():
             "event_type": "ai_routed",
             "content": "Ticket automatically categorized as 'verification'",
             "created_by": None,
-            "created_at": (now - timedelta(days=1)).isoformat()
+            "created_at": now - timedelta(days=1)
         },
         {
             "id": str(uuid.uuid4()),
@@ -314,7 +316,7 @@ async def seed_database():
             "event_type": "sent_email",
             "content": "Sent verification requirements email",
             "created_by": users[0]["id"],
-            "created_at": (now - timedelta(hours=20)).isoformat()
+            "created_at": now - timedelta(hours=20)
         },
         {
             "id": str(uuid.uuid4()),
@@ -324,13 +326,16 @@ async def seed_database():
             "event_type": "phone_call",
             "content": "Student called regarding SAP appeal requirements. Advised on documentation needed.",
             "created_by": users[1]["id"],
-            "created_at": (now - timedelta(days=2)).isoformat()
+            "created_at": now - timedelta(days=2)
         }
     ]
     await db.student_events.delete_many({"institution_id": institution_id})
     await db.student_events.insert_many(events)
     print(f"✅ Created {len(events)} student events")
     
+    # Fill in denormalized inbox fields (message count, snippet, student name)
+    await recompute_ticket_summaries(db, institution_id)
+    
     print("\\n" + "="*60)
     print("🎉 Database seeded successfully!")
     print("="*60)
@@ -6,6 +6,8 @@ import uuid
 from datetime import datetime, timezone, timedelta
 import random
 from motor.motor_asyncio import AsyncIOMotorClient
+from ticket_summary import recompute_ticket_summaries
+from id_codec import MONGO_UUID_OPTIONS, wrap_database
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "test_database")
@@ -13,8 +15,8 @@ DB_NAME = os.getenv("DB_NAME", "test_database")
 
 async def seed_additional_tickets():
     """Add 100+ tickets to the database"""
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DB_NAME]
+    client = AsyncIOMotorClient(MONGO_URL, **MONGO_UUID_OPTIONS)
+    db = wrap_database(client[DB_NAME])
     
     print("🌱 Seeding 100+ additional tickets...")
     
@@ -93,8 +95,8 @@ async def seed_additional_tickets():
             "queue_id": queue["id"],
             "assignee_id": assignee,
             "channel": random.choice(channels),
-            "created_at": created_at.isoformat(),
-            "updated_at": updated_at.isoformat()
+            "created_at": created_at,
+            "updated_at": updated_at
         }
         tickets_to_insert.append(ticket)
         
@@ -109,7 +111,7 @@ async def seed_additional_tickets():
             "body": f"Hi, I have a question about {ticket['category'].replace('_', ' ')}. Can you help me with this?",
             "direction": "inbound",
             "thread_id": None,
-            "created_at": created_at.isoformat()
+            "created_at": created_at
         }
         messages_to_insert.append(message)
     
@@ -120,6 +122,9 @@ async def seed_additional_tickets():
     print(f"✅ Created {len(tickets_to_insert)} additional tickets")
     print(f"✅ Created {len(messages_to_insert)} additional messages")
     
+    # Fill in denormalized inbox fields (message count, snippet, student name)
+    await recompute_ticket_summaries(db, institution_id)
+    
     # Get total count
     total_tickets = await db.tickets.count_documents({"institution_id": institution_id})
     print(f"\n📊 Total tickets in database: {total_tickets}")
@@ -1,8 +1,13 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, BackgroundTasks, WebSocket, WebSocketDisconnect, Query, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import asyncio
+import base64
+import json
 import logging
 from pathlib import Path
 from typing import List, Optional
@@ -14,10 +19,31 @@ from models import (
     SearchKBRequest, SearchKBResponse,
     DraftReplyRequest, DraftReplyResponse,
     UpdateTicketMetadataRequest,
-    AddStudentEventRequest,
-    StudentEvent, AiSuggestion, Ticket, Student, Queue, User
+    AddStudentEventRequest, BulkTicketRequest, CreateJobRequest,
+    ChatbotMessageRequest, ChatbotMessageResponse,
+    StudentEvent, Ticket, Student, Queue, User
 )
 from ai_tools import search_kb_articles, draft_reply_with_ai, triage_ticket_with_ai
+from llm import load_encoding
+from indexes import ensure_indexes
+from realtime import create_broker, institution_channel, make_event
+from ticket_summary import apply_message_to_ticket, sync_student_fields
+from thread_summarizer import refresh_thread_summary, summaries_in_progress
+from draft_prefetch import DraftPrefetcher, get_cached_draft, invalidate_draft
+from chatbot import answer_stream, chatbot_settings, rate_limiter
+from institution_registry import institution_registry
+from profiling import ProfiledRoute, MongoCommandTimer, profiling_middleware, span, timing_stats
+from metrics import callback_counter, gauge, render as render_metrics
+from fast_json import FastJSONResponse, dumps as json_dumps, trusted_json
+from timestamps import MONGO_CODEC_OPTIONS, parse_timestamp, to_iso, utcnow
+from id_codec import MONGO_UUID_OPTIONS, wrap_database
+from repository import new_document
+from retention import RETENTION_POLICIES, Archiver, query as query_retained
+from suggestion_store import hydrate as hydrate_suggestions, save_suggestion
+from ticket_search import search_tickets
+from jobs import JOB_PROJECTION, JOB_TYPES, Worker, enqueue as enqueue_job, job_counts
+from idempotency import create_idempotency_middleware
+from cache import get_queues, get_users, get_user_by_email, find_queue_for_category, watch_for_invalidations, tenant_cache
 
 
 ROOT_DIR = Path(__file__).parent
@@ -25,18 +51,28 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client = AsyncIOMotorClient(
+    mongo_url, event_listeners=[MongoCommandTimer()], **MONGO_CODEC_OPTIONS, **MONGO_UUID_OPTIONS
+)
+# Ids are encoded/decoded here when UUID_STORAGE stores them as binary
+db = wrap_database(client[os.environ['DB_NAME']])
 
 # Create the main app without a prefix
 app = FastAPI(title="AidHub Pro - AI Financial Aid Platform")
+app.router.route_class = ProfiledRoute
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=ProfiledRoute)
 
 # Simple in-memory session storage for demo (replace with Redis in production)
 sessions = {}
 
+# Pub/sub for realtime ticket updates (see realtime.py)
+broker = create_broker(db)
+
+# Background draft generation for urgent/high tickets (see draft_prefetch.py)
+draft_prefetcher = DraftPrefetcher(db)
+
 
 # ============================================================
 # AUTH & SESSION HELPERS
@@ -47,12 +83,42 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    token = authorization.replace("Bearer ", "")
-    session = sessions.get(token)
-    if not session:
-        raise HTTPException(status_code=401, detail="Invalid session")
-    
-    return session["user"]
+    with span("auth"):
+        token = authorization.replace("Bearer ", "")
+        session = sessions.get(token)
+        if not session:
+            raise HTTPException(status_code=401, detail="Invalid session")
+        
+        return session["user"]
+
+
+async def publish_ticket_event(
+    institution_id: str,
+    event_type: str,
+    ticket_id: str,
+    queue_id: Optional[str],
+    data: dict,
+    previous_queue_id: Optional[str] = None
+):
+    """Push a ticket delta to agents subscribed to the institution"""
+    event = make_event(event_type, ticket_id, queue_id, data, previous_queue_id)
+    try:
+        await broker.publish(institution_channel(institution_id), event)
+    except Exception as e:
+        # Realtime is best-effort; clients resync on reconnect
+        logging.error(f"Realtime publish failed: {e}")
+
+
+# Maximum tickets changed by one POST /api/tickets/bulk
+BULK_TICKET_LIMIT = int(os.environ.get("BULK_TICKET_LIMIT", "500"))
+
+# Ticket fields needed to route realtime events and schedule draft prefetching
+TICKET_ROUTING_FIELDS = {
+    "_id": 0, "id": 1, "institution_id": 1, "queue_id": 1,
+    "priority": 1, "status": 1, "created_at": 1
+}
+# Ticket fields returned to the workspace (the rolling summary and search fragments are server-side only)
+TICKET_PROJECTION = {"_id": 0, "thread_summary": 0, "search_messages": 0}
 
 
 # ============================================================
@@ -66,7 +132,7 @@ async def mock_oauth_login(provider: str, email: str):
     In production, this would handle real OAuth flows.
     """
     # Find user by email
-    user_doc = await db.users.find_one({"email": email}, {"_id": 0})
+    user_doc = await get_user_by_email(db, email)
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -99,7 +165,7 @@ async def logout(authorization: Optional[str] = Header(None)):
 # TICKET ENDPOINTS
 # ============================================================
 
-@api_router.get("/tickets")
+@api_router.get("/tickets", response_class=FastJSONResponse)
 async def list_tickets(
     status: Optional[str] = None,
     assignee_id: Optional[str] = None,
@@ -126,25 +192,51 @@ async def list_tickets(
     if category:
         query["category"] = category
     
-    tickets = await db.tickets.find(query, {"_id": 0}).sort("updated_at", -1).to_list(100)
+    tickets = await db.tickets.find(
+        query, TICKET_PROJECTION
+    ).sort("updated_at", -1).to_list(100)
+    
+    # Student name/email are denormalized onto the ticket; only tickets that
+    # predate the summary fields need a (single, batched) student lookup
+    missing = {t["student_id"] for t in tickets if "student_name" not in t}
+    students = {}
+    if missing:
+        async for student in db.students.find({"id": {"$in": list(missing)}}, {"_id": 0}):
+            students[student["id"]] = student
     
-    # Enrich with student info
     for ticket in tickets:
-        student = await db.students.find_one({"id": ticket["student_id"]}, {"_id": 0})
-        if student:
-            ticket["student"] = student
+        if "student_name" in ticket:
+            ticket["student"] = {
+                "id": ticket["student_id"],
+                "name": ticket["student_name"],
+                "email": ticket["student_email"],
+            }
+        elif ticket["student_id"] in students:
+            ticket["student"] = students[ticket["student_id"]]
     
-    return {"tickets": tickets}
+    return trusted_json({"tickets": tickets})
 
 
-@api_router.get("/tickets/{ticket_id}")
+@api_router.get("/tickets/search", response_class=FastJSONResponse)
+async def search_tickets_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = 20,
+    offset: int = 0,
+    current_user: dict = Depends(get_current_user)
+):
+    """Ranked full-text search over subjects, messages and student name/email (tenant-scoped)"""
+    result = await search_tickets(db, current_user["institution_id"], q, limit, offset)
+    return trusted_json(result)
+
+
+@api_router.get("/tickets/{ticket_id}", response_class=FastJSONResponse)
 async def get_ticket(ticket_id: str, current_user: dict = Depends(get_current_user)):
     """Get single ticket with messages and student info"""
     institution_id = current_user["institution_id"]
     
     ticket = await db.tickets.find_one(
         {"id": ticket_id, "institution_id": institution_id},
-        {"_id": 0}
+        TICKET_PROJECTION
     )
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
@@ -160,17 +252,18 @@ async def get_ticket(ticket_id: str, current_user: dict = Depends(get_current_us
     
     # Log access for audit
     await db.audit_logs.insert_one({
+        "institution_id": institution_id,
         "user_id": current_user["id"],
         "action": "view_ticket",
         "ticket_id": ticket_id,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": utcnow()
     })
     
-    return {
+    return trusted_json({
         "ticket": ticket,
         "messages": messages,
         "student": student
-    }
+    })
 
 
 @api_router.patch("/tickets/{ticket_id}")
@@ -183,19 +276,145 @@ async def update_ticket(
     institution_id = current_user["institution_id"]
     
     # Add updated_at timestamp
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_data["updated_at"] = utcnow()
     
-    result = await db.tickets.update_one(
+    previous = await db.tickets.find_one_and_update(
         {"id": ticket_id, "institution_id": institution_id},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection=TICKET_ROUTING_FIELDS,
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Ticket not found")
     
+    draft_prefetcher.enqueue({**previous, **update_data})
+    
+    await publish_ticket_event(
+        institution_id, "ticket.updated", ticket_id,
+        update_data.get("queue_id", previous.get("queue_id")), update_data,
+        previous_queue_id=previous.get("queue_id")
+    )
+    
     return {"success": True}
 
 
+def _describe_bulk_update(update_data: dict, queues: list, users: list) -> str:
+    """Timeline text for a bulk update, with queue/assignee names instead of ids"""
+    queue_names = {q["id"]: q.get("name") for q in queues}
+    user_names = {u["id"]: u.get("name") or u.get("email") for u in users}
+    parts = []
+    for field, value in update_data.items():
+        if field == "queue_id":
+            parts.append(f"queue → {queue_names.get(value, value)}")
+        elif field == "assignee_id":
+            parts.append(f"assignee → {user_names.get(value, value) if value else 'unassigned'}")
+        else:
+            parts.append(f"{field} → {value}")
+    return "Bulk update: " + ", ".join(parts)
+
+
+@api_router.post("/tickets/bulk")
+async def bulk_update_tickets(
+    request: BulkTicketRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Apply one update (status, queue, assignee, priority) to tickets selected by id
+    list or filter: a single update_many, timeline events in one insert_many, and a
+    result per ticket (updated / unchanged / not_found).
+    """
+    institution_id = current_user["institution_id"]
+    
+    update_data = request.update.model_dump(exclude_unset=True)
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    if (request.ticket_ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either ticket_ids or filter")
+    if request.filter is not None and not request.filter.model_dump(exclude_none=True):
+        # An empty filter would select every ticket in the institution
+        raise HTTPException(status_code=400, detail="Filter must set at least one field")
+    
+    queues, users = await asyncio.gather(get_queues(db, institution_id), get_users(db, institution_id))
+    if update_data.get("queue_id") is not None and update_data["queue_id"] not in {q["id"] for q in queues}:
+        raise HTTPException(status_code=400, detail="Unknown queue")
+    if update_data.get("assignee_id") is not None and update_data["assignee_id"] not in {u["id"] for u in users}:
+        raise HTTPException(status_code=400, detail="Unknown assignee")
+    
+    query = {"institution_id": institution_id}
+    requested = None
+    if request.ticket_ids is not None:
+        requested = list(dict.fromkeys(request.ticket_ids))
+        if len(requested) > BULK_TICKET_LIMIT:
+            raise HTTPException(status_code=400, detail=f"At most {BULK_TICKET_LIMIT} tickets per request")
+        query["id"] = {"$in": requested}
+    else:
+        filters = request.filter.model_dump(exclude_none=True)
+        updated_before = filters.pop("updated_before", None)
+        if filters.get("assignee_id") == "unassigned":
+            filters["assignee_id"] = None
+        query.update(filters)
+        if updated_before:
+            query["updated_at"] = {"$lt": updated_before}
+    
+    tickets = await db.tickets.find(
+        query, {**TICKET_ROUTING_FIELDS, "student_id": 1, "assignee_id": 1}
+    ).to_list(BULK_TICKET_LIMIT + 1)
+    if len(tickets) > BULK_TICKET_LIMIT:
+        raise HTTPException(
+            status_code=400, detail=f"Filter matches more than {BULK_TICKET_LIMIT} tickets; narrow it"
+        )
+    
+    # Tickets that already have every requested value are left alone (no write, no event)
+    changed = [t for t in tickets if any(t.get(k) != v for k, v in update_data.items())]
+    
+    if changed:
+        update_data["updated_at"] = utcnow()
+        await db.tickets.update_many(
+            {"institution_id": institution_id, "id": {"$in": [t["id"] for t in changed]}},
+            {"$set": update_data}
+        )
+        
+        content = _describe_bulk_update(
+            {k: v for k, v in update_data.items() if k != "updated_at"}, queues, users
+        )
+        await db.student_events.insert_many([
+            new_document(
+                StudentEvent,
+                institution_id=institution_id,
+                student_id=ticket["student_id"],
+                ticket_id=ticket["id"],
+                event_type="ticket_updated",
+                content=content,
+                created_by=current_user["id"]
+            )
+            for ticket in changed
+        ], ordered=False)
+        
+        for ticket in changed:
+            draft_prefetcher.enqueue({**ticket, **update_data})
+        await asyncio.gather(*(
+            publish_ticket_event(
+                institution_id, "ticket.updated", ticket["id"],
+                update_data.get("queue_id", ticket.get("queue_id")), update_data,
+                previous_queue_id=ticket.get("queue_id")
+            )
+            for ticket in changed
+        ))
+    
+    changed_ids = {t["id"] for t in changed}
+    ordered_ids = requested if requested is not None else [t["id"] for t in tickets]
+    matched = {t["id"] for t in tickets}
+    results = [
+        {"id": ticket_id, "status": (
+            "updated" if ticket_id in changed_ids else "unchanged" if ticket_id in matched else "not_found"
+        )}
+        for ticket_id in ordered_ids
+    ]
+    
+    return {"success": True, "updated": len(changed_ids), "results": results}
+
+
 # ============================================================
 # MESSAGE ENDPOINTS
 # ============================================================
@@ -205,6 +424,7 @@ async def create_message(
     ticket_id: str,
     body: str,
     direction: str = "outbound",
+    background: BackgroundTasks = None,
     current_user: dict = Depends(get_current_user)
 ):
     """Create a new message (send reply)"""
@@ -221,6 +441,7 @@ async def create_message(
     student = await db.students.find_one({"id": ticket["student_id"]}, {"_id": 0})
     
     # Create message
+    now = utcnow()
     message = {
         "id": str(uuid.uuid4()),
         "institution_id": institution_id,
@@ -231,7 +452,7 @@ async def create_message(
         "body": body,
         "direction": direction,
         "thread_id": None,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": now
     }
     
     await db.messages.insert_one(message)
@@ -245,14 +466,28 @@ async def create_message(
         "event_type": "sent_email" if direction == "outbound" else "received_email",
         "content": f"Sent email reply: {ticket['subject']}",
         "created_by": current_user["id"],
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": now
     }
     await db.student_events.insert_one(event)
     
-    # Update ticket updated_at
-    await db.tickets.update_one(
-        {"id": ticket_id},
-        {"$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+    # Update ticket updated_at and inbox summary fields
+    summary_fields = {"updated_at": now}
+    await apply_message_to_ticket(db, message, extra_set=summary_fields)
+    
+    # Fold older turns into the rolling thread summary once the response is sent
+    background.add_task(refresh_thread_summary, db, ticket_id)
+    
+    # Any pre-generated draft was for the previous state of the thread
+    await invalidate_draft(db, ticket_id)
+    if direction == "inbound":
+        draft_prefetcher.enqueue({**ticket, "last_message_direction": direction})
+    
+    await publish_ticket_event(
+        institution_id, "message.created", ticket_id, ticket.get("queue_id"),
+        {
+            "message": {k: v for k, v in message.items() if k != "_id"},
+            "updated_at": summary_fields["updated_at"]
+        }
     )
     
     return {"success": True, "message": message}
@@ -262,7 +497,7 @@ async def create_message(
 # STUDENT ENDPOINTS
 # ============================================================
 
-@api_router.get("/students")
+@api_router.get("/students", response_class=FastJSONResponse)
 async def list_students(current_user: dict = Depends(get_current_user)):
     """List students (tenant-scoped)"""
     institution_id = current_user["institution_id"]
@@ -270,10 +505,10 @@ async def list_students(current_user: dict = Depends(get_current_user)):
         {"institution_id": institution_id},
         {"_id": 0}
     ).to_list(100)
-    return {"students": students}
+    return trusted_json({"students": students})
 
 
-@api_router.get("/students/{student_id}")
+@api_router.get("/students/{student_id}", response_class=FastJSONResponse)
 async def get_student(student_id: str, current_user: dict = Depends(get_current_user)):
     """Get student with timeline of events"""
     institution_id = current_user["institution_id"]
@@ -291,10 +526,89 @@ async def get_student(student_id: str, current_user: dict = Depends(get_current_
         {"_id": 0}
     ).sort("created_at", -1).to_list(100)
     
-    return {
+    return trusted_json({
         "student": student,
         "timeline": events
-    }
+    })
+
+
+def _encode_timeline_cursor(item: dict) -> str:
+    raw = json.dumps([to_iso(item["created_at"]), item["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_timeline_cursor(cursor: str) -> tuple:
+    try:
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    created_at = parse_timestamp(created_at)
+    if created_at is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, item_id
+
+
+@api_router.get("/students/{student_id}/timeline", response_class=FastJSONResponse)
+async def get_student_timeline(
+    student_id: str,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Merged, newest-first timeline of student events, email messages and AI suggestions.
+    Built in one aggregation over the student's ticket ids; each source is bounded by the page size before merging.
+    """
+    institution_id = current_user["institution_id"]
+    limit = max(1, min(limit, 200))
+
+    page_filter = {}
+    if cursor:
+        created_at, item_id = _decode_timeline_cursor(cursor)
+        page_filter = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": item_id}},
+        ]}
+    newest_first = [{"$sort": {"created_at": -1, "id": -1}}, {"$limit": limit + 1}]
+
+    # Messages and suggestions hang off the student's tickets. Their ids are matched
+    # explicitly rather than joined with $lookup, so both id forms match while
+    # migrate_ids.py runs (UUID_STORAGE=mixed)
+    ticket_ids = await db.tickets.distinct("id", {"institution_id": institution_id, "student_id": student_id})
+
+    def ticket_items(projection: dict) -> list:
+        return [{"$match": {"ticket_id": {"$in": ticket_ids}, **page_filter}}, *newest_first, {"$project": projection}]
+
+    pipeline = [
+        {"$match": {"institution_id": institution_id, "student_id": student_id, **page_filter}},
+        *newest_first,
+        {"$project": {
+            "_id": 0, "id": 1, "ticket_id": 1, "event_type": 1, "content": 1,
+            "created_by": 1, "created_at": 1, "kind": {"$literal": "event"},
+        }},
+        {"$unionWith": {"coll": "messages", "pipeline": ticket_items({
+            "_id": 0, "id": 1, "ticket_id": 1, "created_at": 1, "direction": 1, "subject": 1,
+            "content": {"$substrCP": ["$body", 0, 280]},
+            "event_type": {"$cond": [{"$eq": ["$direction", "inbound"]}, "received_email", "sent_email"]},
+            "kind": {"$literal": "message"},
+        })}},
+        {"$unionWith": {"coll": "ai_suggestions", "pipeline": ticket_items({
+            "_id": 0, "id": 1, "ticket_id": 1, "created_at": 1, "suggestion_type": 1, "accepted": 1,
+            "content": {"$ifNull": ["$summary", "$output.summary"]},
+            "event_type": {"$literal": "ai_suggestion"},
+            "kind": {"$literal": "ai_suggestion"},
+        })}},
+        *newest_first,
+    ]
+
+    items = await db.student_events.aggregate(pipeline).to_list(limit + 1)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_timeline_cursor(items[-1])
+
+    return trusted_json({"items": items, "next_cursor": next_cursor})
 
 
 @api_router.patch("/students/{student_id}")
@@ -314,6 +628,8 @@ async def update_student(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Student not found")
     
+    await sync_student_fields(db, institution_id, student_id, update_data)
+    
     return {"success": True}
 
 
@@ -321,26 +637,20 @@ async def update_student(
 # QUEUE & USER ENDPOINTS
 # ============================================================
 
-@api_router.get("/queues")
+@api_router.get("/queues", response_class=FastJSONResponse)
 async def list_queues(current_user: dict = Depends(get_current_user)):
     """List queues (tenant-scoped)"""
     institution_id = current_user["institution_id"]
-    queues = await db.queues.find(
-        {"institution_id": institution_id},
-        {"_id": 0}
-    ).to_list(100)
-    return {"queues": queues}
+    queues = await get_queues(db, institution_id)
+    return trusted_json({"queues": queues})
 
 
-@api_router.get("/users")
+@api_router.get("/users", response_class=FastJSONResponse)
 async def list_users(current_user: dict = Depends(get_current_user)):
     """List users (tenant-scoped, for assignment)"""
     institution_id = current_user["institution_id"]
-    users = await db.users.find(
-        {"institution_id": institution_id},
-        {"_id": 0}
-    ).to_list(100)
-    return {"users": users}
+    users = await get_users(db, institution_id)
+    return trusted_json({"users": users})
 
 
 # ============================================================
@@ -362,22 +672,22 @@ async def api_search_kb_articles(request: SearchKBRequest):
 async def api_draft_reply(request: DraftReplyRequest):
     """Generate AI draft reply for a ticket with PII masking and disclaimers"""
     try:
-        result = await draft_reply_with_ai(db, request)
+        # Hot tickets usually have a draft pre-generated for this exact message
+        result = await get_cached_draft(db, request) if request.use_prefetched else None
+        if result is None:
+            result = await draft_reply_with_ai(db, request)
         
-        # Save AiSuggestion to database
-        suggestion = AiSuggestion(
+        # Input and output are stored once in ai_blobs; identical regenerations only bump a counter
+        await save_suggestion(
+            db,
             institution_id=request.institution_id,
             ticket_id=request.ticket_id,
             suggestion_type="draft_reply",
-            input_context=request.model_dump(),
-            output=result.model_dump(),
-            accepted=False
+            input_context=request.model_dump(exclude={"use_prefetched"}),
+            output=result.model_dump(exclude={"usage"}),
+            usage=result.usage
         )
         
-        doc = suggestion.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        await db.ai_suggestions.insert_one(doc)
-        
         return result
     except Exception as e:
         logging.error(f"Draft reply failed: {e}")
@@ -393,21 +703,36 @@ async def api_update_ticket_metadata(request: UpdateTicketMetadataRequest):
             update_fields["category"] = request.category
         if request.queue_id:
             update_fields["queue_id"] = request.queue_id
+        elif request.category:
+            # Route to the queue matching the triaged category
+            queue = await find_queue_for_category(db, request.institution_id, request.category)
+            if queue:
+                update_fields["queue_id"] = queue["id"]
         if request.priority:
             update_fields["priority"] = request.priority
         if request.assignee_id:
             update_fields["assignee_id"] = request.assignee_id
         
-        update_fields["updated_at"] = datetime.now(timezone.utc).isoformat()
+        update_fields["updated_at"] = utcnow()
         
-        result = await db.tickets.update_one(
+        previous = await db.tickets.find_one_and_update(
             {"id": request.ticket_id, "institution_id": request.institution_id},
-            {"$set": update_fields}
+            {"$set": update_fields},
+            projection=TICKET_ROUTING_FIELDS,
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Ticket not found")
         
+        draft_prefetcher.enqueue({**previous, **update_fields})
+        
+        await publish_ticket_event(
+            request.institution_id, "ticket.metadata_updated", request.ticket_id,
+            update_fields.get("queue_id", previous.get("queue_id")), update_fields,
+            previous_queue_id=previous.get("queue_id")
+        )
+        
         return {"success": True, "updated_fields": update_fields}
     except HTTPException:
         raise
@@ -420,7 +745,9 @@ async def api_update_ticket_metadata(request: UpdateTicketMetadataRequest):
 async def api_add_student_event(request: AddStudentEventRequest):
     """Add a student event (note, call, walk-in, ai_routed, etc.) to timeline"""
     try:
-        event = StudentEvent(
+        # AddStudentEventRequest was validated by FastAPI; no second model instantiation
+        event = new_document(
+            StudentEvent,
             institution_id=request.institution_id,
             student_id=request.student_id,
             ticket_id=request.ticket_id,
@@ -429,16 +756,229 @@ async def api_add_student_event(request: AddStudentEventRequest):
             created_by=request.created_by
         )
         
-        doc = event.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        await db.student_events.insert_one(doc)
+        await db.student_events.insert_one(event)
         
-        return {"success": True, "event_id": event.id}
+        return {"success": True, "event_id": event["id"]}
     except Exception as e:
         logging.error(f"Add student event failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================================
+# COMPLIANCE
+# ============================================================
+
+@api_router.get("/compliance/{collection}")
+async def compliance_lookup(
+    collection: str,
+    ticket_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 100,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Audit logs or AI suggestions (admins only), newest first, read across the hot
+    collection and the retention archive.
+    """
+    if collection not in RETENTION_POLICIES:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    match = {"institution_id": current_user["institution_id"]}
+    if ticket_id:
+        match["ticket_id"] = ticket_id
+    if user_id:
+        match["user_id"] = user_id
+
+    items = await query_retained(db, collection, match, start, end, max(1, min(limit, 1000)))
+    if collection == "ai_suggestions":
+        await hydrate_suggestions(db, items)
+    return trusted_json({"items": items})
+
+
+# ============================================================
+# BACKGROUND JOBS
+# ============================================================
+
+@api_router.post("/jobs")
+async def create_job(request: CreateJobRequest, current_user: dict = Depends(get_current_user)):
+    """Queue a background job for the caller's institution (admins only)"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    job_type = JOB_TYPES.get(request.type)
+    if job_type is None or not job_type.tenant:
+        raise HTTPException(status_code=400, detail="Unknown job type")
+    
+    job = await enqueue_job(
+        db, request.type, current_user["institution_id"], request.payload, request.priority,
+        created_by=current_user["id"]
+    )
+    return trusted_json({key: job[key] for key in job if key != "payload"}, status_code=202)
+
+
+@api_router.get("/jobs", response_class=FastJSONResponse)
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = 50,
+    current_user: dict = Depends(get_current_user)
+):
+    """Recent jobs for the caller's institution, newest first"""
+    query = {"institution_id": current_user["institution_id"]}
+    if status:
+        query["status"] = status
+    jobs = await db.jobs.find(query, JOB_PROJECTION).sort("created_at", -1).to_list(max(1, min(limit, 200)))
+    return trusted_json({"jobs": jobs})
+
+
+@api_router.get("/jobs/{job_id}", response_class=FastJSONResponse)
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Job status, progress and result"""
+    job = await db.jobs.find_one({"id": job_id, "institution_id": current_user["institution_id"]}, JOB_PROJECTION)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return trusted_json(job)
+
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Cancel a queued job, or ask the worker running it to stop"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    scope = {"id": job_id, "institution_id": current_user["institution_id"]}
+    now = utcnow()
+    
+    result = await db.jobs.update_one(
+        {**scope, "status": "queued"},
+        {"$set": {"status": "cancelled", "finished_at": now, "updated_at": now}}
+    )
+    if result.matched_count:
+        return {"success": True, "status": "cancelled"}
+    
+    # The worker notices at its next heartbeat
+    result = await db.jobs.update_one(
+        {**scope, "status": "running"}, {"$set": {"cancel_requested": True, "updated_at": now}}
+    )
+    if result.matched_count:
+        return {"success": True, "status": "cancelling"}
+    
+    if await db.jobs.count_documents(scope, limit=1) == 0:
+        raise HTTPException(status_code=404, detail="Job not found")
+    raise HTTPException(status_code=409, detail="Job already finished")
+
+
+# ============================================================
+# PUBLIC CHATBOT
+# ============================================================
+
+# Proxies in front of the API that append to X-Forwarded-For (0: clients connect directly)
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", "0"))
+
+
+def client_ip(request: Request) -> str:
+    """
+    Client address for rate limiting. Earlier X-Forwarded-For hops are set by the
+    client itself, so only the hop appended by the outermost trusted proxy counts.
+    """
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if TRUSTED_PROXY_COUNT and hops:
+        return hops[-min(TRUSTED_PROXY_COUNT, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+
+@api_router.post("/chatbot/{institution_slug}/message", response_model=ChatbotMessageResponse)
+async def chatbot_message(
+    institution_slug: str,
+    payload: ChatbotMessageRequest,
+    request: Request,
+    stream: bool = Query(False)
+):
+    """
+    Answer a student's question from the KB (public, no auth).
+    With ?stream=true the response is NDJSON: "delta" events, then one "result" event.
+    """
+    session_id = payload.session_id or str(uuid.uuid4())
+    # Checked before the slug lookup so probing unknown slugs is throttled too
+    retry_after = rate_limiter.check(f"ip:{client_ip(request)}", f"session:{institution_slug}:{session_id}")
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many messages, please wait a moment",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+    
+    institution = await institution_registry.resolve(db, institution_slug)
+    if not institution or not chatbot_settings(institution)["enabled"]:
+        raise HTTPException(status_code=404, detail="Institution not found")
+    
+    async def on_escalated(ticket: dict):
+        await publish_ticket_event(
+            institution["id"], "ticket.created", ticket["id"], ticket.get("queue_id"), ticket
+        )
+    
+    events = answer_stream(db, institution, payload, session_id, on_escalated=on_escalated)
+    
+    if stream:
+        async def ndjson():
+            try:
+                async for event in events:
+                    yield json.dumps(event) + "\n"
+            except Exception as e:
+                logging.error(f"Chatbot stream failed: {e}")
+                yield json.dumps({"type": "error", "detail": "Chatbot unavailable"}) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    
+    try:
+        async for event in events:
+            if event["type"] == "result":
+                return {k: v for k, v in event.items() if k != "type"}
+    except Exception as e:
+        logging.error(f"Chatbot failed: {e}")
+        raise HTTPException(status_code=500, detail="Chatbot unavailable")
+
+
+# ============================================================
+# REALTIME UPDATES
+# ============================================================
+
+@app.websocket("/api/ws")
+async def realtime_updates(
+    websocket: WebSocket,
+    token: str = Query(...),
+    queue_id: Optional[List[str]] = Query(None)
+):
+    """
+    Push ticket/message deltas for the agent's institution, optionally limited to queues.
+    Browsers cannot set headers on WebSocket requests, so the session token is a query param.
+    """
+    await websocket.accept()
+    session = sessions.get(token)
+    if not session:
+        # Close after accepting so the browser sees 4401 instead of a failed handshake
+        await websocket.close(code=4401)
+        return
+    
+    subscription = broker.subscribe(institution_channel(session["user"]["institution_id"]), queue_id)
+    
+    async def forward_events():
+        while True:
+            event = await subscription.get()
+            await websocket.send_text(json_dumps(event).decode())
+    
+    forwarder = asyncio.create_task(forward_events())
+    try:
+        # Clients don't send anything; receiving just detects disconnects
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        forwarder.cancel()
+        broker.unsubscribe(subscription)
+
+
 # ============================================================
 # HEALTH CHECK ENDPOINT
 # ============================================================
@@ -452,9 +992,71 @@ async def root():
     }
 
 
+# ============================================================
+# METRICS
+# ============================================================
+
+gauge("aidhub_sessions", "Active agent sessions", lambda: len(sessions))
+gauge("aidhub_realtime_subscribers", "Open realtime subscriptions", broker.subscriber_count)
+gauge("aidhub_draft_prefetch_queue_depth", "Tickets waiting for draft pre-generation", draft_prefetcher.depth)
+gauge("aidhub_thread_summaries_in_progress", "Thread summaries being generated", summaries_in_progress)
+gauge("aidhub_institution_registry_size", "Institutions in the slug registry", lambda: len(institution_registry))
+callback_counter(
+    "aidhub_tenant_cache_lookups_total", "Tenant cache lookups by result",
+    lambda: {(k,): v for k, v in tenant_cache.stats().items() if k in ("hits", "misses")},
+    labels=("result",)
+)
+callback_counter("aidhub_tenant_cache_evictions_total", "Tenant cache evictions", lambda: tenant_cache.evictions)
+gauge("aidhub_tenant_cache_hit_ratio", "Tenant cache hit ratio since startup", lambda: tenant_cache.stats()["hit_ratio"])
+gauge("aidhub_tenant_cache_entries", "Entries in the tenant cache", lambda: tenant_cache.stats()["entries"])
+
+# Backlogs that live in Mongo, counted once per scrape by refresh_backlog_stats()
+backlog_stats = {"jobs": {}, "draft_prefetch": 0}
+gauge(
+    "aidhub_jobs", "Queued and running background jobs by type and status",
+    lambda: backlog_stats["jobs"], labels=("type", "status")
+)
+gauge(
+    "aidhub_draft_prefetch_backlog", "Hot tickets whose latest inbound message has no prefetched draft",
+    lambda: backlog_stats["draft_prefetch"]
+)
+
+
+async def refresh_backlog_stats():
+    """Count the Mongo-backed backlogs; on failure the gauges keep the last counts"""
+    try:
+        backlog_stats["jobs"], backlog_stats["draft_prefetch"] = await asyncio.gather(
+            job_counts(db), draft_prefetcher.backlog()
+        )
+    except Exception as e:
+        logging.error(f"Backlog metrics refresh failed: {e}")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint (requires `Bearer $METRICS_TOKEN` when that is set)"""
+    token = os.environ.get("METRICS_TOKEN")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await refresh_backlog_stats()
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@api_router.get("/debug/timings")
+async def debug_timings(current_user: dict = Depends(get_current_user)):
+    """Per-route, per-stage latency histograms since startup"""
+    return {"routes": timing_stats()}
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Idempotency-Key on POST requests (see idempotency.py); inside profiling so replays are timed too
+app.middleware("http")(create_idempotency_middleware(lambda: db))
+
+# Per-stage timing, Server-Timing headers and sampled profiles (see profiling.py)
+app.middleware("http")(profiling_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -470,6 +1072,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+background_tasks = []
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await ensure_indexes(db)
+    await load_encoding()
+    await institution_registry.load(db)
+    background_tasks.append(asyncio.create_task(institution_registry.refresh_loop(db)))
+    await broker.start()
+    if os.environ.get("DRAFT_PREFETCH_ENABLED", "false").lower() == "true":
+        await draft_prefetcher.start()
+    if os.environ.get("TENANT_CACHE_CHANGE_STREAMS", "false").lower() == "true":
+        background_tasks.append(asyncio.create_task(watch_for_invalidations(db)))
+    if os.environ.get("RETENTION_ARCHIVER_ENABLED", "false").lower() == "true":
+        background_tasks.append(asyncio.create_task(Archiver(db).loop()))
+    if os.environ.get("JOBS_WORKER_ENABLED", "false").lower() == "true":
+        background_tasks.append(asyncio.create_task(Worker(db).run()))
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await broker.stop()
+    await draft_prefetcher.stop()
     client.close()
@@ -0,0 +1,49 @@
+"""
+Single-flight loading: concurrent callers asking for the same key share one load.
+
+The first caller for a key runs the loader; callers that arrive while it is
+running await the same result (or exception). If the first caller is cancelled
+(client disconnect, timeout) before the loader finishes, the waiters are not
+left hanging: one of them runs the load again.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Abandoned(Exception):
+    """The caller running the load was cancelled; waiters retry"""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._pending: dict = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of `loader()`, shared with every concurrent call for `key`"""
+        while True:
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except _Abandoned:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            # CancelledError can't be set on a future, and the waiters weren't cancelled anyway
+            future.set_exception(e if isinstance(e, Exception) else _Abandoned())
+            # Mark retrieved so an un-awaited future doesn't log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._pending.pop(key, None)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Compact, de-duplicated storage for AI suggestions.
+
+Drafts are generated every time a ticket is opened, and each one used to store
+the whole request (thread context included) and output inline, even when the
+same ticket had produced an identical draft minutes earlier. Now the input and
+output are stored once in a content-addressed collection and suggestions only
+reference them:
+
+    ai_blobs        {_id: sha256(institution_id + canonical JSON), institution_id, data, size, created_at,
+                     last_referenced_at}
+    ai_suggestions  {id, ticket_id, suggestion_type, input_hash, output_hash, summary,
+                     model, tokens, latency, accepted, created_at, last_generated_at,
+                     generated_count}
+
+A suggestion is keyed by (ticket_id, suggestion_type, input_hash, output_hash):
+regenerating an identical draft only bumps `generated_count` and
+`last_generated_at`. Fresh model calls rarely repeat an output exactly, but most
+drafts are not fresh calls: prefetched drafts (draft_prefetch.py) are served
+unchanged every time a hot ticket is opened, and those are what the key folds
+together. Distinct outputs for the same input still share the input blob, which
+holds the large part (the thread context). A regeneration that hits a suggestion
+already archived (retention.py) clears its `archived_at`, so the TTL doesn't
+delete it; the next archive pass writes the updated copy. `summary` is kept inline for the student timeline.
+Suggestions written before this change keep `input_context` / `output` inline;
+`hydrate` returns both shapes the same way.
+
+Blobs are garbage collected by reference time: every suggestion that uses a blob
+bumps its `last_referenced_at`, and once that is older than the ai_suggestions hot
+window every referencing suggestion has been archived (retention.py writes them
+hydrated, with their input and output inline). `collect_blobs` then marks the blob
+`archived_at` and the same TTL as the other archived collections removes it.
+
+    python suggestion_store.py --compact     # move inline suggestions into ai_blobs
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from models import AiSuggestion
+from repository import new_document
+from timestamps import utcnow
+
+AI_BLOB_CACHE_SIZE = int(os.environ.get("AI_BLOB_CACHE_SIZE", "10000"))
+# How stale a blob's last_referenced_at may get before a new reference writes it again
+AI_BLOB_TOUCH_SECONDS = float(os.environ.get("AI_BLOB_TOUCH_SECONDS", "3600"))
+
+# Fields that identify a suggestion; documents with the same key are the same draft
+SUGGESTION_KEY = ("ticket_id", "suggestion_type", "input_hash", "output_hash")
+
+# Hash -> when this process last wrote it, so repeated drafts skip the blob upsert
+_known_blobs: "OrderedDict[str, float]" = OrderedDict()
+
+
+def canonical_json(data) -> bytes:
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def blob_hash(institution_id: str, encoded: bytes) -> str:
+    """Blobs are scoped per institution so tenant data can be removed independently"""
+    return hashlib.sha256(str(institution_id).encode() + b"\0" + encoded).hexdigest()
+
+
+def _remember(digest: str):
+    _known_blobs[digest] = time.monotonic()
+    _known_blobs.move_to_end(digest)
+    while len(_known_blobs) > AI_BLOB_CACHE_SIZE:
+        _known_blobs.popitem(last=False)
+
+
+async def put_blob(db, institution_id: str, data, referenced_at: Optional[datetime] = None) -> str:
+    """Store `data` once and return its hash; `referenced_at` (default now) is when a suggestion used it"""
+    encoded = canonical_json(data)
+    digest = blob_hash(institution_id, encoded)
+    touched = _known_blobs.get(digest)
+    if referenced_at is None and touched is not None and time.monotonic() - touched < AI_BLOB_TOUCH_SECONDS:
+        _known_blobs.move_to_end(digest)
+        return digest
+    await db.ai_blobs.update_one(
+        {"_id": digest},
+        {
+            "$setOnInsert": {
+                "institution_id": institution_id, "data": data, "size": len(encoded), "created_at": utcnow(),
+            },
+            "$max": {"last_referenced_at": referenced_at or utcnow()},
+            # Referenced again while waiting for the TTL: keep it
+            "$unset": {"archived_at": ""},
+        },
+        upsert=True
+    )
+    if referenced_at is None:
+        _remember(digest)
+    return digest
+
+
+def suggestion_document(*, institution_id: str, ticket_id: str, suggestion_type: str, input_hash: str,
+                        output_hash: str, output: dict, usage: Optional[dict] = None) -> tuple:
+    """(key, fields set on insert) of a suggestion referencing its blobs"""
+    doc = new_document(
+        AiSuggestion,
+        institution_id=institution_id,
+        ticket_id=ticket_id,
+        suggestion_type=suggestion_type,
+        input_hash=input_hash,
+        output_hash=output_hash,
+        summary=output.get("summary"),
+        **{k: (usage or {}).get(k) for k in ("model", "prompt_tokens", "completion_tokens", "latency_ms")}
+    )
+    key = {field: doc.pop(field) for field in SUGGESTION_KEY}
+    for field in ("input_context", "output", "generated_count", "last_generated_at"):
+        doc.pop(field)
+    return key, doc
+
+
+async def save_suggestion(db, *, institution_id: str, ticket_id: str, suggestion_type: str,
+                          input_context: dict, output: dict, usage: Optional[dict] = None) -> dict:
+    """Record a generated suggestion; identical regenerations update the existing one"""
+    input_hash, output_hash = await asyncio.gather(
+        put_blob(db, institution_id, input_context), put_blob(db, institution_id, output)
+    )
+    key, doc = suggestion_document(
+        institution_id=institution_id, ticket_id=ticket_id, suggestion_type=suggestion_type,
+        input_hash=input_hash, output_hash=output_hash, output=output, usage=usage
+    )
+
+    try:
+        await db.ai_suggestions.update_one(
+            key,
+            {
+                "$setOnInsert": doc,
+                "$set": {"last_generated_at": doc["created_at"]},
+                "$inc": {"generated_count": 1},
+                "$unset": {"archived_at": ""},
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Two identical drafts raced to insert; the other one created the document
+        await db.ai_suggestions.update_one(
+            key, {
+                "$set": {"last_generated_at": doc["created_at"]},
+                "$inc": {"generated_count": 1},
+                "$unset": {"archived_at": ""},
+            }
+        )
+    return {**key, **doc}
+
+
+async def hydrate(db, suggestions: List[dict]) -> List[dict]:
+    """Fill `input_context` / `output` of referencing suggestions from ai_blobs (in place)"""
+    hashes = {
+        s[field] for s in suggestions for field in ("input_hash", "output_hash") if s.get(field)
+    }
+    if not hashes:
+        return suggestions
+    blobs = {
+        blob["_id"]: blob["data"]
+        async for blob in db.ai_blobs.find({"_id": {"$in": sorted(hashes)}}, {"data": 1})
+    }
+    for suggestion in suggestions:
+        if suggestion.get("input_hash"):
+            suggestion.setdefault("input_context", blobs.get(suggestion["input_hash"]))
+        if suggestion.get("output_hash"):
+            suggestion.setdefault("output", blobs.get(suggestion["output_hash"]))
+    return suggestions
+
+
+async def compact(db, batch_size: int = 500) -> dict:
+    """Move inline input_context/output of older suggestions into ai_blobs"""
+    stats = {"compacted": 0, "merged": 0}
+    while True:
+        docs = await db.ai_suggestions.find(
+            {"input_context": {"$exists": True}, "input_hash": {"$exists": False}}
+        ).sort("_id", 1).to_list(batch_size)
+        if not docs:
+            break
+        for doc in docs:
+            input_context, output = doc.get("input_context") or {}, doc.get("output") or {}
+            created_at = doc.get("created_at")
+            update = {
+                "input_hash": await put_blob(db, doc["institution_id"], input_context, created_at),
+                "output_hash": await put_blob(db, doc["institution_id"], output, created_at),
+                "summary": output.get("summary"),
+                "last_generated_at": created_at,
+                "generated_count": 1,
+            }
+            try:
+                await db.ai_suggestions.update_one(
+                    {"_id": doc["_id"]}, {"$set": update, "$unset": {"input_context": "", "output": ""}}
+                )
+                stats["compacted"] += 1
+            except DuplicateKeyError:
+                # An identical draft for the same ticket already exists: count it there instead
+                key = {field: doc.get(field, update.get(field)) for field in SUGGESTION_KEY}
+                await db.ai_suggestions.update_one(
+                    key, {"$inc": {"generated_count": 1}, "$max": {"last_generated_at": created_at}}
+                )
+                await db.ai_suggestions.delete_one({"_id": doc["_id"]})
+                stats["merged"] += 1
+    return stats
+
+
+async def collect_blobs(db, unreferenced_since: datetime) -> int:
+    """Mark blobs no suggestion has used since `unreferenced_since` for removal by the archived_at TTL"""
+    result = await db.ai_blobs.update_many(
+        {"last_referenced_at": {"$lt": unreferenced_since}, "archived_at": {"$exists": False}},
+        {"$set": {"archived_at": utcnow()}}
+    )
+    return result.modified_count
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from id_codec import MONGO_UUID_OPTIONS, wrap_database
+    from timestamps import MONGO_CODEC_OPTIONS
+
+    parser = argparse.ArgumentParser(description="Compact stored AI suggestions into content-addressed blobs")
+    parser.add_argument("--compact", action="store_true", help="move inline suggestions into ai_blobs")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    if not args.compact:
+        parser.error("nothing to do (use --compact)")
+
+    client = AsyncIOMotorClient(
+        os.getenv("MONGO_URL", "mongodb://localhost:27017"), **MONGO_CODEC_OPTIONS, **MONGO_UUID_OPTIONS
+    )
+    db = wrap_database(client[os.getenv("DB_NAME", "test_database")])
+    print("🗜️  Compacting AI suggestions...")
+    stats = await compact(db, args.batch_size)
+    print(f"   compacted {stats['compacted']}, merged {stats['merged']} duplicates")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
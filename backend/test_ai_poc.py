@@ -6,6 +6,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from ai_tools import search_kb_articles, draft_reply_with_ai, triage_ticket_with_ai
 from models import SearchKBRequest, DraftReplyRequest
 from kb_data import sample_kb_articles
+from id_codec import MONGO_UUID_OPTIONS, wrap_database
 import uuid
 import os
 
@@ -171,8 +172,8 @@ async def main():
     print("="*60)
     
     # Connect to MongoDB
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DB_NAME]
+    client = AsyncIOMotorClient(MONGO_URL, **MONGO_UUID_OPTIONS)
+    db = wrap_database(client[DB_NAME])
     
     try:
         # Setup test data
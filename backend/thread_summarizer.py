@@ -0,0 +1,133 @@
+"""
+Rolling per-ticket thread summaries.
+
+Drafts see the latest few turns verbatim (the client sends the last
+THREAD_SUMMARY_KEEP_RECENT messages) plus a summary of everything before them,
+so prompt size stays bounded however long the thread gets. The summary lives on
+the ticket document:
+
+    thread_summary: {text, covered_until, covered_message_id, message_count, updated_at}
+
+and is updated incrementally: only messages newer than `covered_until` are sent
+to the model, together with the previous summary.
+"""
+import logging
+import os
+from typing import Optional
+
+from llm import get_llm_backend
+from llm_json import extract_json_object
+from prompt_context import truncate_to_tokens
+from timestamps import to_iso, utcnow
+
+logger = logging.getLogger(__name__)
+
+THREAD_SUMMARY_KEEP_RECENT = int(os.getenv("THREAD_SUMMARY_KEEP_RECENT", "3"))
+THREAD_SUMMARY_MAX_TOKENS = int(os.getenv("THREAD_SUMMARY_MAX_TOKENS", "300"))
+THREAD_SUMMARY_BATCH = 50
+
+SUMMARY_SYSTEM_MESSAGE = """You maintain a running summary of an email thread between a student and a university financial aid office.
+
+You receive the current summary (possibly empty) and the messages that followed it. Produce an updated summary that:
+- keeps what the student asked for, documents requested or received, deadlines and promises made by staff
+- drops greetings, signatures and repeated content
+- is at most 150 words
+
+Respond in this exact JSON format:
+{"summary": "..."}
+"""
+
+# Tickets being summarized in this process, and ones that got new messages meanwhile
+_running = set()
+_rerun = set()
+
+
+def summaries_in_progress() -> int:
+    """Tickets currently being summarized in this process"""
+    return len(_running)
+
+
+async def refresh_thread_summary(db, ticket_id: str):
+    """Fold messages newer than the stored summary into it (safe to call after every message)"""
+    if ticket_id in _running:
+        _rerun.add(ticket_id)
+        return
+
+    _running.add(ticket_id)
+    try:
+        while True:
+            _rerun.discard(ticket_id)
+            await _summarize_new_messages(db, ticket_id)
+            if ticket_id not in _rerun:
+                break
+    except Exception as e:
+        logger.error(f"Thread summarization failed for ticket {ticket_id}: {e}")
+    finally:
+        _running.discard(ticket_id)
+
+
+async def _summarize_new_messages(db, ticket_id: str):
+    from ai_tools import mask_pii
+
+    ticket = await db.tickets.find_one({"id": ticket_id}, {"_id": 0, "thread_summary": 1})
+    if ticket is None:
+        return
+    summary = ticket.get("thread_summary") or {}
+
+    query = {"ticket_id": ticket_id}
+    if summary.get("covered_until"):
+        query["created_at"] = {"$gt": summary["covered_until"]}
+    new_messages = await db.messages.find(
+        query, {"_id": 0, "id": 1, "sender_email": 1, "body": 1, "direction": 1, "created_at": 1}
+    ).sort("created_at", 1).to_list(THREAD_SUMMARY_BATCH + THREAD_SUMMARY_KEEP_RECENT)
+
+    # The newest turns go to the model verbatim, so only fold in what precedes them
+    to_fold = new_messages[:-THREAD_SUMMARY_KEEP_RECENT] if THREAD_SUMMARY_KEEP_RECENT else new_messages
+    if not to_fold:
+        return
+
+    lines = []
+    for msg in to_fold:
+        body, _ = mask_pii(msg["body"])
+        who = "Student" if msg["direction"] == "inbound" else "Staff"
+        lines.append(f"{who} ({to_iso(msg['created_at'])}): {truncate_to_tokens(body, 400)}")
+
+    prompt = (
+        f"Current summary:\n{summary.get('text') or '(none)'}\n\n"
+        f"New messages:\n" + "\n\n".join(lines)
+    )
+    completion = await get_llm_backend().complete(
+        system_message=SUMMARY_SYSTEM_MESSAGE,
+        prompt=prompt,
+        session_id=f"summary_{ticket_id}",
+        tool="summarize"
+    )
+    text = _parse_summary(completion.text)
+
+    last = to_fold[-1]
+    await db.tickets.update_one(
+        # Don't overwrite a summary another instance advanced in the meantime
+        {"id": ticket_id, "thread_summary.covered_until": summary.get("covered_until")},
+        {"$set": {"thread_summary": {
+            "text": truncate_to_tokens(text, THREAD_SUMMARY_MAX_TOKENS),
+            "covered_until": last["created_at"],
+            "covered_message_id": last["id"],
+            "message_count": summary.get("message_count", 0) + len(to_fold),
+            "updated_at": utcnow(),
+        }}}
+    )
+
+
+def _parse_summary(ai_text: str) -> str:
+    data = extract_json_object(ai_text) or {}
+    summary = data.get("summary")
+    return summary if isinstance(summary, str) else ai_text.strip()
+
+
+async def get_thread_summary(db, institution_id: str, ticket_id: str) -> Optional[dict]:
+    """Stored summary for a ticket, if one has been built"""
+    ticket = await db.tickets.find_one(
+        {"id": ticket_id, "institution_id": institution_id},
+        {"_id": 0, "thread_summary": 1}
+    )
+    return (ticket or {}).get("thread_summary")
@@ -0,0 +1,128 @@
+"""
+Ranked full-text ticket search.
+
+Tickets carry one weighted Mongo text index over the subject, the denormalized
+student name/email and `search_messages` (the last message bodies, maintained by
+ticket_summary.py on every message write). The index is prefixed by
+institution_id, so a search only walks the calling tenant's keys and needs no
+separate index per institution:
+
+    subject 10, student_name 8, student_email 8, search_messages 2
+
+Queries that look like an email address are answered by an exact student_email
+lookup when that student has any tickets, and by the text index otherwise; the
+choice depends only on the query, so every page of a query comes from the same
+ranking. Results are ordered by text score (then recency) and paginated by
+offset; highlights are computed for the returned page only.
+"""
+import re
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+SEARCH_WEIGHTS = {"subject": 10, "student_name": 8, "student_email": 8, "search_messages": 2}
+
+SEARCH_INDEXES = [
+    ([("institution_id", ASCENDING), *((field, TEXT) for field in SEARCH_WEIGHTS)],
+     {"name": "ticket_search", "weights": SEARCH_WEIGHTS, "default_language": "english"}),
+    [("institution_id", ASCENDING), ("student_email", ASCENDING)],
+]
+
+MAX_LIMIT = 50
+MAX_OFFSET = 1000
+FRAGMENT_LENGTH = 160
+MAX_HIGHLIGHTS = 3
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Returned for each hit (search_messages is only read to build highlights)
+PROJECTION = {"_id": 0, "thread_summary": 0}
+
+
+def _terms(q: str) -> List[str]:
+    """Positive search terms (negated `-word` terms are not highlighted)"""
+    return [
+        term.lower()
+        for word in q.split() if not word.startswith("-")
+        for term in re.findall(r"\w+", word)
+    ]
+
+
+def highlight_pattern(q: str) -> Optional[re.Pattern]:
+    """Matches words starting with a query term, with a crude stem so "deadlines" finds "deadline" """
+    stems = {term[:max(4, len(term) - 2)] if len(term) > 4 else term for term in _terms(q)}
+    if not stems:
+        return None
+    return re.compile(r"\b(?:" + "|".join(map(re.escape, sorted(stems, key=len, reverse=True))) + r")\w*", re.I)
+
+
+def highlight(text: str, pattern: re.Pattern, length: int = FRAGMENT_LENGTH) -> Optional[dict]:
+    """Fragment of `text` around its first match, with [start, end) spans of every match in it"""
+    first = pattern.search(text or "")
+    if first is None:
+        return None
+    start = max(0, first.start() - length // 4)
+    if start:
+        # Don't cut a word in half
+        space = text.find(" ", start)
+        start = space + 1 if 0 <= space < first.start() else start
+    fragment = text[start:start + length]
+    return {
+        "fragment": fragment,
+        "spans": [[m.start(), m.end()] for m in pattern.finditer(fragment)],
+        "truncated": start > 0 or start + length < len(text),
+    }
+
+
+def highlights(ticket: dict, pattern: Optional[re.Pattern]) -> List[dict]:
+    """Best fields first: subject, student, then the newest matching messages"""
+    if pattern is None:
+        return []
+    found = []
+    candidates = [(field, ticket.get(field)) for field in ("subject", "student_name", "student_email")]
+    candidates += [("message", body) for body in reversed(ticket.get("search_messages") or [])]
+    for field, text in candidates:
+        match = highlight(text, pattern) if text else None
+        if match:
+            found.append({"field": field, **match})
+            if len(found) >= MAX_HIGHLIGHTS:
+                break
+    return found
+
+
+async def search_tickets(db, institution_id: str, q: str, limit: int = 20, offset: int = 0) -> dict:
+    """One page of tickets matching `q`, best match first"""
+    q = q.strip()
+    limit = max(1, min(limit, MAX_LIMIT))
+    offset = max(0, min(offset, MAX_OFFSET))
+
+    by_email = {"institution_id": institution_id, "student_email": q.lower()}
+    # Decided on the whole result set, not this page, so paging past the email hits doesn't switch rankings
+    if EMAIL_PATTERN.match(q) and await db.tickets.find_one(by_email, {"_id": 1}):
+        hits = await db.tickets.find(by_email, PROJECTION).sort(
+            "updated_at", DESCENDING
+        ).skip(offset).to_list(limit + 1)
+    else:
+        hits = await db.tickets.find(
+            {"institution_id": institution_id, "$text": {"$search": q}},
+            {**PROJECTION, "score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"}), ("updated_at", DESCENDING)]).skip(offset).to_list(limit + 1)
+
+    next_offset = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        if offset + limit <= MAX_OFFSET:
+            next_offset = offset + limit
+
+    pattern = highlight_pattern(q)
+    for ticket in hits:
+        ticket["highlights"] = highlights(ticket, pattern)
+        ticket.pop("search_messages", None)
+        if "student_name" in ticket:
+            ticket["student"] = {
+                "id": ticket["student_id"],
+                "name": ticket["student_name"],
+                "email": ticket["student_email"],
+            }
+
+    return {"tickets": hits, "next_offset": next_offset}
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Denormalized summary fields on ticket documents.
+
+The inbox needs the last message snippet, message count, last inbound time and
+student name/email for every ticket. These are kept on the ticket itself so the
+ticket list is a single query:
+
+    message_count, last_message_at, last_message_snippet, last_message_direction,
+    last_inbound_at, student_name, student_email
+
+`search_messages` holds the last TICKET_SEARCH_MESSAGES message bodies for the
+ticket search text index (see ticket_search.py).
+
+Writers apply updates atomically ($inc / $set / $max); `recompute_ticket_summaries`
+rebuilds them in bulk (run it after seeding or if they ever drift).
+"""
+import asyncio
+import os
+from typing import Optional
+
+from pymongo import UpdateOne
+
+SNIPPET_LENGTH = 160
+SEARCH_MESSAGES = int(os.environ.get("TICKET_SEARCH_MESSAGES", "20"))
+SEARCH_FRAGMENT_LENGTH = 1000
+
+
+def make_snippet(body: str) -> str:
+    """Collapse whitespace and truncate a message body for inbox previews"""
+    text = " ".join((body or "").split())
+    if len(text) > SNIPPET_LENGTH:
+        text = text[:SNIPPET_LENGTH - 1].rstrip() + "…"
+    return text
+
+
+def search_fragment(body: str) -> str:
+    """Whitespace-collapsed, bounded message body for the search index"""
+    return " ".join((body or "").split())[:SEARCH_FRAGMENT_LENGTH]
+
+
+def message_summary_update(message: dict) -> dict:
+    """Update document that folds a newly stored message into its ticket's summary"""
+    update = {
+        "$inc": {"message_count": 1},
+        "$set": {
+            "last_message_snippet": make_snippet(message["body"]),
+            "last_message_direction": message["direction"],
+        },
+        "$max": {"last_message_at": message["created_at"]},
+        "$push": {"search_messages": {"$each": [search_fragment(message["body"])], "$slice": -SEARCH_MESSAGES}},
+    }
+    if message["direction"] == "inbound":
+        update["$max"]["last_inbound_at"] = message["created_at"]
+    return update
+
+
+def student_summary_fields(student: dict) -> dict:
+    """Ticket fields copied from the student document"""
+    return {
+        "student_name": student.get("name"),
+        "student_email": student.get("email"),
+    }
+
+
+async def apply_message_to_ticket(db, message: dict, extra_set: Optional[dict] = None):
+    """Atomically update a ticket's summary after one of its messages was stored (used by ingestion)"""
+    update = message_summary_update(message)
+    if extra_set:
+        update["$set"].update(extra_set)
+    await db.tickets.update_one({"id": message["ticket_id"]}, update)
+
+
+async def sync_student_fields(db, institution_id: str, student_id: str, update_data: dict):
+    """Propagate a student name/email change to that student's tickets"""
+    fields = {
+        f"student_{key}": update_data[key]
+        for key in ("name", "email")
+        if key in update_data
+    }
+    if fields:
+        await db.tickets.update_many(
+            {"institution_id": institution_id, "student_id": student_id},
+            {"$set": fields}
+        )
+
+
+async def recompute_ticket_summaries(db, institution_id: Optional[str] = None, batch_size: int = 1000) -> int:
+    """Rebuild summary fields for all tickets (optionally one institution) in bulk batches"""
+    ticket_filter = {"institution_id": institution_id} if institution_id else {}
+    cursor = db.tickets.find(ticket_filter, {"_id": 0, "id": 1, "student_id": 1})
+
+    updated = 0
+    batch = []
+    async for ticket in cursor:
+        batch.append(ticket)
+        if len(batch) >= batch_size:
+            updated += await _recompute_batch(db, batch)
+            batch = []
+    if batch:
+        updated += await _recompute_batch(db, batch)
+    return updated
+
+
+async def _recompute_batch(db, tickets: list) -> int:
+    ticket_ids = [t["id"] for t in tickets]
+
+    stats = {}
+    pipeline = [
+        {"$match": {"ticket_id": {"$in": ticket_ids}}},
+        {"$sort": {"ticket_id": 1, "created_at": 1}},
+        {"$group": {
+            "_id": "$ticket_id",
+            "message_count": {"$sum": 1},
+            "last_message_at": {"$last": "$created_at"},
+            "last_body": {"$last": "$body"},
+            "last_direction": {"$last": "$direction"},
+            # Only the newest SEARCH_MESSAGES bodies, like the incremental $push/$slice
+            "bodies": {"$lastN": {"input": "$body", "n": SEARCH_MESSAGES}},
+            "last_inbound_at": {"$max": {
+                "$cond": [{"$eq": ["$direction", "inbound"]}, "$created_at", None]
+            }},
+        }},
+    ]
+    async for row in db.messages.aggregate(pipeline):
+        stats[row["_id"]] = row
+
+    student_ids = list({t["student_id"] for t in tickets})
+    students = {
+        s["id"]: s
+        async for s in db.students.find({"id": {"$in": student_ids}}, {"_id": 0, "id": 1, "name": 1, "email": 1})
+    }
+
+    operations = []
+    for ticket in tickets:
+        row = stats.get(ticket["id"])
+        fields = {
+            "message_count": row["message_count"] if row else 0,
+            "last_message_at": row["last_message_at"] if row else None,
+            "last_message_snippet": make_snippet(row["last_body"]) if row else None,
+            "last_message_direction": row["last_direction"] if row else None,
+            "last_inbound_at": row["last_inbound_at"] if row else None,
+            "search_messages": [search_fragment(b) for b in row["bodies"]] if row else [],
+        }
+        student = students.get(ticket["student_id"])
+        if student:
+            fields.update(student_summary_fields(student))
+        operations.append(UpdateOne({"id": ticket["id"]}, {"$set": fields}))
+
+    if operations:
+        await db.tickets.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from id_codec import MONGO_UUID_OPTIONS, wrap_database
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"), **MONGO_UUID_OPTIONS)
+    db = wrap_database(client[os.getenv("DB_NAME", "test_database")])
+
+    print("🔧 Recomputing ticket summary fields...")
+    updated = await recompute_ticket_summaries(db)
+    print(f"✅ Updated {updated} tickets")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Timestamp codec.
+
+Timestamps are stored as native BSON dates, so sorts and date-range queries
+compare dates, TTL indexes work and each value takes 8 bytes instead of a
+32-character string. Write paths use `utcnow()` (or a model's datetime field as
+is); the Motor client is created with `MONGO_CODEC_OPTIONS`, so reads come back
+as timezone-aware UTC datetimes, which the JSON layer renders as the same
+ISO-8601 strings ("2025-09-01T12:00:00.123000+00:00") the API returned when
+timestamps were stored as strings. BSON dates hold milliseconds, so the last
+three digits of the fraction are now always zero.
+
+Documents written before the switch still hold ISO strings until
+migrate_timestamps.py converts them; BSON compares values of different types by
+type first, so run the migration right after deploying.
+"""
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+# Keyword arguments for AsyncIOMotorClient
+MONGO_CODEC_OPTIONS = {"tz_aware": True, "tzinfo": timezone.utc}
+
+# collection -> timestamp fields (dotted paths for embedded documents)
+TIMESTAMP_FIELDS = {
+    "institutions": ["created_at"],
+    "users": ["created_at"],
+    "students": ["created_at"],
+    "queues": ["created_at"],
+    "tickets": [
+        "created_at", "updated_at", "last_message_at", "last_inbound_at",
+        "thread_summary.covered_until", "thread_summary.updated_at",
+    ],
+    "messages": ["created_at"],
+    "student_events": ["created_at"],
+    "knowledge_base": ["created_at", "updated_at"],
+    "ai_suggestions": ["created_at"],
+    "audit_logs": ["timestamp"],
+    "draft_cache": ["created_at"],
+    "chatbot_answers": ["created_at"],
+}
+
+
+def utcnow() -> datetime:
+    """Current time for storage (millisecond precision, as BSON keeps it)"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Aware UTC datetime from an ISO-8601 string or datetime (naive values are UTC); None if unparseable"""
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, str):
+        try:
+            moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def to_iso(value: Any) -> Any:
+    """API representation of a stored timestamp (ISO strings pass through unchanged)"""
+    if isinstance(value, datetime):
+        return parse_timestamp(value).isoformat()
+    return value
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { ScrollArea } from '../ui/scroll-area';
 import { Button } from '../ui/button';
 import { Textarea } from '../ui/textarea';
@@ -7,13 +7,15 @@ import { Separator } from '../ui/separator';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../ui/select';
 import { Send, RefreshCw, Edit3, Sparkles, Clock, Check, FileText, Paperclip, Save } from 'lucide-react';
 import { formatDistanceToNow } from 'date-fns';
-import { messageAPI, aiToolsAPI, ticketAPI, userAPI } from '../../lib/api';
+import { messageAPI, aiToolsAPI, newIdempotencyKey, ticketAPI, userAPI } from '../../lib/api';
 import { toast } from 'sonner';
 import { useAuth } from '../../contexts/AuthContext';
 
 const ConversationPanel = ({ ticketDetails, onTicketUpdate }) => {
   const { user } = useAuth();
   const [sending, setSending] = useState(false);
+  // Idempotency key of the reply being sent; kept until it succeeds so retries don't send twice
+  const sendKey = useRef({});
   const [generatingDraft, setGeneratingDraft] = useState(false);
   const [aiDraft, setAiDraft] = useState(null);
   const [isRegenerating, setIsRegenerating] = useState(false);
@@ -167,7 +169,11 @@ const ConversationPanel = ({ ticketDetails, onTicketUpdate }) => {
         finalReply += '\n\nAttachments: ' + attachments.map(att => att.name).join(', ');
       }
       
-      await messageAPI.create(ticket.id, finalReply, 'outbound');
+      if (sendKey.current.body !== finalReply) {
+        sendKey.current = { body: finalReply, key: newIdempotencyKey() };
+      }
+      await messageAPI.create(ticket.id, finalReply, 'outbound', sendKey.current.key);
+      sendKey.current = {};
       
       // Clear everything
       setAiDraft(null);
@@ -213,10 +219,16 @@ const ConversationPanel = ({ ticketDetails, onTicketUpdate }) => {
           body: m.body,
         })),
         student_notes: student.notes,
+        // A draft pre-generated for hot tickets is fine on open; "Regenerate" asks the model again
+        use_prefetched: isAuto,
       };
 
       const draft = await Promise.race([
-        aiToolsAPI.draftReply(draftRequest),
+        aiToolsAPI.draftReply(
+          draftRequest,
+          // Opening the same ticket twice reuses the auto-generated draft; regenerating asks for a new one
+          isAuto ? `draft-${ticket.id}-${latestInbound.id}` : newIdempotencyKey()
+        ),
         timeout
       ]);
       
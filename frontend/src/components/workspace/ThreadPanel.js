@@ -93,6 +93,8 @@ const ThreadPanel = ({ ticketDetails, onTicketUpdate }) => {
           body: m.body,
         })),
         student_notes: student.notes,
+        // A draft pre-generated for hot tickets is fine on open; "Regenerate" asks the model again
+        use_prefetched: isAuto,
       };
 
       const draft = await aiToolsAPI.draftReply(draftRequest);
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { ScrollArea } from '../ui/scroll-area';
 import { Button } from '../ui/button';
 import { Textarea } from '../ui/textarea';
@@ -9,7 +9,7 @@ import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, D
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../ui/select';
 import { Mail, Send, RefreshCw, Edit3, Sparkles, User, Phone, ExternalLink, Clock, MessageSquare, PhoneCall, UserCheck, ArrowRight } from 'lucide-react';
 import { formatDistanceToNow } from 'date-fns';
-import { messageAPI, aiToolsAPI, studentAPI } from '../../lib/api';
+import { messageAPI, aiToolsAPI, newIdempotencyKey, studentAPI } from '../../lib/api';
 import { toast } from 'sonner';
 import { useAuth } from '../../contexts/AuthContext';
 
@@ -17,6 +17,8 @@ const TicketDetails = ({ ticketDetails, onTicketUpdate }) => {
   const { user } = useAuth();
   const [replyBody, setReplyBody] = useState('');
   const [sending, setSending] = useState(false);
+  // Idempotency key of the reply being sent; kept until it succeeds so retries don't send twice
+  const sendKey = useRef({});
   const [generatingDraft, setGeneratingDraft] = useState(false);
   const [aiDraft, setAiDraft] = useState(null);
   const [isEditing, setIsEditing] = useState(false);
@@ -127,7 +129,11 @@ const TicketDetails = ({ ticketDetails, onTicketUpdate }) => {
 
     setSending(true);
     try {
-      await messageAPI.create(ticket.id, bodyToSend, 'outbound');
+      if (sendKey.current.body !== bodyToSend) {
+        sendKey.current = { body: bodyToSend, key: newIdempotencyKey() };
+      }
+      await messageAPI.create(ticket.id, bodyToSend, 'outbound', sendKey.current.key);
+      sendKey.current = {};
       setReplyBody('');
       setAiDraft(null);
       setIsEditing(false);
@@ -167,11 +173,17 @@ const TicketDetails = ({ ticketDetails, onTicketUpdate }) => {
           body: m.body,
         })),
         student_notes: student.notes,
+        // A draft pre-generated for hot tickets is fine on open; "Regenerate" asks the model again
+        use_prefetched: isAuto,
       };
 
       // Race between API call and timeout
       const draft = await Promise.race([
-        aiToolsAPI.draftReply(draftRequest),
+        aiToolsAPI.draftReply(
+          draftRequest,
+          // Opening the same ticket twice reuses the auto-generated draft; regenerating asks for a new one
+          isAuto ? `draft-${ticket.id}-${latestInbound.id}` : newIdempotencyKey()
+        ),
         timeout
       ]);
       
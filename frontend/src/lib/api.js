@@ -41,6 +41,13 @@ api.interceptors.response.use(
 
 export default api;
 
+// Same key for every attempt of one action, so retries and double-clicks run once on the server
+export const newIdempotencyKey = () =>
+  (window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`);
+
+const idempotent = (idempotencyKey) =>
+  (idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined);
+
 // ============================================================
 // AUTH API
 // ============================================================
@@ -92,9 +99,10 @@ export const ticketAPI = {
 // ============================================================
 
 export const messageAPI = {
-  create: async (ticketId, body, direction = 'outbound') => {
+  create: async (ticketId, body, direction = 'outbound', idempotencyKey = null) => {
     const response = await api.post('/messages', null, {
       params: { ticket_id: ticketId, body, direction },
+      headers: idempotent(idempotencyKey),
     });
     return response.data;
   },
@@ -119,6 +127,13 @@ export const studentAPI = {
     const response = await api.patch(`/students/${studentId}`, data);
     return response.data;
   },
+  
+  timeline: async (studentId, cursor = null, limit = 50) => {
+    const response = await api.get(`/students/${studentId}/timeline`, {
+      params: { cursor, limit },
+    });
+    return response.data;
+  },
 };
 
 // ============================================================
@@ -144,8 +159,10 @@ export const userAPI = {
 // ============================================================
 
 export const aiToolsAPI = {
-  draftReply: async (data) => {
-    const response = await api.post('/tools/draft_reply', data);
+  draftReply: async (data, idempotencyKey = null) => {
+    const response = await api.post('/tools/draft_reply', data, {
+      headers: idempotent(idempotencyKey),
+    });
     return response.data;
   },
   
@@ -0,0 +1,60 @@
+// Realtime ticket updates over WebSocket (replaces re-fetching to notice changes)
+
+const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || '';
+
+const buildSocketUrl = (token, queueIds) => {
+  const base = API_BASE_URL || window.location.origin;
+  const url = new URL(`${base}/api/ws`);
+  url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+  url.searchParams.set('token', token);
+  (queueIds || []).forEach((id) => url.searchParams.append('queue_id', id));
+  return url.toString();
+};
+
+// Subscribe to ticket/message deltas; reconnects with backoff until the returned
+// function is called. onEvent receives { type, ticket_id, queue_id, data, at }.
+export const subscribeToTicketUpdates = (onEvent, { queueIds = [] } = {}) => {
+  let socket = null;
+  let closed = false;
+  let retryDelay = 1000;
+  let retryTimer = null;
+  let reconnecting = false;
+
+  const connect = () => {
+    const token = localStorage.getItem('auth_token');
+    if (!token || closed) return;
+
+    socket = new WebSocket(buildSocketUrl(token, queueIds));
+
+    socket.onopen = () => {
+      retryDelay = 1000;
+      // Anything may have changed while disconnected
+      if (reconnecting) onEvent({ type: 'resync' });
+      reconnecting = false;
+    };
+
+    socket.onmessage = (message) => {
+      try {
+        onEvent(JSON.parse(message.data));
+      } catch (error) {
+        console.error('Failed to handle realtime event:', error);
+      }
+    };
+
+    socket.onclose = (event) => {
+      // 4401 = invalid session; the 401 interceptor handles re-login
+      if (closed || event.code === 4401) return;
+      reconnecting = true;
+      retryTimer = setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  };
+
+  connect();
+
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (socket) socket.close();
+  };
+};
@@ -1,7 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../contexts/AuthContext';
 import { useTicket } from '../contexts/TicketContext';
 import { ticketAPI, queueAPI } from '../lib/api';
+import { subscribeToTicketUpdates } from '../lib/realtime';
 import WorkspaceLayout from '../components/workspace/WorkspaceLayout';
 import TicketList from '../components/workspace/TicketList';
 import ConversationPanel from '../components/workspace/ConversationPanel';
@@ -20,6 +21,12 @@ const WorkspacePage = () => {
     category: null,
   });
 
+  // Latest selection for the realtime handler, so selecting a ticket doesn't reconnect the socket
+  const selectedTicketRef = useRef(selectedTicket);
+  const handleTicketUpdateRef = useRef(handleTicketUpdate);
+  selectedTicketRef.current = selectedTicket;
+  handleTicketUpdateRef.current = handleTicketUpdate;
+
   useEffect(() => {
     loadQueues();
   }, []);
@@ -28,6 +35,54 @@ const WorkspacePage = () => {
     loadTickets();
   }, [filters]);
 
+  // Same filtering as GET /tickets, for tickets pushed over the socket
+  const matchesFilters = (ticket) => {
+    if (filters.status === 'my' && ticket.assignee_id !== user?.id) return false;
+    if (filters.status === 'unassigned' && ticket.assignee_id) return false;
+    if (filters.status && !['my', 'unassigned'].includes(filters.status) && ticket.status !== filters.status) return false;
+    if (filters.queue_id && ticket.queue_id !== filters.queue_id) return false;
+    if (filters.category && ticket.category !== filters.category) return false;
+    return true;
+  };
+
+  // Apply pushed ticket/message deltas instead of re-fetching
+  useEffect(() => {
+    // With a queue filter, only that queue's events are sent
+    const queueIds = filters.queue_id ? [filters.queue_id] : [];
+
+    return subscribeToTicketUpdates((event) => {
+      if (event.type === 'resync') {
+        loadTickets();
+        handleTicketUpdateRef.current();
+        return;
+      }
+
+      if (event.type === 'ticket.created') {
+        const ticket = {
+          ...event.data,
+          student: { id: event.data.student_id, name: event.data.student_name, email: event.data.student_email },
+        };
+        if (matchesFilters(ticket)) {
+          setTickets(prev => (prev.some(t => t.id === ticket.id) ? prev : [ticket, ...prev]));
+        }
+        return;
+      }
+
+      const changes = event.type === 'message.created'
+        ? {
+            updated_at: event.data.updated_at,
+            last_message_snippet: event.data.message.body,
+            last_message_direction: event.data.message.direction,
+          }
+        : event.data;
+      setTickets(prev => prev.map(t => (t.id === event.ticket_id ? { ...t, ...changes } : t)));
+
+      if (selectedTicketRef.current?.id === event.ticket_id) {
+        handleTicketUpdateRef.current();
+      }
+    }, { queueIds });
+  }, [filters]);
+
   // Restore selected ticket when tickets are loaded
   useEffect(() => {
     const savedTicketId = localStorage.getItem('selectedTicketId');
@@ -0,0 +1,12 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other as top-level modules (the server runs from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,109 @@
+import uuid
+
+import bson
+import pytest
+from bson.binary import Binary, UuidRepresentation
+from bson.codec_options import CodecOptions
+from mongomock_motor import AsyncMongoMockClient
+
+from id_codec import MONGO_UUID_OPTIONS, decode, encode_document, encode_filter, wrap_database
+
+pytestmark = pytest.mark.anyio
+
+TICKET_ID = "7b5c2f17-5333-488f-aa64-7fcb72accf4d"
+INSTITUTION_ID = "8826d916-cdfb-41c6-81ff-91a761565a70"
+STANDARD = CodecOptions(uuid_representation=UuidRepresentation.STANDARD)
+
+
+def test_id_fields_encode_to_uuid():
+    doc = encode_document({"id": TICKET_ID, "institution_id": INSTITUTION_ID, "subject": TICKET_ID})
+    assert doc == {"id": uuid.UUID(TICKET_ID), "institution_id": uuid.UUID(INSTITUTION_ID), "subject": TICKET_ID}
+
+
+@pytest.mark.parametrize("value", ["SIS-000123", TICKET_ID.upper(), TICKET_ID.replace("-", ""), None, 42])
+def test_non_canonical_ids_stay_unchanged(value):
+    assert encode_document({"student_id": value}) == {"student_id": value}
+
+
+def test_nested_and_listed_ids_encode():
+    doc = encode_document({
+        "$set": {"thread_summary.covered_message_id": TICKET_ID},
+        "events": [{"ticket_id": TICKET_ID}],
+        "queue_id": [TICKET_ID, "general"],
+    })
+    assert doc == {
+        "$set": {"thread_summary.covered_message_id": uuid.UUID(TICKET_ID)},
+        "events": [{"ticket_id": uuid.UUID(TICKET_ID)}],
+        "queue_id": [uuid.UUID(TICKET_ID), "general"],
+    }
+
+
+def test_binary_subtype_4_round_trip():
+    original = {"id": TICKET_ID, "institution_id": INSTITUTION_ID, "messages": [{"ticket_id": TICKET_ID}]}
+    raw = bson.encode(encode_document(original), codec_options=STANDARD)
+
+    stored = bson.decode(raw)
+    assert stored["id"] == Binary(uuid.UUID(TICKET_ID).bytes, 4)
+    assert stored["id"].subtype == 4 and len(stored["id"]) == 16
+
+    assert decode(bson.decode(raw, codec_options=STANDARD)) == original
+
+
+def test_binary_filter_matches_binary_only():
+    assert encode_filter({"id": TICKET_ID}) == {"id": uuid.UUID(TICKET_ID)}
+    assert encode_filter({"id": {"$in": [TICKET_ID]}}) == {"id": {"$in": [uuid.UUID(TICKET_ID)]}}
+
+
+def test_mixed_filter_matches_both_forms():
+    binary = uuid.UUID(TICKET_ID)
+    assert encode_filter({"id": TICKET_ID}, mixed=True) == {"id": {"$in": [binary, TICKET_ID]}}
+    assert encode_filter({"id": {"$in": [TICKET_ID, "SIS-1"]}}, mixed=True) == {
+        "id": {"$in": [binary, TICKET_ID, "SIS-1"]}
+    }
+    assert encode_filter({"id": {"$ne": TICKET_ID}}, mixed=True) == {"id": {"$nin": [binary, TICKET_ID]}}
+    assert encode_filter({"$or": [{"ticket_id": TICKET_ID}, {"status": "open"}]}, mixed=True) == {
+        "$or": [{"ticket_id": {"$in": [binary, TICKET_ID]}}, {"status": "open"}]
+    }
+
+
+def test_mixed_range_compares_each_form_separately():
+    assert encode_filter({"id": {"$gt": TICKET_ID}, "status": "open"}, mixed=True) == {
+        "status": "open",
+        "$and": [{"$or": [{"id": {"$gt": uuid.UUID(TICKET_ID)}}, {"id": {"$gt": TICKET_ID}}]}],
+    }
+
+
+def test_string_storage_is_a_no_op():
+    db = object()
+    assert wrap_database(db, "string") is db
+    with pytest.raises(ValueError):
+        wrap_database(db, "hex")
+
+
+async def test_mixed_storage_queries(monkeypatch):
+    # mongomock validates inserts with the default codec, which can't encode uuid.UUID
+    monkeypatch.setattr("mongomock.collection.BSON", None)
+    raw = AsyncMongoMockClient(tz_aware=True, **MONGO_UUID_OPTIONS)["t"]
+    legacy_id, migrated_id = str(uuid.uuid4()), str(uuid.uuid4())
+    # One ticket written before the switch (string ids), one after (binary ids)
+    await raw.tickets.insert_one({"id": legacy_id, "institution_id": INSTITUTION_ID, "status": "open"})
+    await wrap_database(raw, "binary").tickets.insert_one(
+        {"id": migrated_id, "institution_id": INSTITUTION_ID, "status": "open"}
+    )
+    assert isinstance((await raw.tickets.find_one({"status": "open", "id": {"$ne": legacy_id}}))["id"], uuid.UUID)
+
+    mixed = wrap_database(raw, "mixed")
+    tickets = await mixed.tickets.find({"institution_id": INSTITUTION_ID}, {"_id": 0}).sort("id", 1).to_list(None)
+    assert {t["id"] for t in tickets} == {legacy_id, migrated_id}
+    assert all(isinstance(t["institution_id"], str) for t in tickets)
+
+    assert await mixed.tickets.count_documents({"id": {"$in": [legacy_id, migrated_id]}}) == 2
+    assert (await mixed.tickets.find_one({"id": legacy_id}))["id"] == legacy_id
+    assert (await mixed.tickets.find_one({"id": migrated_id}))["id"] == migrated_id
+
+    # Binary mode only sees migrated documents
+    binary = wrap_database(raw, "binary")
+    assert await binary.tickets.count_documents({"id": {"$in": [legacy_id, migrated_id]}}) == 1
+
+    await mixed.tickets.update_many({"id": {"$in": [legacy_id, migrated_id]}}, {"$set": {"status": "closed"}})
+    assert await raw.tickets.count_documents({"status": "closed"}) == 2
@@ -0,0 +1,117 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from mongomock_motor import AsyncMongoMockClient
+
+from idempotency import create_idempotency_middleware
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient(tz_aware=True)["t"]
+
+
+@pytest.fixture
+def calls():
+    return {"send": 0, "stream": 0, "fail": 0}
+
+
+@pytest.fixture
+async def client(db, calls):
+    app = FastAPI()
+    app.middleware("http")(create_idempotency_middleware(lambda: db))
+
+    @app.post("/send", status_code=201)
+    async def send(payload: dict, response: Response):
+        calls["send"] += 1
+        response.set_cookie("a", "1")
+        response.set_cookie("b", "2")
+        return {"sent": calls["send"], "body": payload.get("body")}
+
+    @app.post("/stream")
+    async def stream():
+        calls["stream"] += 1
+
+        async def events():
+            for i in range(3):
+                yield f'{{"i": {i}}}\n'
+                await asyncio.sleep(0)
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    @app.post("/fail")
+    async def fail():
+        calls["fail"] += 1
+        return Response(status_code=503)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_duplicate_is_replayed(client, calls):
+    headers = {"Idempotency-Key": "k1", "Authorization": "Bearer agent"}
+    first = await client.post("/send", json={"body": "hi"}, headers=headers)
+    second = await client.post("/send", json={"body": "hi"}, headers=headers)
+
+    assert calls["send"] == 1
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json() == {"sent": 1, "body": "hi"}
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.headers["content-type"] == first.headers["content-type"]
+    assert second.headers.get_list("set-cookie") == first.headers.get_list("set-cookie")
+
+
+async def test_concurrent_duplicates_run_once(client, calls):
+    headers = {"Idempotency-Key": "k2"}
+    responses = await asyncio.gather(*[client.post("/send", json={"body": "hi"}, headers=headers) for _ in range(3)])
+
+    assert calls["send"] == 1
+    assert {r.json()["sent"] for r in responses} == {1}
+
+
+async def test_keys_are_scoped_per_caller(client, calls):
+    await client.post("/send", json={}, headers={"Idempotency-Key": "k3", "Authorization": "Bearer a"})
+    await client.post("/send", json={}, headers={"Idempotency-Key": "k3", "Authorization": "Bearer b"})
+    assert calls["send"] == 2
+
+
+async def test_fingerprint_conflict(client, calls):
+    headers = {"Idempotency-Key": "k4"}
+    await client.post("/send", json={"body": "hi"}, headers=headers)
+
+    changed_body = await client.post("/send", json={"body": "bye"}, headers=headers)
+    changed_query = await client.post("/send?draft=1", json={"body": "hi"}, headers=headers)
+
+    assert changed_body.status_code == changed_query.status_code == 422
+    assert calls["send"] == 1
+
+
+async def test_streaming_responses_are_not_stored(client, calls, db):
+    headers = {"Idempotency-Key": "k5"}
+    first = await client.post("/stream", headers=headers)
+    second = await client.post("/stream", headers=headers)
+
+    assert first.text.splitlines() == second.text.splitlines() == ['{"i": 0}', '{"i": 1}', '{"i": 2}']
+    assert "idempotent-replayed" not in second.headers
+    assert calls["stream"] == 2
+    assert await db.idempotency_keys.count_documents({}) == 0
+
+
+async def test_server_errors_release_the_key(client, calls, db):
+    headers = {"Idempotency-Key": "k6"}
+    assert (await client.post("/fail", headers=headers)).status_code == 503
+    assert (await client.post("/fail", headers=headers)).status_code == 503
+    assert calls["fail"] == 2
+    assert await db.idempotency_keys.count_documents({}) == 0
+
+
+async def test_requests_without_a_key_always_run(client, calls, db):
+    await client.post("/send", json={})
+    await client.post("/send", json={})
+    assert calls["send"] == 2
+    assert await db.idempotency_keys.count_documents({}) == 0
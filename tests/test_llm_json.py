@@ -0,0 +1,108 @@
+import pytest
+from pydantic import BaseModel
+
+from llm_json import IncrementalJSONParser, LlmOutputError, extract_json_object, parse_model_output
+
+
+class Answer(BaseModel):
+    answer: str
+    confidence: float
+
+
+def test_plain_object():
+    assert extract_json_object('{"answer": "yes", "confidence": 0.9}') == {"answer": "yes", "confidence": 0.9}
+
+
+@pytest.mark.parametrize("text", [
+    '```json\n{"answer": "yes", "confidence": 0.9}\n```',
+    '```\n{"answer": "yes", "confidence": 0.9}\n```',
+    'Here is the result:\n```json\n{"answer": "yes", "confidence": 0.9}\n```\nLet me know!',
+    'Sure! {"answer": "yes", "confidence": 0.9} Hope this helps.',
+])
+def test_fenced_and_wrapped_output(text):
+    assert extract_json_object(text) == {"answer": "yes", "confidence": 0.9}
+
+
+def test_unterminated_fence():
+    assert extract_json_object('```json\n{"answer": "yes", "confidence": 0.9}') == {
+        "answer": "yes", "confidence": 0.9
+    }
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"answer": "yes", "confidence": 0.9,}', {"answer": "yes", "confidence": 0.9}),
+    ('{"cited": ["a", "b",], "n": 1}', {"cited": ["a", "b"], "n": 1}),
+    ('{"outer": {"inner": 1,},}', {"outer": {"inner": 1}}),
+])
+def test_trailing_commas(text, expected):
+    assert extract_json_object(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"answer": "The deadline is Mar', {"answer": "The deadline is Mar"}),
+    ('{"answer": "yes", "cited": ["a", "b"', {"answer": "yes", "cited": ["a", "b"]}),
+    ('{"answer": "yes", "confidence": 0.', {"answer": "yes"}),
+    ('{"answer": "yes", "confid', {"answer": "yes"}),
+    ('{"answer": "yes", "meta": {"model": "gpt', {"answer": "yes", "meta": {"model": "gpt"}}),
+    ('{"answer": "a \\"quoted\\" wo', {"answer": 'a "quoted" wo'}),
+])
+def test_truncated_objects(text, expected):
+    assert extract_json_object(text) == expected
+
+
+@pytest.mark.parametrize("text", ['{"a": tru', '{"a": nul', '{"a": fals', '{"a', '{'])
+def test_truncated_inside_first_member(text):
+    assert extract_json_object(text) == {}
+
+
+@pytest.mark.parametrize("text", ["", "no json here", "{ not json }", "[1, 2, 3]"])
+def test_no_object(text):
+    assert extract_json_object(text) is None
+
+
+def test_skips_braces_in_prose():
+    assert extract_json_object('Use {braces} like this: {"answer": "yes"}') == {"answer": "yes"}
+
+
+def test_parse_model_output_validates():
+    result = parse_model_output('```json\n{"answer": "yes", "confidence": "0.5"}\n```', Answer)
+    assert result == Answer(answer="yes", confidence=0.5)
+
+
+@pytest.mark.parametrize("text", ["no json here", '{"answer": "yes"}'])
+def test_parse_model_output_rejects(text):
+    with pytest.raises(LlmOutputError):
+        parse_model_output(text, Answer)
+
+
+def test_incremental_prefixes():
+    output = '{"answer": "File the FAFSA by March 1.", "confidence": 0.85}'
+    parser = IncrementalJSONParser()
+    answers = []
+    for i in range(0, len(output), 4):
+        changed = parser.feed(output[i:i + 4])
+        if "answer" in changed:
+            answers.append(changed["answer"])
+
+    # The answer grows as it streams and every partial value is a prefix of the final one
+    assert len(answers) > 1
+    assert all("File the FAFSA by March 1.".startswith(a) for a in answers)
+    assert answers[-1] == "File the FAFSA by March 1."
+    assert parser.fields == {"answer": "File the FAFSA by March 1.", "confidence": 0.85}
+    assert parser.result(Answer) == Answer(answer="File the FAFSA by March 1.", confidence=0.85)
+
+
+def test_incremental_every_prefix_parses():
+    output = '```json\n{"answer": "yes, \\"verified\\"", "cited": [{"title": "A"}], "confidence": 1}\n```'
+    for end in range(len(output) + 1):
+        parser = IncrementalJSONParser()
+        # Never raises, whatever the cut point
+        parser.feed(output[:end])
+    assert parser.fields == {"answer": 'yes, "verified"', "cited": [{"title": "A"}], "confidence": 1}
+
+
+def test_incremental_reports_only_changes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"answer": "yes", ') == {"answer": "yes"}
+    assert parser.feed('"confidence": 0.5') == {"confidence": 0.5}
+    assert parser.feed("}") == {}
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from fast_json import dumps
+from migrate_timestamps import migrate_collection
+from timestamps import MONGO_CODEC_OPTIONS, parse_timestamp, to_iso, utcnow
+
+pytestmark = pytest.mark.anyio
+
+
+def test_utcnow_is_aware_with_millisecond_precision():
+    now = utcnow()
+    assert now.tzinfo == timezone.utc
+    assert now.microsecond % 1000 == 0
+    assert abs(datetime.now(timezone.utc) - now) < timedelta(seconds=1)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025-09-01T12:00:00.123000+00:00", datetime(2025, 9, 1, 12, 0, 0, 123000, tzinfo=timezone.utc)),
+    ("2025-09-01T12:00:00Z", datetime(2025, 9, 1, 12, tzinfo=timezone.utc)),
+    ("2025-09-01T08:00:00-04:00", datetime(2025, 9, 1, 12, tzinfo=timezone.utc)),
+    (" 2025-09-01T12:00:00 ", datetime(2025, 9, 1, 12, tzinfo=timezone.utc)),
+    (datetime(2025, 9, 1, 12), datetime(2025, 9, 1, 12, tzinfo=timezone.utc)),
+    (datetime(2025, 9, 1, 14, tzinfo=timezone(timedelta(hours=2))), datetime(2025, 9, 1, 12, tzinfo=timezone.utc)),
+])
+def test_parse_timestamp(value, expected):
+    parsed = parse_timestamp(value)
+    assert parsed == expected
+    assert parsed.tzinfo == timezone.utc
+
+
+@pytest.mark.parametrize("value", ["", "yesterday", "2025-13-01", None, 1756728000])
+def test_parse_timestamp_rejects(value):
+    assert parse_timestamp(value) is None
+
+
+def test_api_representation_is_unchanged():
+    # Dates render as the ISO strings the API returned when timestamps were stored as strings
+    stored = datetime(2025, 9, 1, 12, 0, 0, 123000, tzinfo=timezone.utc)
+    assert to_iso(stored) == "2025-09-01T12:00:00.123000+00:00"
+    assert to_iso("2025-09-01T12:00:00.123456+00:00") == "2025-09-01T12:00:00.123456+00:00"
+    assert to_iso(None) is None
+    assert dumps({"created_at": stored}) == b'{"created_at":"2025-09-01T12:00:00.123000+00:00"}'
+
+
+async def test_stored_dates_read_back_as_utc():
+    db = AsyncMongoMockClient(**MONGO_CODEC_OPTIONS)["t"]
+    now = utcnow()
+    await db.tickets.insert_one({"id": "t1", "created_at": now})
+    ticket = await db.tickets.find_one({"created_at": {"$gte": now - timedelta(minutes=1)}})
+    assert ticket["created_at"] == now
+    assert ticket["created_at"].tzinfo is not None
+
+
+async def test_migration_converts_string_timestamps():
+    db = AsyncMongoMockClient(**MONGO_CODEC_OPTIONS)["t"]
+    await db.tickets.insert_many([
+        {"_id": 1, "created_at": "2025-09-01T12:00:00+00:00", "updated_at": "2025-09-02T12:00:00Z"},
+        {"_id": 2, "created_at": datetime(2025, 9, 1, tzinfo=timezone.utc), "updated_at": "not a date"},
+        {"_id": 3, "created_at": "2025-09-03T12:00:00+00:00", "thread_summary": {"updated_at": "2025-09-04T00:00:00+00:00"}},
+    ])
+
+    stats = await migrate_collection(
+        db, "tickets", ["created_at", "updated_at", "thread_summary.updated_at"], batch_size=2
+    )
+
+    assert stats == {"scanned": 3, "modified": 2, "unparseable": 1}
+    first, second, third = await db.tickets.find().sort("_id", 1).to_list(None)
+    assert first["created_at"] == datetime(2025, 9, 1, 12, tzinfo=timezone.utc)
+    assert first["updated_at"] == datetime(2025, 9, 2, 12, tzinfo=timezone.utc)
+    assert second["updated_at"] == "not a date"
+    assert third["thread_summary"]["updated_at"] == datetime(2025, 9, 4, tzinfo=timezone.utc)
+    # Finished runs drop their checkpoint
+    assert await db.migrations.count_documents({}) == 0
+
+
+async def test_migration_dry_run_writes_nothing():
+    db = AsyncMongoMockClient(**MONGO_CODEC_OPTIONS)["t"]
+    await db.messages.insert_one({"_id": 1, "created_at": "2025-09-01T12:00:00+00:00"})
+
+    stats = await migrate_collection(db, "messages", ["created_at"], dry_run=True)
+
+    assert stats["modified"] == 1
+    assert (await db.messages.find_one({"_id": 1}))["created_at"] == "2025-09-01T12:00:00+00:00"